@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""MihomoProxyPool 的 asyncio 版本。
+
+与同步版接口一致：加载测试结果、选择节点、切换节点、查询出口 IP；健康评分、
+熔断和出口 IP 缓存直接复用 BaseProxyPool。所有网络请求走同一个 aiohttp 会话
+（与 check_proxies.py 相同的做法），成千上万个协程可以直接 await，无需把阻塞
+调用丢进线程池。
+
+用法：
+    async with AsyncMihomoProxyPool() as pool:
+        node = pool.get_random_node()
+        ok, msg = await pool.switch_node(node["name"])
+        ip = await pool.get_current_ip()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+import aiohttp
+
+from proxy_pool import CONFIG, BaseProxyPool, parse_ip_echo
+
+
+class AsyncMihomoProxyPool(BaseProxyPool):
+    """异步 Mihomo 代理池（共享单个 aiohttp.ClientSession）"""
+
+    def __init__(
+        self,
+        results_file: Optional[str] = None,
+        api_url: Optional[str] = None,
+        group_name: Optional[str] = None,
+        switch_group: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        max_connections: int = 100,
+    ):
+        super().__init__(results_file, api_url, group_name, switch_group)
+        self._session = session
+        self._own_session = session is None
+        self.max_connections = max_connections
+        self._switch_lock: Optional[asyncio.Lock] = None
+
+    async def open(self) -> "AsyncMihomoProxyPool":
+        """创建共享会话（若外部未传入）。"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=False)
+        # 切换的是全局代理组，多个协程同时切换必须串行
+        self._switch_lock = asyncio.Lock()
+        return self
+
+    async def close(self) -> None:
+        if self._session is not None and self._own_session:
+            await self._session.close()
+        self._session = None
+        if self.bandit is not None:
+            self.bandit.save()
+
+    async def __aenter__(self) -> "AsyncMihomoProxyPool":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            raise RuntimeError("AsyncMihomoProxyPool 尚未 open()，请使用 async with")
+        return self._session
+
+    @property
+    def switch_lock(self) -> asyncio.Lock:
+        if self._switch_lock is None:
+            raise RuntimeError("AsyncMihomoProxyPool 尚未 open()，请使用 async with")
+        return self._switch_lock
+
+    async def get_group_now(self) -> Optional[str]:
+        """查询切换组当前选中的节点"""
+        url = f"{self.api_url}/proxies/{self.switch_group}"
+        try:
+            async with self.session.get(url, headers=self._headers(), timeout=aiohttp.ClientTimeout(total=2)) as resp:
+                if resp.status == 200:
+                    return (await resp.json()).get("now")
+        except Exception:
+            pass
+        return None
+
+    async def _close_connections(self, should_close: Callable[[List[str]], bool]) -> int:
+        """并发关闭 should_close(chains) 为真的存量连接，返回关闭数量"""
+        timeout = aiohttp.ClientTimeout(total=2)
+        try:
+            async with self.session.get(f"{self.api_url}/connections", headers=self._headers(), timeout=timeout) as resp:
+                if resp.status != 200:
+                    return 0
+                connections = (await resp.json()).get("connections") or []
+        except Exception:
+            return 0
+
+        async def close_one(conn_id: str) -> bool:
+            try:
+                async with self.session.delete(
+                    f"{self.api_url}/connections/{conn_id}", headers=self._headers(), timeout=timeout
+                ):
+                    return True
+            except Exception:
+                return False
+
+        targets = [c.get("id") for c in connections if should_close(c.get("chains") or [])]
+        results = await asyncio.gather(*(close_one(cid) for cid in targets))
+        return sum(1 for r in results if r)
+
+    async def close_node_connections(self, node_name: str) -> int:
+        return await self._close_connections(lambda chains: node_name in chains)
+
+    async def wait_for_switch(self, node_name: str, timeout: Optional[float] = None) -> bool:
+        """轮询切换组的 now 字段，直到等于 node_name 或超时"""
+        if timeout is None:
+            timeout = CONFIG["SWITCH_CONFIRM_TIMEOUT"]
+        deadline = time.perf_counter() + timeout
+        while True:
+            if await self.get_group_now() == node_name:
+                return True
+            if time.perf_counter() >= deadline:
+                return False
+            await asyncio.sleep(CONFIG["SWITCH_POLL_INTERVAL"])
+
+    async def switch_node(self, node_name: str) -> Tuple[bool, str]:
+        """切换 Mihomo 代理节点：PUT → 轮询确认生效 → 关闭旧节点存量连接"""
+        url = f"{self.api_url}/proxies/{self.switch_group}"
+        async with self.switch_lock:
+            start = time.perf_counter()
+            ok = False
+            try:
+                # 旧节点未知时（首次切换）先读一次切换组当前节点，只关闭经过它的连接
+                old_node = self.current_node
+                if old_node is None and CONFIG["CLOSE_OLD_CONNECTIONS"]:
+                    old_node = await self.get_group_now()
+                async with self.session.put(
+                    url, json={"name": node_name}, headers=self._headers(), timeout=aiohttp.ClientTimeout(total=5)
+                ) as resp:
+                    if resp.status != 204:
+                        return False, f"HTTP {resp.status}"
+
+                if not await self.wait_for_switch(node_name):
+                    self.current_node = None
+                    return False, "切换未确认（超时）"
+                self.current_node = node_name
+
+                if CONFIG["CLOSE_OLD_CONNECTIONS"] and old_node and old_node != node_name:
+                    await self.close_node_connections(old_node)
+
+                ok = True
+                return True, "切换成功"
+            except Exception as e:
+                return False, repr(e)
+            finally:
+                self.record_switch(start, ok)
+
+    async def get_current_ip(self, use_cache: bool = True) -> Optional[str]:
+        """获取当前出口 IP（切回缓存有效期内的已知节点时直接返回缓存）"""
+        # 持有切换锁：查询期间其他协程不能切换节点，查到的 IP 一定属于 current_node
+        async with self.switch_lock:
+            node_name = self.current_node
+            cached = self.get_cached_ip(node_name, use_cache)
+            if cached:
+                return cached
+            start = time.perf_counter()
+            ip = None
+            try:
+                # Connection: close —— 不复用经过代理的隧道，避免切换后仍走旧节点
+                async with self.session.get(
+                    CONFIG["IP_ECHO_URL"],
+                    proxy=CONFIG["MIHOMO_PROXY"],
+                    headers={"Connection": "close"},
+                    timeout=aiohttp.ClientTimeout(total=10),
+                ) as resp:
+                    if resp.status == 200:
+                        ip = parse_ip_echo(await resp.text())
+                        self.store_exit_ip(node_name, ip)
+            except Exception:
+                pass
+            self.record_ip_lookup(start, ip)
+            return ip
+
+
+async def main(num_tests: int = 3) -> None:
+    async with AsyncMihomoProxyPool() as pool:
+        for i in range(num_tests):
+            node = pool.get_random_node()
+            if not node:
+                print("❌ 没有可用节点")
+                break
+            name = node["name"]
+            ok, msg = await pool.switch_node(name)
+            if not ok:
+                print(f"[#{i + 1}] ❌ {name}: {msg}")
+                pool.report_failure(name, msg)
+                continue
+            ip = await pool.get_current_ip()
+            print(f"[#{i + 1}] ✅ {name} -> {ip or '无法获取 IP'}")
+        stats = pool.get_switch_stats()
+        if stats["count"]:
+            print(f"⚡ 切换耗时(ms): p50={stats['p50']} p90={stats['p90']} p99={stats['p99']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,18 +2,33 @@
 
 from __future__ import annotations
 
+import argparse
 import asyncio
 import json
 import os
 import time
 from dataclasses import dataclass
-from typing import Iterable, Optional, Tuple, List
+from typing import Dict, Iterable, Optional, Tuple, List
 
 import aiohttp
 import yaml
 import requests
 from tqdm import tqdm
 
+from generate_clash_profile import load_node_ports
+from proxy_pool import metrics
+
+DELAY_MS = metrics.histogram(
+    "proxy_delay_test_ms", "节点延迟测试结果（毫秒，Mihomo 返回的 delay）",
+    buckets=(50, 100, 200, 300, 500, 800, 1000, 1500, 2000, 3000, 5000, 8000),
+)
+DELAY_TESTS = metrics.counter("proxy_delay_tests_total", "节点延迟测试次数", ["result"])
+CHECK_RATE = metrics.gauge("proxy_check_nodes_per_second", "本轮测速的平均速度（节点/秒）")
+BANDWIDTH_KBPS = metrics.histogram(
+    "proxy_bandwidth_test_kbps", "节点下载速度测试结果（KB/s）",
+    buckets=(50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000),
+)
+
 
 @dataclass
 class MihomoConfig:
@@ -24,6 +39,13 @@ class MihomoConfig:
     timeout: float = 8.0                   # 单节点测试超时（秒）
     max_concurrency: int = 20              # 并发数量（可适当调大）
     verify_tls: bool = True                # aiohttp SSL 验证
+    # 带宽测试（可选）：延迟最低的 bandwidth_top_n 个可用节点经各自的独立端口下载固定大小的数据
+    bandwidth_top_n: int = 0               # 0 表示不测带宽
+    bandwidth_url: str = "https://speed.cloudflare.com/__down?bytes=1000000"  # 可换成自建 / 本地的测速文件
+    bandwidth_bytes: int = 1_000_000       # 读满多少字节后停止
+    bandwidth_concurrency: int = 3         # 带宽测试并发数（远低于延迟测试，避免互相抢带宽）
+    bandwidth_timeout: float = 20.0        # 单节点下载超时（秒），超时前已收到的数据仍计算速度（标记为 partial）
+    proxy_host: str = "127.0.0.1"          # 每节点独立端口（listeners）所在的主机
 
 
 def get_proxies_dir() -> str:
@@ -52,6 +74,17 @@ def list_group_proxies(cfg: MihomoConfig) -> Iterable[str]:
 
 
 async def test_one_proxy(session: aiohttp.ClientSession, cfg: MihomoConfig, name: str) -> Tuple[str, Optional[float], Optional[str]]:
+    """测试单个节点并记入指标，返回: (name, latency_ms or None, error or None)"""
+    result = await _delay_test(session, cfg, name)
+    if result[1] is not None:
+        DELAY_MS.observe(result[1])
+        DELAY_TESTS.inc(result="ok")
+    else:
+        DELAY_TESTS.inc(result="failed")
+    return result
+
+
+async def _delay_test(session: aiohttp.ClientSession, cfg: MihomoConfig, name: str) -> Tuple[str, Optional[float], Optional[str]]:
     """
     并发测试单个节点：
       GET /proxies/{name}/delay?url=...&timeout=...（timeout 单位 ms）
@@ -100,8 +133,10 @@ async def run_tests_async(cfg: MihomoConfig, names: Iterable[str]) -> Tuple[List
         for nm in names:
             tasks.append(asyncio.create_task(worker(nm)))
 
+        started = time.perf_counter()
         for f in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Proxy Test (async)"):
             name, latency, err = await f
+            CHECK_RATE.set((len(ok) + len(failed) + 1) / max(time.perf_counter() - started, 1e-6))
             if latency is not None:
                 ok.append((name, latency))
             else:
@@ -110,28 +145,166 @@ async def run_tests_async(cfg: MihomoConfig, names: Iterable[str]) -> Tuple[List
     return ok, failed
 
 
-def save_results(dir_path: str, ok: list, failed: list) -> None:
+def bandwidth_kbps(received: int, start: float, first: Optional[float], end: float) -> float:
     """
-    写入 JSON 结果，文件头含 meta（生成说明与统计）。
+    下载速度（KB/s）：从收到第一个数据块开始计算（建连和首字节时间已由延迟测试体现）
+
+    数据在第一个数据块里就收完时，第一块之后的耗时接近 0，改用总耗时。
     """
-    output = os.path.join(dir_path, "proxy_test_results.json")
-    payload = {
+    elapsed = end - first if first is not None and end - first > 0.05 else end - start
+    return received / 1024 / max(elapsed, 1e-6)
+
+
+async def measure_bandwidth(session: aiohttp.ClientSession, cfg: MihomoConfig, name: str, proxy: str) -> Tuple[str, Optional[float], Optional[str], bool]:
+    """
+    经节点独立端口下载 bandwidth_url，返回: (name, KB/s or None, error or None, partial)
+
+    超时前已收到数据时按已收到的部分计算，partial 为 True（数据量少，结果不如完整下载可靠）。
+    """
+    start = time.perf_counter()
+    first = None
+    received = 0
+    error = None
+    try:
+        async with session.get(cfg.bandwidth_url, proxy=proxy) as resp:
+            if resp.status != 200:
+                return name, None, f"HTTP {resp.status}", False
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                if first is None:
+                    first = time.perf_counter()
+                received += len(chunk)
+                if received >= cfg.bandwidth_bytes:
+                    break
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except Exception as e:
+        return name, None, repr(e), False
+    end = time.perf_counter()
+    if not received:
+        return name, None, error or "empty response", False
+    kbps = bandwidth_kbps(received, start, first, end)
+    BANDWIDTH_KBPS.observe(kbps)
+    return name, kbps, None, error is not None
+
+
+async def run_bandwidth_async(cfg: MihomoConfig, names: Iterable[str], node_ports: Dict[str, int]) -> Dict[str, Tuple[Optional[float], Optional[str], bool]]:
+    """以 bandwidth_concurrency 的并发测试节点带宽，返回 {name: (KB/s or None, error or None, partial)}"""
+    timeout = aiohttp.ClientTimeout(total=cfg.bandwidth_timeout)
+    connector = aiohttp.TCPConnector(ssl=cfg.verify_tls, limit=0, force_close=True)
+    sem = asyncio.Semaphore(cfg.bandwidth_concurrency)
+    results: Dict[str, Tuple[Optional[float], Optional[str], bool]] = {}
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector, trust_env=False) as session:
+        async def worker(nm: str):
+            async with sem:
+                return await measure_bandwidth(session, cfg, nm, f"http://{cfg.proxy_host}:{node_ports[nm]}")
+
+        tasks = [asyncio.create_task(worker(nm)) for nm in names]
+        for f in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Bandwidth Test"):
+            name, kbps, err, partial = await f
+            results[name] = (kbps, err, partial)
+    return results
+
+
+def bandwidth_candidates(ok: List[Tuple[str, float]], node_ports: Dict[str, int], top_n: int) -> List[str]:
+    """延迟最低、且有独立端口的前 top_n 个可用节点"""
+    ranked = sorted(ok, key=lambda item: item[1])
+    return [name for name, _ in ranked if name in node_ports][:top_n]
+
+
+def _ok_entry(name: str, latency: float, bandwidth: Optional[dict]) -> dict:
+    entry = {"name": name, "latency_ms": round(latency, 2)}
+    if bandwidth and name in bandwidth:
+        kbps, err, partial = bandwidth[name]
+        if kbps is not None:
+            entry["bandwidth_kbps"] = round(kbps, 1)
+            if partial:
+                entry["bandwidth_partial"] = True
+        else:
+            entry["bandwidth_error"] = err
+    return entry
+
+
+def results_payload(ok: list, failed: list, generated_by: str = "check_proxies.py", bandwidth: Optional[dict] = None) -> dict:
+    """
+    结果 JSON 内容，文件头含 meta（生成说明与统计）。
+
+    bandwidth 为带宽测试结果 {name: (KB/s or None, error, partial)} 时，对应的可用节点附带 bandwidth_kbps / bandwidth_error，
+    超时前只收到部分数据的再加 bandwidth_partial: true。
+    """
+    return {
         "meta": {
-            "generated_by": "check_proxies.py",
+            "generated_by": generated_by,
             "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
             "counts": {"ok": len(ok), "failed": len(failed)},
-            "note": "此文件由 check_proxies.py 生成（async加速版），包含可用/不可用代理及延迟(ms)。",
+            "note": f"此文件由 {generated_by} 生成（async加速版），包含可用/不可用代理及延迟(ms)。",
         },
-        "ok": [{"name": n, "latency_ms": round(lat, 2)} for n, lat in ok],
+        "ok": [_ok_entry(n, lat, bandwidth) for n, lat in ok],
         "failed": [{"name": n, "error": err} for n, err in failed],
     }
-    with open(output, "w", encoding="utf-8") as f:
+
+
+# tag_regions.py 写入的地区字段：重新测速时按节点名沿用，新出现的节点需要重新运行 tag_regions.py
+REGION_FIELDS = ("exit_ip", "ip_source", "country", "asn", "as_name", "region_source")
+
+
+def carry_region_tags(payload: dict, output: str) -> int:
+    """把旧结果文件中同名可用节点的地区标签复制到 payload，返回沿用的节点数。"""
+    if not os.path.exists(output):
+        return 0
+    try:
+        with open(output, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    tags = {}
+    for node in previous.get("ok") or previous.get("available") or []:
+        fields = {k: node[k] for k in REGION_FIELDS if node.get(k) is not None}
+        if node.get("name") and fields:
+            tags[node["name"]] = fields
+    carried = 0
+    for node in payload["ok"]:
+        fields = tags.get(node["name"])
+        if fields:
+            node.update(fields)
+            carried += 1
+    if carried:
+        payload["meta"]["regions_tagged_by"] = (previous.get("meta") or {}).get("regions_tagged_by", "tag_regions.py")
+    return carried
+
+
+def write_results_file(output: str, payload: dict) -> int:
+    """写入结果文件（沿用旧文件中的地区标签），返回沿用地区标签的节点数。"""
+    carried = carry_region_tags(payload, output)
+    # 先写临时文件再原子替换，运行中的代理池热加载时不会读到写了一半的文件
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+    return carried
+
+
+def save_results(dir_path: str, ok: list, failed: list, bandwidth: Optional[dict] = None) -> None:
+    """
+    写入 JSON 结果，文件头含 meta（生成说明与统计）。
+    """
+    output = os.path.join(dir_path, "proxy_test_results.json")
+    carried = write_results_file(output, results_payload(ok, failed, bandwidth=bandwidth))
     print(f"💾 结果已写入: {output}")
     print(f"   -> 可用代理: {len(ok)} ，失败代理: {len(failed)}")
+    if carried:
+        print(f"   -> 沿用 {carried} 个节点的地区标签（新节点或出口变化后请重新运行 tag_regions.py）")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="并发检测节点可用性（可选带宽测试）")
+    parser.add_argument("--bandwidth-top", type=int, default=MihomoConfig.bandwidth_top_n,
+                        help="对延迟最低的 N 个可用节点测试下载速度（需要每节点独立端口），默认 0 不测")
+    parser.add_argument("--bandwidth-url", default=MihomoConfig.bandwidth_url, help="测速下载地址")
+    parser.add_argument("--bandwidth-bytes", type=int, default=MihomoConfig.bandwidth_bytes, help="每个节点下载的字节数")
+    parser.add_argument("--proxy-host", default=MihomoConfig.proxy_host, help="每节点独立端口所在的主机（Mihomo 不在本机时）")
+    args = parser.parse_args()
+
     proxies_dir = get_proxies_dir()
     profile_path = os.path.join(proxies_dir, "clash_profile.yaml")
 
@@ -142,7 +315,9 @@ def main():
     profile = load_profile(profile_path)
     secret = profile.get("secret", "") or ""
 
-    cfg = MihomoConfig(secret=secret)
+    cfg = MihomoConfig(secret=secret, bandwidth_top_n=args.bandwidth_top, bandwidth_url=args.bandwidth_url,
+                       bandwidth_bytes=args.bandwidth_bytes, proxy_host=args.proxy_host)
+    metrics.start_exporter()
 
     try:
         names = list(list_group_proxies(cfg))
@@ -169,7 +344,24 @@ def main():
 
     print(f"\n统计：可用 {len(ok)} ，失败 {len(failed)} ，总计 {len(names)}")
 
-    save_results(proxies_dir, ok, failed)
+    bandwidth = None
+    if cfg.bandwidth_top_n > 0 and ok:
+        node_ports = load_node_ports(profile_path)
+        candidates = bandwidth_candidates(ok, node_ports, cfg.bandwidth_top_n)
+        if not candidates:
+            print("⚠️  配置中没有每节点独立端口（listeners），跳过带宽测试")
+        else:
+            print(f"\n📶 带宽测试: 延迟最低的 {len(candidates)} 个节点，下载 {cfg.bandwidth_bytes / 1024:.0f} KB，"
+                  f"并发 {cfg.bandwidth_concurrency} ，目标 {cfg.bandwidth_url}")
+            bandwidth = asyncio.run(run_bandwidth_async(cfg, candidates, node_ports))
+            for name in candidates:
+                kbps, err, partial = bandwidth[name]
+                if kbps is None:
+                    print(f"   ❌ {name} -> {err}")
+                else:
+                    print(f"   📶 {name} -> {kbps:.0f} KB/s" + ("（超时，按部分数据计算）" if partial else ""))
+
+    save_results(proxies_dir, ok, failed, bandwidth)
 
 
 if __name__ == "__main__":
@@ -8,7 +8,13 @@ import base64
 import yaml
 import json
 import re
+import time
+from urllib.parse import urlparse
 
+from proxy_pool import metrics
+
+FETCH_SECONDS = metrics.histogram("proxy_fetch_duration_seconds", "拉取并解析一个订阅的耗时（秒）", ["source", "result"])
+FETCH_NODES = metrics.counter("proxy_fetch_nodes_total", "从订阅解析出的节点数", ["source"])
 
 def safe_base64_decode(data: str) -> bytes:
     """解码可能缺少填充的 Base64 字符串。"""
@@ -146,8 +152,27 @@ def collect_from_yaml(config, source_url):
     return nodes
 
 
+def node_key(node):
+    """节点去重键：type+server+port+name"""
+    return (
+        node.get("type"),
+        node.get("server"),
+        node.get("port"),
+        node.get("name"),
+    )
+
+
 def fetch_from_clash_subscription(subscription_url):
-    """从订阅链接获取节点描述列表。"""
+    """从订阅链接获取节点描述列表（耗时与节点数按订阅域名记入指标）。"""
+    start = time.perf_counter()
+    nodes = _fetch_subscription(subscription_url)
+    # 只用域名作标签，订阅链接里的 token 不会出现在指标中
+    source = urlparse(subscription_url).hostname or "unknown"
+    FETCH_SECONDS.observe(time.perf_counter() - start, source=source, result="ok" if nodes else "empty")
+    FETCH_NODES.inc(len(nodes), source=source)
+    return nodes
+
+def _fetch_subscription(subscription_url):
     try:
         print(f"🔄 正在获取订阅: {subscription_url[:50]}...")
 
@@ -318,6 +343,7 @@ def debug_subscription(subscription_url):
 
 def main():
     """主函数"""
+    metrics.start_exporter()
     # 你的机场订阅链接（支持多个）
     subscriptions = [
         '订阅1',
@@ -346,12 +372,7 @@ def main():
         seen = set()
         unique_nodes = []
         for node in all_nodes:
-            key = (
-                node.get("type"),
-                node.get("server"),
-                node.get("port"),
-                node.get("name"),
-            )
+            key = node_key(node)
             if key in seen:
                 continue
             seen.add(key)
@@ -4,7 +4,9 @@
 生成结果写入 proxies/clash_profile.yaml，包含：
 - 固定的基本端口设置（7890/7891 与 Mihomo 默认一致，可按需修改）；
 - 将原始节点全部放入一个 select 组，后续脚本会通过 REST API 逐个切换；
-- 最终转发走 FINAL 代理组。
+- 最终转发走 FINAL 代理组；
+- 为每个节点生成一个独立的本地 mixed 监听端口（listeners），多个进程可各自
+  使用不同端口并行出网，互不干扰（由 proxy_lease_server.py 分配）。
 """
 
 from __future__ import annotations
@@ -12,7 +14,10 @@ from __future__ import annotations
 import os
 import sys
 import yaml
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+# 每节点独立监听端口的起始端口（第 i 个节点使用 LISTENER_BASE_PORT + i），设为 None 则不生成
+LISTENER_BASE_PORT: Optional[int] = 30000
 
 
 def get_workspace_paths() -> Dict[str, str]:
@@ -63,7 +68,36 @@ def ensure_unique_proxy_names(
     return result, names
 
 
-def build_profile(proxies: List[Dict[str, Any]]) -> Dict[str, Any]:
+def build_listeners(names: List[str], base_port: int) -> List[Dict[str, Any]]:
+    """每个节点一个仅监听本机的 mixed 入口，流量固定走该节点，不受 GLOBAL 切换影响。"""
+    return [
+        {
+            "name": f"node-{idx}",
+            "type": "mixed",
+            "listen": "127.0.0.1",
+            "port": base_port + idx,
+            "proxy": name,
+        }
+        for idx, name in enumerate(names)
+    ]
+
+
+def load_node_ports(profile_path: str) -> Dict[str, int]:
+    """从已生成的配置中读取 节点名 -> 独立监听端口 映射。"""
+    if not os.path.exists(profile_path):
+        return {}
+    with open(profile_path, "r", encoding="utf-8") as f:
+        profile = yaml.safe_load(f) or {}
+    return {
+        item["proxy"]: int(item["port"])
+        for item in profile.get("listeners") or []
+        if item.get("proxy") and item.get("port")
+    }
+
+
+def build_profile(
+    proxies: List[Dict[str, Any]], listener_base_port: Optional[int] = LISTENER_BASE_PORT
+) -> Dict[str, Any]:
     unique_proxies, names = ensure_unique_proxy_names(proxies)
 
     profile = {
@@ -111,6 +145,8 @@ def build_profile(proxies: List[Dict[str, Any]]) -> Dict[str, Any]:
             "MATCH,FINAL",
         ],
     }
+    if listener_base_port:
+        profile["listeners"] = build_listeners(names, listener_base_port)
     return profile
 
 
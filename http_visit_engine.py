@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""不启动浏览器的轻量访问引擎（aiohttp）。
+
+对不依赖 JavaScript 的静态页面，无头 Chrome 每次访问要占用数百 MB 内存和数秒 CPU。
+这里用一个共享的 aiohttp 会话直接请求页面：
+
+- User-Agent 与浏览器引擎一样从 USER_AGENTS 中随机选取；
+- 代理路由：clash_profile.yaml 中有每节点独立端口（listeners）时，每次访问从代理池挑一个
+  健康节点走它的端口（并发访问互不干扰）；否则启动时先切换到一个健康节点，之后统一走
+  CONFIG["MIHOMO_PROXY"]（整轮访问共用这一个出口）；
+  开启 USE_PROXY 时没有可用节点的访问记为 SKIPPED 并退避，不会直连目标；
+- 结果写入与浏览器引擎相同格式的 visit_log.csv，并回报给代理池的健康评分；
+- 单核即可同时进行上千个访问，并发数由 CONFIG["HTTP_CONCURRENCY"] 控制。
+
+在 CONFIG["URL_ENGINES"] 中把目标 URL 或域名设为 "http" 后，selenium_with_proxy.py 会自动使用本引擎。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from selenium_with_proxy import (
+    CONFIG,
+    MihomoProxyPool,
+    close_log_writer,
+    get_log_file_path,
+    get_random_device,
+    log_visit,
+    write_csv_header,
+)
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+def wire_bytes(resp: aiohttp.ClientResponse) -> Optional[int]:
+    """本次响应在网络上传输的字节数（响应头 + 压缩后的响应体），未开启 MEASURE_BYTES 时返回 None。
+
+    aiohttp 会自动解压，len(body) 是解压后的大小，不能代表实际流量。新版 aiohttp 在
+    StreamReader.total_raw_bytes 中记录解压前的字节数；旧版退回 Content-Length，都没有时返回 None。
+    """
+    if not CONFIG["MEASURE_BYTES"]:
+        return None
+    body = getattr(resp.content, "total_raw_bytes", None)
+    if body is None:
+        length = resp.headers.get("Content-Length")
+        if not (length and length.isdigit()):
+            return None
+        body = int(length)
+    # 状态行 + 每个头部 "name: value\r\n" + 空行
+    head = len(f"HTTP/1.1 {resp.status} {resp.reason or ''}\r\n") + 2
+    head += sum(len(name) + len(value) + 4 for name, value in resp.raw_headers)
+    return head + body
+
+
+def extract_title(body: str) -> str:
+    match = _TITLE_RE.search(body)
+    if not match:
+        return "无标题"
+    return html.unescape(" ".join(match.group(1).split()))[:50] or "无标题"
+
+
+async def http_visit(
+    session: aiohttp.ClientSession, url: str, user_agent: str, proxy: Optional[str]
+) -> Tuple[str, str, Optional[int]]:
+    """单次访问，返回 (status, note, 传输字节数)，status/note 与 visit_page 相同。"""
+    headers = {
+        "User-Agent": user_agent,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    }
+    try:
+        async with session.get(url, headers=headers, proxy=proxy) as resp:
+            raw = await resp.read()
+            if resp.status >= 400:
+                return "ERROR", f"HTTP {resp.status}", wire_bytes(resp)
+            try:
+                body = raw.decode(resp.charset or "utf-8", errors="replace")
+            except LookupError:
+                body = raw.decode("utf-8", errors="replace")
+            return "SUCCESS", extract_title(body), wire_bytes(resp)
+    except Exception as e:
+        return "ERROR", repr(e), None
+
+
+class ProxyRouter:
+    """为每次访问挑选 (节点名, 代理地址)。"""
+
+    def __init__(self, pool: Optional[MihomoProxyPool], node_ports: Dict[str, int]):
+        self.pool = pool
+        self.node_ports = node_ports
+        self._no_port_for = None
+        self._no_port = set()
+
+    def _unroutable(self) -> set:
+        # 没有独立端口的节点无法单独走，按节点集合缓存（热加载换集合后重新计算）
+        node_set = self.pool.node_set
+        if node_set is not self._no_port_for:
+            self._no_port = {n.get("name") for n in node_set.available if n.get("name") not in self.node_ports}
+            self._no_port_for = node_set
+        return self._no_port
+
+    def prepare(self, url: str) -> bool:
+        """没有独立端口时先切换到一个健康节点，之后的访问都记在它名下；切换不成功返回 False。"""
+        if self.pool is None or self.node_ports:
+            return True
+        for _ in range(max(1, CONFIG["NODE_RETRY"])):
+            node = self.pool.get_node_for_target(url)
+            if node is None:
+                break
+            ok, msg = self.pool.switch_node(node["name"])
+            if ok:
+                return True
+            self.pool.report_failure(node["name"], msg, target=url)
+        return False
+
+    def route(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        if self.pool is None:
+            return None, None
+        if not self.node_ports:
+            # 没有独立端口时只能共用当前全局节点
+            return self.pool.current_node, CONFIG["MIHOMO_PROXY"]
+        node = self.pool.get_node_for_target(url, self._unroutable())
+        port = self.node_ports.get(node.get("name")) if node else None
+        if port is None:
+            return None, None
+        return node.get("name"), f"http://127.0.0.1:{port}"
+
+
+async def run_http_visits(url: str, total: int, concurrency: Optional[int] = None) -> None:
+    """并发执行 total 次访问（total 为 0 时持续运行直到中断）。"""
+    concurrency = concurrency or CONFIG["HTTP_CONCURRENCY"]
+    log_file = get_log_file_path()
+    write_csv_header(log_file)
+
+    pool = None
+    node_ports: Dict[str, int] = {}
+    if CONFIG["USE_PROXY"]:
+        pool = MihomoProxyPool()
+        node_ports = load_node_ports(get_workspace_paths()["output"])
+    router = ProxyRouter(pool, node_ports)
+    if not router.prepare(url):
+        # 节点未知时访问结果无法回报给任何节点，宁可不跑
+        print("❌ 没有独立端口，且无法切换到可用节点，HTTP 引擎未启动")
+        pool.close()
+        return
+
+    print(f"⚡ HTTP 引擎: {url}")
+    print(f"   并发: {concurrency} ，总次数: {total if total > 0 else '无限'}")
+    if node_ports or pool is None:
+        print(f"   代理: {'每节点独立端口' if node_ports else '无'}")
+    else:
+        print(f"   代理: {CONFIG['MIHOMO_PROXY']}（节点 {pool.current_node}）")
+
+    counts = {"SUCCESS": 0, "ERROR": 0}
+    visit_num = 0
+    timeout = aiohttp.ClientTimeout(total=CONFIG["HTTP_TIMEOUT"])
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector, trust_env=False) as session:
+
+        async def one_visit() -> None:
+            nonlocal visit_num
+            visit_num += 1
+            num = visit_num
+            user_agent, screen_size = get_random_device()
+            node, proxy = router.route(url)
+            if pool is not None and node is None:
+                # 没有可路由的节点时不能直连（会暴露本机 IP）：记为跳过，等到最早的熔断冷却结束再继续
+                counts["SKIPPED"] = counts.get("SKIPPED", 0) + 1
+                log_visit(num, url, None, None, user_agent, screen_size, "SKIPPED", "no healthy node")
+                backoff = max(pool.seconds_until_recovery() or 0.0, CONFIG["INTERVAL_MEAN"])
+                await asyncio.sleep(backoff)
+                return
+            start = time.perf_counter()
+            status, note, nbytes = await http_visit(session, url, user_agent, proxy)
+            duration_ms = (time.perf_counter() - start) * 1000
+            counts[status] = counts.get(status, 0) + 1
+            if pool is not None and node:
+                if status == "SUCCESS":
+                    pool.report_success(node, target=url)
+                else:
+                    pool.report_failure(node, note, target=url)
+            exit_ip = pool.get_cached_ip(node) if pool is not None and node else None
+            log_visit(num, url, node, exit_ip, user_agent, screen_size, status, note, duration_ms, nbytes)
+
+        # 固定数量的 worker 协程循环取任务，内存占用与总次数无关
+        remaining = total
+
+        async def worker() -> None:
+            nonlocal remaining
+            while total <= 0 or remaining > 0:
+                remaining -= 1
+                await one_visit()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            if pool is not None:
+                pool.close()
+            close_log_writer()
+
+    print(f"\n📊 HTTP 引擎完成: 成功 {counts.get('SUCCESS', 0)} ，失败 {counts.get('ERROR', 0)} ，跳过 {counts.get('SKIPPED', 0)}")
+    print(f"💾 日志: {log_file}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_http_visits(CONFIG["URL"], CONFIG["MAX_VISITS"]))
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""多进程并行访问：N 个 worker 各自独占一个出口、各自一个浏览器。
+
+selenium_with_proxy.main() 一次只能访问一次再等待。这里启动 N 个 worker 进程：
+
+- 每个 worker 通过 proxy_lease_server.py 租用一个独占节点，浏览器代理直接指向该节点的
+  独立监听端口，互不干扰（需先启动租约服务）；
+- 每个 worker 按自己的间隔（fixed / poisson）访问，每 visits_per_lease 次访问换一个出口；
+- 所有访问结果通过队列交给主进程，由主进程的日志写入器（visit_log.py）批量写入；
+- 开启 METRICS_ENABLED 时主进程在 METRICS_PORT 导出访问结果指标，第 i 个 worker 在
+  METRICS_PORT + i 导出自己进程内的指标（浏览器启动、页面加载等）；
+- Ctrl+C / SIGTERM 时通知所有 worker 完成当前访问后退出、释放租约并关闭浏览器。
+
+用法：
+    python proxy_lease_server.py      # 另一个终端
+    python parallel_visitor.py [--workers N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+from proxy_lease_server import LeaseClient
+from proxy_pool import metrics, parse_ip_echo
+from selenium_with_proxy import (
+    CONFIG,
+    DriverPool,
+    close_log_writer,
+    get_interval,
+    get_log_file_path,
+    get_random_device,
+    get_transferred_bytes,
+    log_visit,
+    visit_page,
+    write_csv_header,
+)
+
+
+@dataclass
+class ParallelConfig:
+    url: str = CONFIG["URL"]
+    workers: int = CONFIG["VISIT_WORKERS"]    # 并行 worker（浏览器）数量
+    max_visits_per_worker: int = 5            # 每个 worker 的访问次数，0 表示无限
+    visits_per_lease: int = 3                 # 同一出口连续访问多少次后换节点（换节点需要重启浏览器）
+    interval_mode: str = CONFIG["INTERVAL_MODE"]
+    interval_mean: float = CONFIG["INTERVAL_MEAN"]
+    headless: bool = CONFIG["HEADLESS"]
+    lease_server: str = "http://127.0.0.1:9300"
+    lease_ttl: float = 30.0
+    shutdown_timeout: float = 60.0            # 等待 worker 完成当前访问的最长时间（秒）
+
+
+def lookup_exit_ip(proxy: str) -> Optional[str]:
+    """经指定代理端口查询出口 IP。"""
+    try:
+        resp = requests.get(CONFIG["IP_ECHO_URL"], proxies={"http": proxy, "https": proxy}, timeout=10)
+        if resp.status_code == 200:
+            return parse_ip_echo(resp.text)
+    except requests.RequestException:
+        pass
+    return None
+
+
+def worker_main(
+    worker_id: str, cfg: ParallelConfig, results: mp.Queue, stop: mp.Event, metrics_port: Optional[int] = None
+) -> None:
+    """单个 worker：租出口 → 启动绑定该出口的浏览器 → 按间隔访问 → 到次数换出口。"""
+    # Ctrl+C 只由主进程处理，worker 通过 stop 事件优雅退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if metrics_port is not None:
+        # 子进程的指标只在本进程内，主进程的端点看不到，各 worker 单独导出
+        metrics.clear()
+        metrics.start_exporter(port=metrics_port)
+
+    visits = 0
+    lease_client = LeaseClient(worker_id, cfg.lease_server, cfg.lease_ttl)
+    while not stop.is_set():
+        if cfg.max_visits_per_worker and visits >= cfg.max_visits_per_worker:
+            break
+
+        try:
+            lease = lease_client.acquire()
+        except requests.RequestException as e:
+            print(f"[{worker_id}] ❌ 无法连接租约服务: {e}")
+            lease = None
+        if lease is None:
+            print(f"[{worker_id}] ⚠️  暂无空闲节点，5 秒后重试")
+            stop.wait(5)
+            continue
+
+        node, proxy = lease["node"], lease["proxy"]
+        exit_ip = lookup_exit_ip(proxy)
+        if not exit_ip:
+            print(f"[{worker_id}] ⚠️  {node} 无法获取出口 IP，换节点")
+            lease_client.release(success=False, error="exit ip lookup failed")
+            continue
+        print(f"[{worker_id}] 🔐 租用节点: {node} ({proxy}) -> {exit_ip}")
+
+        driver_pool = DriverPool(size=1, use_proxy=True, headless=cfg.headless, proxy_address=proxy)
+        lease_ok = True
+        try:
+            for _ in range(max(1, cfg.visits_per_lease)):
+                if stop.is_set() or (cfg.max_visits_per_worker and visits >= cfg.max_visits_per_worker):
+                    break
+                visits += 1
+                user_agent, screen_size = get_random_device()
+                driver, broken, nbytes = None, False, None
+                start = time.perf_counter()
+                try:
+                    driver = driver_pool.acquire(user_agent, screen_size)
+                    status, note = visit_page(driver, cfg.url)
+                    nbytes = get_transferred_bytes(driver)
+                except Exception as e:
+                    broken = True
+                    status, note = "EXCEPTION", str(e)
+                finally:
+                    driver_pool.release(driver, broken)
+
+                print(f"[{worker_id}] {'✅' if status == 'SUCCESS' else '❌'} #{visits} {node}: {note}")
+                duration_ms = (time.perf_counter() - start) * 1000
+                results.put((cfg.url, node, exit_ip, user_agent, screen_size, status, note, duration_ms, nbytes))
+                if status != "SUCCESS":
+                    # 出现问题立即换出口，不在坏节点上继续浪费访问
+                    lease_ok = False
+                    break
+
+                stop.wait(get_interval(cfg.interval_mode, cfg.interval_mean))
+        finally:
+            driver_pool.close()
+            lease_client.release(success=lease_ok, error=None if lease_ok else "visit failed")
+
+    print(f"[{worker_id}] 🏁 退出，共访问 {visits} 次")
+
+
+def log_writer(results: mp.Queue, done: threading.Event) -> None:
+    """把 worker 进程的结果转交给主进程的日志写入器，按到达顺序编号。"""
+    visit_num = 0
+    while not (done.is_set() and results.empty()):
+        try:
+            row = results.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        visit_num += 1
+        log_visit(visit_num, *row)
+
+
+def main(cfg: Optional[ParallelConfig] = None) -> None:
+    cfg = cfg or ParallelConfig()
+    log_file = get_log_file_path()
+    write_csv_header(log_file)
+    # 访问结果汇总到主进程写日志，访问指标也在主进程统计；worker 进程内的指标由各 worker 自己导出
+    metrics.start_exporter()
+
+    print(f"🚀 并行访问: {cfg.workers} 个 worker")
+    print(f"📍 目标 URL: {cfg.url}")
+    print(f"🔐 租约服务: {cfg.lease_server}")
+    print(f"💾 日志文件: {log_file}")
+    print("-" * 60)
+
+    results: mp.Queue = mp.Queue()
+    stop = mp.Event()
+    done = threading.Event()
+    writer = threading.Thread(target=log_writer, args=(results, done), daemon=True)
+    writer.start()
+
+    def request_stop(signum, frame):
+        if not stop.is_set():
+            print("\n⚠️  收到退出信号，等待 worker 完成当前访问...")
+            stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    procs = [
+        mp.Process(
+            target=worker_main,
+            args=(f"worker-{i + 1}", cfg, results, stop, CONFIG["METRICS_PORT"] + i + 1 if metrics.enabled else None),
+            name=f"worker-{i + 1}",
+        )
+        for i in range(cfg.workers)
+    ]
+    for p in procs:
+        p.start()
+
+    while any(p.is_alive() for p in procs) and not stop.is_set():
+        stop.wait(0.5)
+
+    deadline = time.monotonic() + cfg.shutdown_timeout
+    for p in procs:
+        p.join(timeout=max(0.0, deadline - time.monotonic()))
+        if p.is_alive():
+            print(f"⚠️  {p.name} 未能按时退出，强制终止")
+            p.terminate()
+            p.join()
+
+    done.set()
+    writer.join()
+    close_log_writer()
+    print(f"\n💾 日志: {log_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程并行访问（每个 worker 独占出口和浏览器）")
+    parser.add_argument("--workers", type=int, default=ParallelConfig.workers, help="worker 数量，默认取 CONFIG['VISIT_WORKERS']")
+    args = parser.parse_args()
+    main(ParallelConfig(workers=args.workers))
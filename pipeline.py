@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""一条命令完成 抓取订阅 → 生成配置 → 测速 → 发布可用节点，各阶段流式衔接。
+
+原来的流程是依次运行 fetch_proxies.py、generate_clash_profile.py、手动导入 Mihomo、check_proxies.py，
+每一步都要等上一步全部完成并写完文件。这里四个阶段是同时运行的 asyncio 任务，用队列相连：
+
+    fetch    并发拉取所有订阅，每个订阅解析完就把（去重后的）节点作为一批送出；
+    profile  合并短时间内到达的批次，重写 clash_profile.yaml 并通过 PUT /configs 热重载 Mihomo，
+             重载完成后把新节点名交给测速；
+    check    与 check_proxies.py 相同的 /proxies/{name}/delay 并发测速，节点一到就开始测；
+    publish  每隔 publish_interval 秒把已有结果原子写入 proxy_test_results.json，
+             运行中的代理池（WATCH_RESULTS）会自动热加载，第一个可用节点几秒内就能用上。
+
+重载 Mihomo 配置时会等进行中的测速结束，并暂停开始新的测速，避免测速请求落在重载过程中。
+结束时输出各阶段的吞吐量（条/秒）和得到第一个可用节点的耗时。
+
+用法：
+    python pipeline.py 订阅URL [订阅URL ...]
+    python pipeline.py                 # 订阅链接从 proxies/subscriptions.txt 读取（每行一个）
+    python pipeline.py --raw           # 不抓取，直接使用已有的 proxies/raw_nodes.yaml
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import yaml
+
+from check_proxies import MihomoConfig, results_payload, test_one_proxy, write_results_file
+from fetch_proxies import fetch_from_clash_subscription, node_key, save_nodes
+from generate_clash_profile import build_profile, get_workspace_paths, load_raw_nodes
+from proxy_pool import CONFIG, metrics
+
+
+@dataclass
+class PipelineConfig:
+    subscriptions: List[str] = field(default_factory=list)
+    raw_nodes: bool = False                # 使用已有 raw_nodes.yaml 代替抓取
+    raw_batch_size: int = 200              # --raw 时每批节点数
+    controller: str = field(default_factory=lambda: CONFIG["MIHOMO_API"])
+    secret: str = field(default_factory=lambda: CONFIG["MIHOMO_SECRET"])
+    test_url: str = "https://www.google.com"
+    timeout: float = 8.0                   # 单节点测速超时（秒）
+    max_concurrency: int = 20              # 测速并发数
+    profile_debounce: float = 0.5          # 合并这段时间内到达的批次后再重载 Mihomo（秒）
+    publish_interval: float = 1.0          # 结果文件最短写入间隔（秒）
+    progress_interval: float = 5.0         # 进度输出间隔（秒）
+
+
+@dataclass
+class StageStats:
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    first_out: Optional[float] = None
+
+    def begin(self) -> None:
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def emit(self, n: int = 1) -> None:
+        self.items_out += n
+        if self.first_out is None and n > 0:
+            self.first_out = time.perf_counter()
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def throughput(self) -> float:
+        elapsed = self.elapsed()
+        return self.items_out / elapsed if elapsed > 0 else 0.0
+
+
+class ReloadGate:
+    """测速与 Mihomo 重载互斥：重载等进行中的测速结束，重载期间不开始新的测速"""
+
+    def __init__(self) -> None:
+        self._cond = asyncio.Condition()
+        self._active = 0
+        self._reloading = False
+
+    @contextlib.asynccontextmanager
+    async def testing(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._reloading)
+            self._active += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def reloading(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._reloading)
+            self._reloading = True
+            await self._cond.wait_for(lambda: self._active == 0)
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._reloading = False
+                self._cond.notify_all()
+
+
+def load_subscriptions(path: str) -> List[str]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class Pipeline:
+    def __init__(self, cfg: PipelineConfig):
+        self.cfg = cfg
+        self.paths = get_workspace_paths()
+        self.results_path = os.path.join(self.paths["proxies"], "proxy_test_results.json")
+        self.stats = {name: StageStats(name) for name in ("fetch", "profile", "check", "publish")}
+        self.gate = ReloadGate()
+        self.raw_nodes: List[Dict[str, Any]] = []
+        self.proxies: List[Dict[str, Any]] = []  # 已写入配置的 Clash 节点（顺序固定，重命名结果稳定）
+        self.ok: List[Tuple[str, float]] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.started = 0.0
+        self.first_usable: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.cfg.secret}"} if self.cfg.secret else {}
+
+    # ---------- fetch ----------
+
+    async def fetch_stage(self, out: asyncio.Queue) -> None:
+        stats = self.stats["fetch"]
+        stats.begin()
+        seen = set()
+
+        def forward(nodes: List[Dict[str, Any]]) -> None:
+            stats.items_in += len(nodes)
+            batch = []
+            for node in nodes:
+                key = node_key(node)
+                if key not in seen:
+                    seen.add(key)
+                    batch.append(node)
+            if batch:
+                self.raw_nodes.extend(batch)
+                stats.emit(len(batch))
+                out.put_nowait(batch)
+
+        try:
+            if self.cfg.raw_nodes:
+                proxies = load_raw_nodes(self.paths["raw_yaml"])
+                size = max(1, self.cfg.raw_batch_size)
+                for i in range(0, len(proxies), size):
+                    forward([
+                        {"name": p.get("name"), "type": p.get("type"), "server": p.get("server"),
+                         "port": p.get("port"), "config": p, "raw_link": None}
+                        for p in proxies[i:i + size]
+                    ])
+                    await asyncio.sleep(0)
+            else:
+                tasks = [asyncio.create_task(asyncio.to_thread(fetch_from_clash_subscription, url))
+                         for url in self.cfg.subscriptions]
+                # 哪个订阅先解析完就先送出哪一批
+                for task in asyncio.as_completed(tasks):
+                    forward(await task)
+        finally:
+            stats.finished = time.perf_counter()
+            await out.put(None)
+
+    # ---------- profile ----------
+
+    def _write_profile(self) -> Tuple[str, List[str]]:
+        """写入当前全部节点的配置，返回 (YAML 文本, 去重后的节点名)"""
+        profile = build_profile(self.proxies)
+        # 控制器地址和 secret 与本次使用的保持一致，重载后仍能访问
+        parsed = urlparse(self.cfg.controller)
+        if parsed.hostname and parsed.port:
+            profile["external-controller"] = f"{parsed.hostname}:{parsed.port}"
+        profile["secret"] = self.cfg.secret or ""
+        text = yaml.safe_dump(profile, allow_unicode=True, sort_keys=False)
+        os.makedirs(self.paths["proxies"], exist_ok=True)
+        tmp_path = self.paths["output"] + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.paths["output"])
+        return text, profile["proxy-groups"][0]["proxies"]
+
+    async def _reload_mihomo(self, session: aiohttp.ClientSession, text: str) -> None:
+        # 以 payload 方式提交，不受 Mihomo 对配置文件路径的限制
+        url = f"{self.cfg.controller}/configs"
+        async with session.put(url, params={"force": "true"}, json={"payload": text}) as resp:
+            if resp.status not in (200, 204):
+                raise RuntimeError(f"HTTP {resp.status}: {(await resp.text())[:200]}")
+
+    async def profile_stage(self, inbox: asyncio.Queue, out: asyncio.Queue, session: aiohttp.ClientSession) -> None:
+        stats = self.stats["profile"]
+        done = False
+        try:
+            while not done:
+                batch = await inbox.get()
+                if batch is None:
+                    break
+                stats.begin()
+                batches = [batch]
+                # 合并紧接着到达的批次，减少重载次数
+                deadline = time.perf_counter() + self.cfg.profile_debounce
+                while True:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        nxt = await asyncio.wait_for(inbox.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if nxt is None:
+                        done = True
+                        break
+                    batches.append(nxt)
+
+                before = len(self.proxies)
+                for nodes in batches:
+                    stats.items_in += len(nodes)
+                    # 与 fetch_proxies.save_nodes 相同：只有 Clash 配置的节点能写进配置
+                    self.proxies.extend(n["config"] for n in nodes if isinstance(n.get("config"), dict))
+                if len(self.proxies) == before:
+                    continue
+                text, names = await asyncio.to_thread(self._write_profile)
+                names = names[before:]  # 只追加节点，前面节点的名称不会变
+                async with self.gate.reloading():
+                    try:
+                        await self._reload_mihomo(session, text)
+                    except Exception as e:
+                        self.error = f"重载 Mihomo 配置失败: {e}"
+                        print(f"❌ {self.error}")
+                        print("   可手动导入 proxies/clash_profile.yaml 后运行 check_proxies.py。")
+                        return
+                stats.emit(len(names))
+                for name in names:
+                    out.put_nowait(name)
+        finally:
+            stats.finished = time.perf_counter()
+            await out.put(None)
+
+    # ---------- check ----------
+
+    async def check_stage(self, inbox: asyncio.Queue, out: asyncio.Queue, session: aiohttp.ClientSession) -> None:
+        stats = self.stats["check"]
+        cfg = MihomoConfig(controller=self.cfg.controller, secret=self.cfg.secret, test_url=self.cfg.test_url,
+                           timeout=self.cfg.timeout, max_concurrency=self.cfg.max_concurrency)
+        sem = asyncio.Semaphore(self.cfg.max_concurrency)
+        tasks = set()
+
+        async def worker(name: str) -> None:
+            async with sem:
+                async with self.gate.testing():
+                    result = await test_one_proxy(session, cfg, name)
+            stats.emit()
+            out.put_nowait(result)
+
+        try:
+            while True:
+                name = await inbox.get()
+                if name is None:
+                    break
+                stats.begin()
+                stats.items_in += 1
+                task = asyncio.create_task(worker(name))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            stats.finished = time.perf_counter()
+            await out.put(None)
+
+    # ---------- publish ----------
+
+    def _publish(self) -> None:
+        payload = results_payload(self.ok, self.failed, generated_by="pipeline.py")
+        write_results_file(self.results_path, payload)
+
+    async def publish_stage(self, inbox: asyncio.Queue) -> None:
+        stats = self.stats["publish"]
+        dirty = False
+        last_write = float("-inf")
+        while True:
+            timeout = None
+            if dirty:
+                timeout = max(0.01, last_write + self.cfg.publish_interval - time.perf_counter())
+            try:
+                result = await asyncio.wait_for(inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                result = False  # 到了写入时间
+            if result is None:
+                break
+            if result:
+                stats.begin()
+                stats.items_in += 1
+                name, latency, err = result
+                if latency is None:
+                    self.failed.append((name, err or "unknown error"))
+                else:
+                    self.ok.append((name, latency))
+                    stats.emit()
+                    if self.first_usable is None:
+                        self.first_usable = time.perf_counter() - self.started
+                        print(f"⚡ 第一个可用节点: {name}（{latency:.0f} ms），距开始 {self.first_usable:.1f}s")
+                        last_write = float("-inf")  # 第一个可用节点立即发布
+                dirty = True
+            if dirty and time.perf_counter() - last_write >= self.cfg.publish_interval:
+                await asyncio.to_thread(self._publish)
+                last_write = time.perf_counter()
+                dirty = False
+        if dirty:
+            await asyncio.to_thread(self._publish)
+        stats.finished = time.perf_counter()
+
+    # ---------- 运行 ----------
+
+    async def _progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.cfg.progress_interval)
+            s = self.stats
+            print(f"⏳ {time.perf_counter() - self.started:5.1f}s  抓取 {s['fetch'].items_out} → "
+                  f"配置 {s['profile'].items_out} → 测速 {s['check'].items_out}/{s['check'].items_in} → "
+                  f"可用 {len(self.ok)}")
+
+    async def run(self) -> None:
+        self.started = time.perf_counter()
+        q_raw: asyncio.Queue = asyncio.Queue()
+        q_names: asyncio.Queue = asyncio.Queue()
+        q_results: asyncio.Queue = asyncio.Queue()
+        timeout = aiohttp.ClientTimeout(total=self.cfg.timeout + 1.0)
+        connector = aiohttp.TCPConnector(limit=0)
+        progress = asyncio.create_task(self._progress())
+        try:
+            async with aiohttp.ClientSession(headers=self._headers(), timeout=timeout, connector=connector) as session:
+                await asyncio.gather(
+                    self.fetch_stage(q_raw),
+                    self.profile_stage(q_raw, q_names, session),
+                    self.check_stage(q_names, q_results, session),
+                    self.publish_stage(q_results),
+                )
+        finally:
+            progress.cancel()
+        if self.raw_nodes and not self.cfg.raw_nodes:
+            # 与 fetch_proxies.py 的产物保持一致，之后仍可单独运行各脚本
+            await asyncio.to_thread(save_nodes, self.raw_nodes)
+
+    def report(self) -> None:
+        total = time.perf_counter() - self.started
+        print("\n📈 各阶段吞吐量:")
+        print(f"   {'阶段':<8}{'输入':>8}{'输出':>8}{'耗时(s)':>10}{'条/秒':>10}{'首条(s)':>10}")
+        for stats in self.stats.values():
+            first = f"{stats.first_out - self.started:.1f}" if stats.first_out else "-"
+            print(f"   {stats.name:<8}{stats.items_in:>8}{stats.items_out:>8}{stats.elapsed():>10.1f}"
+                  f"{stats.throughput():>10.1f}{first:>10}")
+        first = f"{self.first_usable:.1f}s" if self.first_usable is not None else "无"
+        print(f"\n统计：可用 {len(self.ok)} ，失败 {len(self.failed)} ，总耗时 {total:.1f}s ，第一个可用节点 {first}")
+        if self.stats["publish"].items_in:
+            print(f"💾 结果已写入: {self.results_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="抓取 → 配置 → 测速 → 发布 流水线")
+    parser.add_argument("subscriptions", nargs="*", help="订阅链接（默认读取 proxies/subscriptions.txt）")
+    parser.add_argument("--raw", action="store_true", help="使用已有的 proxies/raw_nodes.yaml，不抓取订阅")
+    parser.add_argument("--concurrency", type=int, default=PipelineConfig.max_concurrency, help="测速并发数")
+    parser.add_argument("--test-url", default=PipelineConfig.test_url, help="测速目标")
+    args = parser.parse_args()
+
+    subscriptions = args.subscriptions
+    if not subscriptions and not args.raw:
+        subscriptions = load_subscriptions(os.path.join(get_workspace_paths()["proxies"], "subscriptions.txt"))
+        if not subscriptions:
+            print("❌ 没有订阅链接：在命令行给出，或写入 proxies/subscriptions.txt（每行一个），或使用 --raw。")
+            return
+
+    cfg = PipelineConfig(subscriptions=subscriptions, raw_nodes=args.raw,
+                         max_concurrency=args.concurrency, test_url=args.test_url)
+    source = "raw_nodes.yaml" if cfg.raw_nodes else f"{len(cfg.subscriptions)} 个订阅"
+    print(f"🚀 流水线启动：{source} → clash_profile.yaml → {cfg.controller} 测速 → proxy_test_results.json")
+    print(f"   并发数: {cfg.max_concurrency} ，超时: {cfg.timeout}s ，目标 {cfg.test_url}")
+
+    metrics.start_exporter()
+    pipeline = Pipeline(cfg)
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        print("\n⏹️  已中断")
+    except (FileNotFoundError, ValueError) as exc:
+        print(f"❌ {exc}")
+        return
+    pipeline.report()
+
+
+if __name__ == "__main__":
+    main()
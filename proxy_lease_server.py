@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""多进程共享同一个 Mihomo 时的节点租约服务。
+
+MihomoProxyPool 切换的是全局 SWITCH_GROUP，两个爬虫进程同时切换会互相覆盖。
+本服务改为给每个 worker 独占分配一个出口节点：
+
+- 出口通过 generate_clash_profile.py 生成的每节点独立监听端口（listeners）提供，
+  worker 直接把代理设为 http://127.0.0.1:{port}，不需要再切换任何代理组；
+- 同一节点同一时间只租给一个 worker；
+- worker 需要在 ttl 内发送心跳续约，超时或进程已退出的租约会被回收。
+
+HTTP 接口（JSON）：
+    POST /lease    {"worker_id": "...", "pid": 123, "ttl": 30}  -> 租约
+    POST /renew    {"lease_id": "..."}                         -> 续约后的租约
+    POST /release  {"lease_id": "...", "success": true}        -> {"released": true}
+    GET  /leases                                               -> 当前全部租约
+
+用法：
+    python proxy_lease_server.py
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import requests
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from proxy_pool import MihomoProxyPool
+
+
+@dataclass
+class LeaseConfig:
+    host: str = "127.0.0.1"
+    port: int = 9300
+    default_ttl: float = 30.0              # 默认租约有效期（秒），worker 需在此之前续约
+    max_ttl: float = 300.0
+    reap_interval: float = 2.0             # 回收过期租约的检查间隔（秒）
+    proxy_host: str = "127.0.0.1"          # 每节点监听端口所在主机
+
+
+@dataclass
+class Lease:
+    lease_id: str
+    worker_id: str
+    node: str
+    port: int
+    proxy: str
+    pid: Optional[int]
+    ttl: float
+    expires_at: float
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """检查本机进程是否仍存活（无法判断时视为存活）。"""
+    if not pid:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class LeaseManager:
+    """线程安全的租约表：节点独占分配、续约、释放与回收。"""
+
+    def __init__(self, pool: MihomoProxyPool, node_ports: Dict[str, int], cfg: LeaseConfig):
+        self.pool = pool
+        self.node_ports = node_ports
+        self.cfg = cfg
+        self._lock = threading.Lock()
+        self._leases: Dict[str, Lease] = {}       # lease_id -> Lease
+        self._by_node: Dict[str, str] = {}        # node -> lease_id
+
+    def acquire(self, worker_id: str, pid: Optional[int] = None, ttl: Optional[float] = None) -> Optional[Lease]:
+        ttl = min(float(ttl or self.cfg.default_ttl), self.cfg.max_ttl)
+        with self._lock:
+            self._reap_locked()
+            # 只有配置了独立端口且未被占用的节点才可租
+            exclude = set(self._by_node) | {
+                n.get("name") for n in self.pool.available_nodes if n.get("name") not in self.node_ports
+            }
+            node = self.pool.get_random_node(exclude=exclude)
+            if node is None:
+                return None
+            name = node["name"]
+            port = self.node_ports[name]
+            lease = Lease(
+                lease_id=uuid.uuid4().hex,
+                worker_id=worker_id,
+                node=name,
+                port=port,
+                proxy=f"http://{self.cfg.proxy_host}:{port}",
+                pid=pid,
+                ttl=ttl,
+                expires_at=time.time() + ttl,
+            )
+            self._leases[lease.lease_id] = lease
+            self._by_node[name] = lease.lease_id
+            return lease
+
+    def renew(self, lease_id: str) -> Optional[Lease]:
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return None
+            now = time.time()
+            if lease.expires_at < now or not _pid_alive(lease.pid):
+                # 已过期但还没被回收线程清理的租约不能续回来：节点可能马上被租给别人
+                self._drop_locked(lease)
+                return None
+            lease.expires_at = now + lease.ttl
+            return lease
+
+    def release(self, lease_id: str, success: Optional[bool] = None, error: Optional[str] = None) -> bool:
+        # 与 acquire 一样，对代理池的读写都在 _lock 内进行
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+            if lease is None:
+                return False
+            self._by_node.pop(lease.node, None)
+            # 释放时顺带回报节点健康，供下一次分配参考
+            if success is True:
+                self.pool.report_success(lease.node)
+            elif success is False:
+                self.pool.report_failure(lease.node, error)
+            else:
+                # 没有结果可回报：交还租用时占用的探测名额
+                self.pool.release_probe(lease.node)
+        return True
+
+    def reap(self) -> int:
+        with self._lock:
+            return self._reap_locked()
+
+    def _reap_locked(self) -> int:
+        now = time.time()
+        dead = [
+            lid for lid, lease in self._leases.items()
+            if lease.expires_at < now or not _pid_alive(lease.pid)
+        ]
+        for lid in dead:
+            self._drop_locked(self._leases[lid])
+        return len(dead)
+
+    def _drop_locked(self, lease: Lease) -> None:
+        self._leases.pop(lease.lease_id, None)
+        self._by_node.pop(lease.node, None)
+        self.pool.release_probe(lease.node)
+        print(f"♻️  回收租约: {lease.node} (worker={lease.worker_id})")
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [asdict(lease) for lease in self._leases.values()]
+
+
+def make_handler(manager: LeaseManager):
+    class LeaseHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, code: int, payload) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            try:
+                return json.loads(self.rfile.read(length).decode("utf-8")) or {}
+            except ValueError:
+                return {}
+
+        def do_GET(self):
+            if self.path == "/leases":
+                self._send(200, {"leases": manager.snapshot()})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            data = self._read_json()
+            if self.path == "/lease":
+                lease = manager.acquire(str(data.get("worker_id") or "anonymous"), data.get("pid"), data.get("ttl"))
+                if lease is None:
+                    self._send(503, {"error": "no free node"})
+                else:
+                    self._send(200, asdict(lease))
+            elif self.path == "/renew":
+                lease = manager.renew(str(data.get("lease_id") or ""))
+                if lease is None:
+                    self._send(404, {"error": "unknown or expired lease"})
+                else:
+                    self._send(200, asdict(lease))
+            elif self.path == "/release":
+                released = manager.release(str(data.get("lease_id") or ""), data.get("success"), data.get("error"))
+                self._send(200, {"released": released})
+            else:
+                self._send(404, {"error": "not found"})
+
+    return LeaseHandler
+
+
+class LeaseClient:
+    """worker 侧客户端：租用独占出口、后台心跳续约、用完释放。
+
+    续约返回 404（租约已过期被回收）时立即停止使用旧节点并重新租用，新租约原地写入同一个
+    lease 字典，因此每次请求前都应重新读取 lease["proxy"]；重新租用失败时 lease 被清空
+    （读取 proxy 抛 KeyError，而不是悄悄继续用别人的节点），心跳线程会继续尝试。
+
+    用法：
+        with LeaseClient("worker-1") as lease:
+            requests.get(url, proxies={"http": lease["proxy"], "https": lease["proxy"]})
+    """
+
+    def __init__(self, worker_id: str, server: str = "http://127.0.0.1:9300", ttl: float = 30.0):
+        self.worker_id = worker_id
+        self.server = server.rstrip("/")
+        self.ttl = ttl
+        self.lease: Optional[dict] = None
+        self.session = requests.Session()
+        self.session.trust_env = False
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _request_lease(self) -> Optional[dict]:
+        try:
+            resp = self.session.post(
+                f"{self.server}/lease",
+                json={"worker_id": self.worker_id, "pid": os.getpid(), "ttl": self.ttl},
+                timeout=5,
+            )
+        except requests.RequestException:
+            return None
+        return resp.json() if resp.status_code == 200 else None
+
+    def acquire(self) -> Optional[dict]:
+        # 同一个客户端只保留一个心跳线程：先停掉上一次租用的心跳，避免两个循环同时读写 self.lease
+        self._stop_heartbeat()
+        lease = self._request_lease()
+        if lease is None:
+            return None
+        self.lease = lease
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat.start()
+        return self.lease
+
+    def _stop_heartbeat(self) -> None:
+        self._stop.set()
+        heartbeat, self._heartbeat = self._heartbeat, None
+        if heartbeat is not None and heartbeat is not threading.current_thread():
+            heartbeat.join()
+
+    def renew(self) -> bool:
+        if self.lease is None:
+            return False
+        if not self.lease:
+            return self._reacquire()
+        try:
+            resp = self.session.post(f"{self.server}/renew", json={"lease_id": self.lease["lease_id"]}, timeout=5)
+        except requests.RequestException:
+            return False
+        if resp.status_code == 404:
+            print(f"⚠️  租约已失效，停止使用 {self.lease.get('node')} 并重新租用: {self.worker_id}")
+            self.lease.clear()
+            return self._reacquire()
+        return resp.status_code == 200
+
+    def _reacquire(self) -> bool:
+        lease = self._request_lease()
+        if lease is None or self.lease is None:
+            return False
+        self.lease.update(lease)
+        print(f"🔐 重新租用: {lease['node']} ({lease['proxy']})")
+        return True
+
+    def release(self, success: Optional[bool] = None, error: Optional[str] = None) -> None:
+        # 等心跳线程退出后再清空 lease，续约不会读到 None
+        self._stop_heartbeat()
+        if not self.lease:
+            self.lease = None
+            return
+        try:
+            self.session.post(
+                f"{self.server}/release",
+                json={"lease_id": self.lease["lease_id"], "success": success, "error": error},
+                timeout=5,
+            )
+        except requests.RequestException:
+            pass
+        self.lease = None
+
+    def _heartbeat_loop(self) -> None:
+        # 每 1/3 ttl 续约一次，连续失败几次也还有余量
+        while not self._stop.wait(self.ttl / 3.0):
+            if not self.renew():
+                print(f"⚠️  租约续约失败: {self.worker_id}")
+
+    def __enter__(self) -> Optional[dict]:
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # 正常退出按成功回报：success=None 不会结束 half_open 节点的探测
+        self.release(success=exc_type is None, error=repr(exc) if exc else None)
+
+
+def serve(cfg: LeaseConfig, manager: LeaseManager) -> ThreadingHTTPServer:
+    """启动 HTTP 服务与后台回收线程，返回 server（调用方负责 serve_forever/shutdown）。"""
+    server = ThreadingHTTPServer((cfg.host, cfg.port), make_handler(manager))
+
+    def reaper():
+        while True:
+            time.sleep(cfg.reap_interval)
+            manager.reap()
+
+    threading.Thread(target=reaper, daemon=True).start()
+    return server
+
+
+def main():
+    cfg = LeaseConfig()
+    node_ports = load_node_ports(get_workspace_paths()["output"])
+    if not node_ports:
+        print("❌ clash_profile.yaml 中没有 listeners，请用 generate_clash_profile.py 重新生成并导入 Mihomo。")
+        return
+
+    pool = MihomoProxyPool()
+    pool.start_watching()
+    leasable = sum(1 for n in pool.available_nodes if n.get("name") in node_ports)
+    print(f"🔐 可租用节点: {leasable} 个（共 {len(node_ports)} 个独立端口）")
+
+    server = serve(cfg, LeaseManager(pool, node_ports, cfg))
+    print(f"🚀 租约服务已启动: http://{cfg.host}:{cfg.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断")
+    finally:
+        server.server_close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
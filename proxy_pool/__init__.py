@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+代理池库：配置、节点健康/选择逻辑与 Mihomo 控制器客户端
+
+只需要切换节点、查询出口 IP 的小工具和健康探测应从这里导入，而不是 selenium_with_proxy.py
+（后者会加载 numpy、selenium、webdriver_manager）：
+
+    from proxy_pool import CONFIG, MihomoProxyPool
+
+子模块按需加载（PEP 562 模块级 __getattr__），requests 在创建第一个会话时才导入。
+导入耗时可用 python -m proxy_pool.bench_import 测量。
+"""
+import importlib
+
+_EXPORTS = {
+    "CONFIG": "config",
+    "NodeHealth": "nodes",
+    "HashRing": "nodes",
+    "NodeSet": "nodes",
+    "parse_test_results": "nodes",
+    "BaseProxyPool": "pool",
+    "MihomoProxyPool": "mihomo",
+    "parse_ip_echo": "mihomo",
+    "TrafficMonitor": "monitor",
+    "NodeTable": "table",
+    "TableNodeSet": "table",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 之后的访问不再经过 __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+按目标域名学习节点表现（Thompson 采样）
+
+check_proxies.py 只用一个 test_url 测速，能打开 google.com 的节点在实际目标上仍可能被拦截或弹验证码。
+这里为每个（目标域名, 节点）记录访问成功 / 失败次数，作为成功率的 Beta(alpha, beta) 后验：
+
+- 选择：对候选节点各抽一个成功率样本，取最大者。在该域名上表现好的出口被多用，访问次数少、
+  不确定的出口仍有机会被选中（探索）；
+- 更新 O(1)：一次访问只改一个（域名, 节点）的计数；计数按半衰期随时间衰减回先验 Beta(1, 1)，
+  出口被目标封禁或解封后能重新学习；
+- 从未在该域名上访问过的节点共用一个先验：该域名上所有节点的总体成功率，强度相当于 2 次访问。
+  它们作为一个整体参与选择，最多抽 explore_cap 个样本取最大值——节点池很大时，上千个未访问节点的
+  样本最大值几乎总是接近 1，会让已知好用的出口永远抢不过探索；选择开销只与该域名上访问过的节点数有关；
+- 状态保存为 JSON（先写临时文件再原子替换），跨运行保留。
+"""
+import os
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse
+
+
+def target_key(target):
+    """URL 或域名 -> 学习状态的键（小写主机名）"""
+    if not target:
+        return None
+    if "://" in target:
+        return (urlparse(target).hostname or "").lower() or None
+    return target.lower()
+
+
+class DomainBandit:
+    """
+    每个目标域名一组 Beta 后验：arms[域名][节点名] = [alpha, beta, 更新时间]
+
+    path 为 None 时只在内存中学习；half_life 为 0 时计数不衰减。
+    """
+
+    def __init__(self, path=None, half_life=86400, save_interval=30, explore_cap=4):
+        self.path = path
+        self.half_life = half_life
+        self.save_interval = save_interval  # 有更新时最多每隔多少秒写一次文件
+        self.explore_cap = max(1, explore_cap)  # 未访问节点整体最多抽几个样本
+        self.arms = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        if path:
+            self.load()
+
+    def posterior(self, arm, now):
+        """按半衰期衰减后的 (alpha, beta)"""
+        alpha, beta, updated = arm
+        if self.half_life <= 0 or now <= updated:
+            return alpha, beta
+        factor = 0.5 ** ((now - updated) / self.half_life)
+        return 1.0 + (alpha - 1.0) * factor, 1.0 + (beta - 1.0) * factor
+
+    def sample(self, arm, now):
+        return random.betavariate(*self.posterior(arm, now))
+
+    def domain_arms(self, domain):
+        """该域名上访问过的节点 {节点名: [alpha, beta, 更新时间]}（没有时为空字典）"""
+        return self.arms.get(domain) or {}
+
+    def prior(self, domain, now):
+        """未访问节点的先验 (alpha, beta)：均值为该域名的总体成功率（平滑），强度 2；没有记录时为 Beta(1, 1)"""
+        successes = failures = 0.0
+        for arm in list(self.domain_arms(domain).values()):
+            alpha, beta = self.posterior(arm, now)
+            successes += alpha - 1.0
+            failures += beta - 1.0
+        mean = (successes + 1.0) / (successes + failures + 2.0)
+        return 2.0 * mean, 2.0 * (1.0 - mean)
+
+    def sample_unexplored(self, domain, count, now):
+        """count 个未访问节点的先验样本最大值（最多抽 explore_cap 个）；没有未访问节点时为 -1"""
+        if count <= 0:
+            return -1.0
+        alpha, beta = self.prior(domain, now)
+        return max(random.betavariate(alpha, beta) for _ in range(min(count, self.explore_cap)))
+
+    def update(self, domain, node_name, success, now=None):
+        """记录一次访问结果"""
+        if not domain or not node_name:
+            return
+        if now is None:
+            now = time.time()
+        with self._lock:
+            arms = self.arms.setdefault(domain, {})
+            arm = arms.get(node_name)
+            alpha, beta = self.posterior(arm, now) if arm else (1.0, 1.0)
+            if success:
+                alpha += 1.0
+            else:
+                beta += 1.0
+            arms[node_name] = [alpha, beta, now]
+            self._dirty = True
+        if self.path and now - self._saved_at >= self.save_interval:
+            self.save()
+
+    def ranking(self, domain, top=5, now=None):
+        """该域名上后验均值最高的节点：[(节点名, 成功率均值, 有效访问次数), ...]"""
+        if now is None:
+            now = time.time()
+        rows = []
+        for name, arm in list(self.domain_arms(domain).items()):
+            alpha, beta = self.posterior(arm, now)
+            rows.append((name, alpha / (alpha + beta), alpha + beta - 2.0))
+        rows.sort(key=lambda r: r[1], reverse=True)
+        return rows[:top]
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  学习状态读取失败，重新开始: {e}")
+            return
+        with self._lock:
+            self.arms = {
+                domain: {name: [float(a), float(b), float(t)] for name, (a, b, t) in arms.items()}
+                for domain, arms in (data.get("domains") or {}).items()
+            }
+
+    def save(self):
+        """有更新时写入文件（原子替换）"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "half_life": self.half_life,
+                "domains": {domain: {name: list(arm) for name, arm in arms.items()} for domain, arms in self.arms.items()},
+            }
+            self._dirty = False
+            self._saved_at = time.time()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  学习状态保存失败: {e}")
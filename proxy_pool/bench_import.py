@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+导入耗时基准：对比只用代理池的工具从 proxy_pool 导入与从 selenium_with_proxy 导入的启动开销
+
+每种方式在全新的子进程中重复导入若干次（排除模块缓存影响），取中位数；同时记录子进程的峰值内存。
+
+用法：
+    python -m proxy_pool.bench_import
+    python -m proxy_pool.bench_import --runs 10 --budget-ms 100
+
+耗时上限同时检查 proxy_pool 的两种用法（仅导入、导入并创建代理池）。创建代理池不连接控制器，
+requests 在第一次调用控制器 API 或查询出口 IP 时才导入，这部分属于网络请求本身的开销，不计入上限。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# (名称, 语句, 是否受耗时上限约束)
+CASES = [
+    ("proxy_pool（仅导入）", "from proxy_pool import CONFIG, MihomoProxyPool", True),
+    ("proxy_pool（导入并创建代理池）", "from proxy_pool import MihomoProxyPool; MihomoProxyPool(results_file='__missing__.json').close()", True),
+    ("selenium_with_proxy", "from selenium_with_proxy import CONFIG, MihomoProxyPool", False),
+]
+
+# 子进程中执行：计时 stmt，输出 {"ms": 耗时, "rss_mb": 峰值内存}
+_CHILD = """
+import os, sys, time, json
+t0 = time.perf_counter()
+{stmt}
+ms = (time.perf_counter() - t0) * 1000
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+except ImportError:
+    rss_mb = None
+print(json.dumps({{"ms": ms, "rss_mb": rss_mb}}))
+"""
+
+
+def measure(stmt, runs, cwd):
+    """在 runs 个全新子进程中执行 stmt，返回 (中位耗时 ms, 峰值内存 MB)；导入失败时返回 None"""
+    times, rss = [], []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(stmt=stmt)],
+            cwd=cwd, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            return None
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(result["ms"])
+        if result["rss_mb"] is not None:
+            rss.append(result["rss_mb"])
+    return statistics.median(times), (max(rss) if rss else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理池导入耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种方式重复的子进程数")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="proxy_pool 导入耗时上限（毫秒）")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"⏱️  导入耗时基准（{args.runs} 次取中位数）")
+    print("-" * 60)
+    budgeted = []  # [(名称, 耗时 ms)]
+    for label, stmt, in_budget in CASES:
+        result = measure(stmt, args.runs, cwd)
+        if result is None:
+            print(f"  {label:<28} ❌ 导入失败（缺少依赖？）")
+            if in_budget:
+                sys.exit(1)
+            continue
+        ms, rss_mb = result
+        rss = f"{rss_mb:.0f} MB" if rss_mb is not None else "N/A"
+        print(f"  {label:<28} {ms:8.1f} ms   峰值内存 {rss}")
+        if in_budget:
+            budgeted.append((label, ms))
+    print("-" * 60)
+    over = [(label, ms) for label, ms in budgeted if ms > args.budget_ms]
+    for label, ms in over:
+        print(f"❌ {label} {ms:.1f} ms，超过 {args.budget_ms:.0f} ms")
+    if over:
+        sys.exit(1)
+    print(f"✅ proxy_pool 导入与创建代理池均低于 {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
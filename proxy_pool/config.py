@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+全局配置（selenium_with_proxy.py 与各工具共用同一个 CONFIG 字典）
+"""
+
+# ========== 配置区 ==========
+CONFIG = {
+    # 基础配置
+    "URL": "https://google.com",
+    "MAX_VISITS": 5,  # 最大访问次数，0表示无限
+    "WAIT_AFTER_LOAD": 2,  # 页面加载后等待秒数
+    
+    # 访问间隔模式（两种模式）
+    "INTERVAL_MODE": "poisson",  # 间隔模式：'fixed'（固定间隔）或 'poisson'（泊松分布，推荐）
+    "INTERVAL_MEAN": 10,  # 间隔均值（秒）
+    #   - fixed 模式：每次等待固定的 INTERVAL_MEAN 秒
+    #   - poisson 模式：平均等待 INTERVAL_MEAN 秒，但每次随机（更自然，模拟真实用户）
+    
+    # 代理配置
+    "USE_PROXY": True,  # 是否使用代理
+    "HEADLESS": True,  # 是否使用无头模式（不打开浏览器窗口）
+    "MIHOMO_API": "http://127.0.0.1:9090",  # Mihomo REST API 地址
+    "MIHOMO_PROXY": "http://127.0.0.1:7892",  # Mihomo HTTP 代理地址（修正端口）
+    "MIHOMO_SECRET": "",  # Mihomo external-controller 的 secret（未设置则留空）
+    "PROXY_GROUP": "NODE_TEST",  # Mihomo 代理组名称（用于读取节点列表）
+    "SWITCH_GROUP": "GLOBAL",  # Mihomo 切换组名称（实际切换的组，流量走这个组）
+    "PROXY_RESULTS": "/Users/ronchy2000/Documents/Developer/Workshop/Python_Study/爬虫学习/动态ip池/proxies/proxy_test_results.json",  # 测试结果文件
+    "CSV_FILE": "visit_log.csv",  # 日志文件名
+    "LOG_FORMAT": "csv",  # csv 或 jsonl（jsonl 时文件扩展名自动改为 .jsonl）
+    "LOG_FLUSH_EVERY": 50,  # 攒够多少行批量写盘
+    "LOG_FLUSH_INTERVAL": 1.0,  # 最长多少秒写盘一次
+    "LOG_ROTATE_MB": 100,  # 单个日志文件超过多少 MB 后轮转，0 表示不按大小轮转
+    "LOG_ROTATE_DAILY": False,  # 是否每天（UTC）轮转一次
+    
+    # 节点健康反馈与熔断（访问结果实时回传代理池）
+    "SCORE_DECAY": 0.7,  # 评分 EWMA 系数：越大越看重历史表现
+    "SCORE_HALF_LIFE": 600,  # 评分回归半衰期（秒）：长时间没有反馈的节点逐渐恢复到初始分
+    "BREAKER_THRESHOLD": 3,  # 连续失败多少次后熔断（隔离）节点
+    "BREAKER_COOLDOWN": 300,  # 熔断冷却时间（秒），到期后放行一次探测
+    "PROBE_TIMEOUT": 120,  # 探测节点被选中后多久没有回报结果就收回探测名额（秒），避免节点永远不可选
+    "NODE_RETRY": 3,  # 单次访问中切换/验证失败时，最多换几个节点
+    
+    # 节点切换确认
+    "CLOSE_OLD_CONNECTIONS": True,  # 切换后关闭旧节点上的存量连接（避免 keep-alive 继续走旧节点）
+    "SWITCH_CONFIRM_TIMEOUT": 1.0,  # 轮询确认切换生效的最长等待（秒）
+    "SWITCH_POLL_INTERVAL": 0.02,  # 轮询 /proxies/{group} 的间隔（秒）
+    
+    # 出口 IP 查询
+    "IP_ECHO_URL": "https://api.ipify.org?format=json",  # IP 回显服务，可换成自建的回显地址（支持 JSON {"ip": ...} 或纯文本）
+    "EXIT_IP_TTL": 600,  # 节点出口 IP 缓存有效期（秒），0 表示不缓存
+    
+    # 固定出口（get_node_for）
+    "HASH_RING_REPLICAS": 100,  # 一致性哈希环上每个节点的虚拟节点数，越大分布越均匀
+    
+    # 按地区选出口（节点地区由 tag_regions.py 写入测试结果）
+    "TARGET_REGIONS": {},  # 按 URL 或域名指定优先的出口地区，例如 {"blog.csdn.net": "CN", "example.jp": "JP", "x.com": "AS2914"}
+    
+    # 按目标域名学习节点表现（proxy_pool/bandit.py，Thompson 采样）
+    "BANDIT_ENABLED": False,  # 开启后按访问结果学习每个目标域名上哪些出口可用，选节点时优先使用并保留探索
+    "BANDIT_HALF_LIFE": 86400,  # 历史访问结果的半衰期（秒）：出口被目标封禁或解封后逐渐重新学习
+    "BANDIT_STATE_FILE": None,  # 学习状态文件，None 时保存在测试结果文件旁的 bandit_state.json
+    "BANDIT_EXPLORE_CAP": 4,  # 未访问过的节点整体最多抽几个样本，越大越倾向于探索新出口
+    
+    # 测试结果热加载
+    "WATCH_RESULTS": True,  # 运行中监视 PROXY_RESULTS，check_proxies.py 重新生成后自动换上新节点
+    "RESULTS_POLL_INTERVAL": 5,  # 检查文件修改时间的间隔（秒）
+    "RESULTS_SNAPSHOT": False,  # 通过 mmap 二进制快照（<结果文件名>.nodes）加载测试结果，节点很多或多 worker 进程时开启
+    
+    # 被动流量统计（proxy_pool/monitor.py）：从控制器 /connections、/logs、/traffic 按节点统计并回报评分
+    "PASSIVE_MONITOR": False,
+    "MONITOR_INTERVAL": 2,  # 轮询 /connections 的间隔（秒）
+    
+    # 运行指标（proxy_pool/metrics.py）：关闭时记录调用几乎无开销
+    "METRICS_ENABLED": False,  # 开启后在 127.0.0.1:METRICS_PORT/metrics 提供 Prometheus 文本格式
+    "METRICS_PORT": 9105,
+    
+    # 按节点 / 目标域名限速（令牌桶），开启后取代全局的访问间隔等待
+    "RATE_LIMIT_ENABLED": False,
+    "NODE_RATE_PER_MIN": 2,  # 单个出口节点每分钟最多访问次数（保证每个 IP 低于封禁阈值）
+    "NODE_BURST": 1,  # 单个节点允许的突发次数
+    "DOMAIN_RATE_PER_MIN": 30,  # 单个目标域名每分钟最多访问次数（所有节点合计）
+    "DOMAIN_BURST": 2,
+    "DOMAIN_RATES_PER_MIN": {},  # 按域名单独设置，例如 {"blog.csdn.net": 10}
+    
+    # 浏览器复用
+    "REUSE_DRIVER": False,  # 复用已启动的 Chrome（每次访问前清理 Cookie/存储并更换 UA），不再每次重启浏览器
+    "DRIVER_POOL_SIZE": 1,  # 预热的浏览器实例数
+    "DRIVER_MAX_USES": 20,  # 单个实例最多复用多少次后回收重建
+    
+    # 省流量模式（机场流量是主要成本）
+    "LEAN_MODE": False,  # 开启后：屏蔽图片/字体/媒体/统计脚本，eager 加载，按条件等待代替固定 sleep
+    "BLOCKED_URL_PATTERNS": [  # LEAN_MODE 下通过 CDP Network.setBlockedURLs 屏蔽的 URL（* 为通配符）
+        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.avif",
+        "*.woff", "*.woff2", "*.ttf", "*.otf",
+        "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*hm.baidu.com*",
+    ],
+    "MEASURE_BYTES": False,  # 统计每次访问的传输字节数（写入日志 bytes 列）：浏览器引擎读 Chrome 性能日志，http 引擎按压缩后的响应大小
+    
+    # 访问分段计时与剖析（visit_trace.py）
+    "TRACE_VISITS": False,  # 记录每次访问各阶段耗时到 logs/<日志名>_trace.jsonl，结束时打印按占比排序的汇总
+    "PROFILE_MODE": None,  # None、"cprofile" 或 "sample"（后台线程采样主线程调用栈，开销更小）
+    "PROFILE_VISITS": 3,  # 剖析前几次访问（不含间隔等待），结果写入 logs/profile_*.prof / *.folded
+    "PROFILE_SAMPLE_INTERVAL": 0.005,  # 采样间隔（秒）
+    
+    # 访问引擎
+    "DEFAULT_ENGINE": "browser",  # browser（无头 Chrome）或 http（aiohttp 直接请求，适合不依赖 JS 的静态页面）
+    "URL_ENGINES": {},  # 按 URL 或域名指定引擎，例如 {"https://example.com/a.html": "http", "docs.example.com": "http"}
+    "HTTP_CONCURRENCY": 200,  # http 引擎同时进行的访问数
+    "HTTP_TIMEOUT": 15,  # http 引擎单次访问超时（秒）
+    
+    # 多目标调度（TARGETS 非空时 main() 改用 target_scheduler.py）
+    "TARGETS": [],  # 例如 [{"url": "https://a.com", "interval_mean": 30, "max_visits": 10}, {"url": "https://b.com", "interval_mode": "fixed", "interval_mean": 60}]
+    "VISIT_WORKERS": 4,  # 同时进行访问的 worker 数（每个访问走独立端口上的不同出口）
+    
+    # 流水线访问（visit_prefetch.py，需要每节点独立端口）
+    "PIPELINED_VISITS": False,  # 在当前访问的页面停留和间隔等待期间，提前选好下一个节点、验证出口 IP 并启动浏览器
+}
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标（计数器 / 仪表 / 直方图）与 Prometheus 文本格式导出
+
+各模块在模块级定义自己的指标，在热路径上记录：
+    from proxy_pool import metrics
+    SWITCH_SECONDS = metrics.histogram("proxy_switch_seconds", "节点切换耗时（秒）", ["result"])
+    SWITCH_SECONDS.observe(0.12, result="ok")
+
+默认关闭：关闭时 inc / set / observe 第一行就返回，热路径上只多一次全局变量读取和一次函数调用；
+调用方在计算标签值或计时开销较大时可以先判断 metrics.enabled。
+CONFIG["METRICS_ENABLED"] 为 True 时，入口脚本调用 start_exporter() 打开统计，
+并在 127.0.0.1:METRICS_PORT/metrics 提供 Prometheus 文本格式（标准库 http.server，后台线程）。
+"""
+import os
+import time
+import bisect
+import threading
+
+from .config import CONFIG
+
+enabled = False
+
+# 秒级耗时的默认分桶
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = {}  # 指标名 -> 指标（按注册顺序输出）
+_registry_lock = threading.Lock()
+_server = None
+_server_pid = None  # 启动 _server 的进程（fork 出的子进程会继承 _server 对象，但没有服务线程）
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # 标签值元组 -> 数值（直方图为 [各桶计数, 总和, 次数]）
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """(指标名后缀, 标签值元组, 附加标签, 数值) 列表"""
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # 落入第一个 >= value 的桶（le 语义）
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        result = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                result.append(("_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            result.append(("_sum", key, None, total))
+            result.append(("_count", key, None, count))
+        return result
+
+
+def _register(cls, name, help_text, labelnames, **kwargs):
+    # 同名指标只注册一次（模块被重复导入、多处定义同一指标时返回同一个对象）
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help_text, labelnames, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    return _register(Counter, name, help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    return _register(Gauge, name, help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+
+def enable(flag=True):
+    """打开（或关闭）统计，不启动 HTTP 端点"""
+    global enabled
+    enabled = bool(flag)
+
+
+def clear():
+    """清空全部指标的数值（fork 出的 worker 进程从零开始统计，不重复导出父进程的数据）"""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        metric.clear()
+
+
+def render():
+    """全部指标的 Prometheus 文本格式"""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, key, extra, value in metric.samples():
+            labels = _format_labels(metric.labelnames, key, extra)
+            lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_exporter(port=None, host="127.0.0.1"):
+    """
+    按 CONFIG["METRICS_ENABLED"] 打开统计并启动 /metrics 端点（未开启时什么都不做）
+
+    重复调用只启动一次；端口被占用时只打印提示，统计照常进行。返回 HTTP 服务器或 None。
+    多进程时每个进程各自导出（各用一个端口），见 parallel_visitor.py。
+    """
+    global _server, _server_pid
+    if port is None and not CONFIG["METRICS_ENABLED"]:
+        return None
+    enable()
+    if _server is not None and _server_pid == os.getpid():
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    port = CONFIG["METRICS_PORT"] if port is None else port
+    try:
+        _server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        print(f"⚠️  指标端点启动失败（{host}:{port}）: {e}")
+        return None
+    _server.daemon_threads = True
+    _server_pid = os.getpid()
+    threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+    print(f"📈 指标: http://{host}:{_server.server_address[1]}/metrics")
+    return _server
+
+
+def stop_exporter():
+    global _server
+    if _server is not None and _server_pid == os.getpid():
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+class timed:
+    """
+    计时上下文：with metrics.timed(HIST, source="x"): ...
+
+    退出时把耗时（秒）记入直方图；统计关闭时不取时间。
+    """
+    __slots__ = ("metric", "labels", "start")
+
+    def __init__(self, metric, **labels):
+        self.metric = metric
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.metric.observe(time.perf_counter() - self.start, **self.labels)
+        return False
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Mihomo 控制器客户端：经 REST API 切换节点、关闭连接，经代理查询出口 IP
+"""
+import json
+import time
+import threading
+
+from .config import CONFIG
+from .pool import BaseProxyPool
+
+# ========== Mihomo 代理池类 ==========
+class MihomoProxyPool(BaseProxyPool):
+    """Mihomo 代理池管理"""
+    def __init__(self, results_file=None, api_url=None, group_name=None, switch_group=None):
+        super().__init__(results_file, api_url, group_name, switch_group)
+        
+        # 长连接会话：控制器 REST API 与经代理的 IP 查询各用一个连接池，首次使用时才创建
+        self._api_session = None
+        self._proxy_session = None
+        self._session_lock = threading.Lock()
+        self._proxy_node = None  # proxy_session 连接池建立时所在的节点
+    
+    @property
+    def api_session(self):
+        """控制器 REST API 会话（只读节点列表、走独立端口的工具用不到，不必为它导入 requests）"""
+        with self._session_lock:
+            if self._api_session is None:
+                session = self._create_session()
+                session.headers.update(self._headers())
+                self._api_session = session
+            return self._api_session
+    
+    @property
+    def proxy_session(self):
+        """经 MIHOMO_PROXY 查询出口 IP 的会话"""
+        with self._session_lock:
+            if self._proxy_session is None:
+                session = self._create_session()
+                session.proxies = {
+                    "http": CONFIG["MIHOMO_PROXY"],
+                    "https": CONFIG["MIHOMO_PROXY"],
+                }
+                self._proxy_session = session
+            return self._proxy_session
+    
+    @staticmethod
+    def _create_session():
+        """创建带连接池的 requests 会话（不读取环境变量中的系统代理）"""
+        # requests 较重（约 0.1 秒），只在真正创建会话时导入
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        session.trust_env = False
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def close(self):
+        """关闭所有会话连接池，保存按域名学习的状态"""
+        for session in (self._api_session, self._proxy_session):
+            if session is not None:
+                session.close()
+        if self.bandit is not None:
+            self.bandit.save()
+    
+    def get_group_now(self):
+        """查询切换组当前选中的节点"""
+        url = f"{self.api_url}/proxies/{self.switch_group}"
+        try:
+            response = self.api_session.get(url, timeout=2)
+            if response.status_code == 200:
+                return response.json().get("now")
+        except Exception:
+            pass
+        return None
+    
+    def _close_connections(self, should_close):
+        """通过 /connections 接口关闭 should_close(chains) 为真的存量连接，返回关闭数量"""
+        try:
+            response = self.api_session.get(f"{self.api_url}/connections", timeout=2)
+            if response.status_code != 200:
+                return 0
+            connections = response.json().get("connections") or []
+        except Exception:
+            return 0
+        
+        closed = 0
+        for conn in connections:
+            if not should_close(conn.get("chains") or []):
+                continue
+            try:
+                self.api_session.delete(f"{self.api_url}/connections/{conn.get('id')}", timeout=2)
+                closed += 1
+            except Exception:
+                pass
+        return closed
+    
+    def close_node_connections(self, node_name):
+        """关闭经过指定节点的存量连接"""
+        return self._close_connections(lambda chains: node_name in chains)
+    
+    def wait_for_switch(self, node_name, timeout=None):
+        """轮询切换组的 now 字段，直到等于 node_name 或超时"""
+        if timeout is None:
+            timeout = CONFIG["SWITCH_CONFIRM_TIMEOUT"]
+        deadline = time.perf_counter() + timeout
+        while True:
+            if self.get_group_now() == node_name:
+                return True
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(CONFIG["SWITCH_POLL_INTERVAL"])
+    
+    def switch_node(self, node_name):
+        """切换 Mihomo 代理节点：PUT → 轮询确认生效 → 关闭旧节点存量连接"""
+        url = f"{self.api_url}/proxies/{self.switch_group}"
+        payload = {"name": node_name}
+        start = time.perf_counter()
+        ok = False
+        
+        try:
+            # 旧节点未知时（首次切换）先读一次切换组当前节点，只关闭经过它的连接
+            old_node = self.current_node
+            if old_node is None and CONFIG["CLOSE_OLD_CONNECTIONS"]:
+                old_node = self.get_group_now()
+            response = self.api_session.put(url, json=payload, timeout=5)
+            if response.status_code != 204:
+                return False, f"HTTP {response.status_code}"
+            
+            if not self.wait_for_switch(node_name):
+                self.current_node = None
+                return False, "切换未确认（超时）"
+            self.current_node = node_name
+            
+            if CONFIG["CLOSE_OLD_CONNECTIONS"] and old_node and old_node != node_name:
+                # 仍无法确定旧节点时不动其他流量
+                self.close_node_connections(old_node)
+            
+            ok = True
+            return True, "切换成功"
+        except Exception as e:
+            return False, str(e)
+        finally:
+            self.record_switch(start, ok)
+    
+    def get_current_ip(self, use_cache=True):
+        """获取当前出口 IP（切回缓存有效期内的已知节点时直接返回缓存）"""
+        node_name = self.current_node
+        cached = self.get_cached_ip(node_name, use_cache)
+        if cached:
+            return cached
+        
+        # 节点变了，连接池里的 CONNECT 隧道仍然经过旧节点，需要丢弃
+        if self._proxy_node != node_name:
+            self.proxy_session.close()
+            self._proxy_node = node_name
+        
+        start = time.perf_counter()
+        ip = None
+        try:
+            response = self.proxy_session.get(CONFIG["IP_ECHO_URL"], timeout=10)
+            if response.status_code == 200:
+                ip = parse_ip_echo(response.text)
+                self.store_exit_ip(node_name, ip)
+        except:
+            pass
+        self.record_ip_lookup(start, ip)
+        return ip
+
+def parse_ip_echo(text):
+    """解析 IP 回显服务的响应：JSON {"ip": "..."} 或纯文本 IP"""
+    text = text.strip()
+    if text.startswith("{"):
+        try:
+            return json.loads(text).get("ip")
+        except ValueError:
+            return None
+    return text or None
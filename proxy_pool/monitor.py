@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+被动流量统计：从 Mihomo 控制器的实时接口按节点统计流量、连接数和上游错误
+
+节点健康原来只靠主动探测（check_proxies.py 的延迟测试、get_current_ip）。控制器本身就在提供：
+    GET /connections   当前全部连接的快照（chains[0] 为实际出口节点，upload/download 为累计字节）
+    GET /traffic       每秒一行 {"up": ..., "down": ...}（全局速率，流式）
+    GET /logs          每条一行 {"type": "warning", "payload": "..."}（流式）
+
+TrafficMonitor 在后台轮询 /connections 并消费 /traffic、/logs 两个流：
+- 按连接 id 计算两次快照之间的字节增量，累计到出口节点，并估算每个节点的下载速率；
+- 日志中的 dial/连接错误按节点名归属到节点；
+- 每个轮询周期结束时按节点汇总回报代理池：本周期有错误回报一次失败，否则有下载流量回报一次成功。
+  不发起任何额外探测，真实流量中失败多或占带宽大的节点即可被发现。
+  被动成功只回报给熔断器 closed 的节点：熔断隔离（open / half_open）的节点上可能还有存量连接在传数据，
+  不能代替探测让它提前恢复；被动成功也只提高评分，不清零主动访问累积的连续失败。
+
+数据源可注入（fetch_json / stream_lines），便于用本地替身数据测试（见 tests/controller_standin.py）。
+"""
+import json
+import time
+import threading
+
+from .config import CONFIG
+
+
+class NodeTraffic:
+    """单个节点的被动统计"""
+    def __init__(self):
+        self.upload = 0
+        self.download = 0
+        self.connections = 0  # 累计新建连接数
+        self.active = 0  # 最近一次快照中的活动连接数
+        self.errors = 0
+        self.rate_down = 0.0  # 下载速率 EWMA（字节/秒）
+        self.last_error = None
+
+    def as_dict(self):
+        return {
+            "upload": self.upload,
+            "download": self.download,
+            "connections": self.connections,
+            "active": self.active,
+            "errors": self.errors,
+            "rate_down": round(self.rate_down, 1),
+            "last_error": self.last_error,
+        }
+
+
+class TrafficMonitor:
+    """后台消费控制器实时接口，按节点统计并回报代理池"""
+    def __init__(self, pool, api_url=None, interval=None, fetch_json=None, stream_lines=None, report=True):
+        self.pool = pool
+        self.api_url = (api_url or CONFIG["MIHOMO_API"]).rstrip("/")
+        self.interval = interval if interval is not None else CONFIG["MONITOR_INTERVAL"]
+        self.fetch_json = fetch_json or self._http_json  # path -> dict
+        self.stream_lines = stream_lines or self._http_lines  # (path, stop) -> 可迭代的文本行
+        self.report = report  # 是否把统计结果回报给代理池评分
+        self.nodes = {}  # 节点名 -> NodeTraffic
+        self.traffic = (0, 0)  # 最近一次 /traffic 的全局 (上行, 下行) 字节/秒
+        self._conns = {}  # 连接 id -> (节点名, 已统计上行, 已统计下行)
+        self._tick_bytes = {}  # 本周期各节点下载增量
+        self._tick_errors = {}  # 本周期各节点最后一条错误
+        self._last_poll = None
+        self._names_for = None
+        self._names = []
+        self._lock = threading.Lock()
+        self._stop = None
+        self._session = None
+
+    # ---------- 数据处理（可直接喂替身数据测试） ----------
+
+    def _node(self, name):
+        stats = self.nodes.get(name)
+        if stats is None:
+            stats = self.nodes[name] = NodeTraffic()
+        return stats
+
+    def handle_connections(self, snapshot, now=None):
+        """处理一次 /connections 快照，并结算本周期"""
+        now = time.monotonic() if now is None else now
+        seen = {}
+        active = {}
+        with self._lock:
+            for conn in snapshot.get("connections") or []:
+                conn_id = conn.get("id")
+                chains = conn.get("chains") or []
+                if not conn_id or not chains:
+                    continue
+                node = chains[0]
+                upload = int(conn.get("upload") or 0)
+                download = int(conn.get("download") or 0)
+                prev = self._conns.get(conn_id)
+                stats = self._node(node)
+                if prev is None:
+                    stats.connections += 1
+                    prev = (node, 0, 0)
+                d_up = max(0, upload - prev[1])
+                d_down = max(0, download - prev[2])
+                stats.upload += d_up
+                stats.download += d_down
+                self._tick_bytes[node] = self._tick_bytes.get(node, 0) + d_down
+                seen[conn_id] = (node, upload, download)
+                active[node] = active.get(node, 0) + 1
+            # 快照中消失的连接已关闭，关闭前最后一段流量无法再统计
+            self._conns = seen
+            for name, stats in self.nodes.items():
+                stats.active = active.get(name, 0)
+
+            dt = None if self._last_poll is None else now - self._last_poll
+            self._last_poll = now
+            tick_bytes, self._tick_bytes = self._tick_bytes, {}
+            tick_errors, self._tick_errors = self._tick_errors, {}
+            if dt and dt > 0:
+                decay = CONFIG["SCORE_DECAY"]
+                for name, stats in self.nodes.items():
+                    rate = tick_bytes.get(name, 0) / dt
+                    stats.rate_down = decay * stats.rate_down + (1 - decay) * rate
+
+        if self.report:
+            self._report(tick_bytes, tick_errors)
+
+    def _report(self, tick_bytes, tick_errors):
+        # 每个节点每周期最多回报一次，避免高并发时评分被单个周期淹没
+        known = self.pool.nodes_by_name
+        for name, error in tick_errors.items():
+            if name in known:
+                self.pool.report_failure(name, f"passive: {error}")
+        for name, nbytes in tick_bytes.items():
+            if nbytes > 0 and name in known and name not in tick_errors:
+                health = self.pool.health.get(name)
+                if health is not None and health.state != "closed":
+                    continue
+                # 长连接上的流量只加分：不能清零主动访问累积的连续失败，否则熔断器永远不会触发
+                self.pool.report_passive_success(name)
+
+    def _match_node(self, text):
+        """在日志文本中找出节点名（长名字优先，避免名字互为前缀时误判）"""
+        node_set = self.pool.node_set
+        if node_set is not self._names_for:
+            self._names = sorted(node_set.by_name, key=len, reverse=True)
+            self._names_for = node_set
+        for name in self._names:
+            if name and name in text:
+                return name
+        return None
+
+    def handle_log_line(self, line):
+        """处理 /logs 的一行：warning/error 级别的连接错误归属到节点"""
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if entry.get("type") not in ("warning", "error"):
+            return None
+        payload = entry.get("payload") or ""
+        if "error" not in payload.lower() and "timeout" not in payload.lower():
+            return None
+        node = self._match_node(payload)
+        if node is None:
+            return None
+        with self._lock:
+            stats = self._node(node)
+            stats.errors += 1
+            stats.last_error = payload[:200]
+            self._tick_errors[node] = stats.last_error
+        return node
+
+    def handle_traffic_line(self, line):
+        """处理 /traffic 的一行（全局速率）"""
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return
+        self.traffic = (int(entry.get("up") or 0), int(entry.get("down") or 0))
+
+    def top_nodes(self, n=10, key="download"):
+        """按 key（download / rate_down / errors / connections）排序的前 n 个节点"""
+        with self._lock:
+            items = [(name, stats.as_dict()) for name, stats in self.nodes.items()]
+        items.sort(key=lambda kv: kv[1][key], reverse=True)
+        return items[:n]
+
+    # ---------- 后台运行 ----------
+
+    def _http_json(self, path):
+        if self._session is None:
+            self._session = self._new_session()
+        response = self._session.get(f"{self.api_url}{path}", timeout=3)
+        response.raise_for_status()
+        return response.json()
+
+    def _http_lines(self, path, stop):
+        session = self._new_session()
+        try:
+            # 读超时后由外层重连，顺便检查 stop
+            with session.get(f"{self.api_url}{path}", stream=True, timeout=(3, 30)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if stop.is_set():
+                        break
+                    if line:
+                        yield line
+        finally:
+            session.close()
+
+    def _new_session(self):
+        from .mihomo import MihomoProxyPool
+        session = MihomoProxyPool._create_session()
+        secret = CONFIG["MIHOMO_SECRET"]
+        if secret:
+            session.headers["Authorization"] = f"Bearer {secret}"
+        return session
+
+    def poll_once(self):
+        self.handle_connections(self.fetch_json("/connections"))
+
+    def start(self):
+        """启动轮询线程和两个流消费线程（重复调用无效）"""
+        if self._stop is not None:
+            return
+        self._stop = threading.Event()
+        stop = self._stop
+
+        def poller():
+            while not stop.is_set():
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    print(f"⚠️  被动统计: 读取 /connections 失败: {e}")
+                    stop.wait(5)
+                stop.wait(self.interval)
+
+        def consume(path, handler):
+            while not stop.is_set():
+                try:
+                    for line in self.stream_lines(path, stop):
+                        handler(line)
+                        if stop.is_set():
+                            break
+                except Exception:
+                    pass
+                # 流断开（或读超时）后稍等重连
+                stop.wait(2)
+
+        threading.Thread(target=poller, name="monitor-connections", daemon=True).start()
+        threading.Thread(target=consume, args=("/logs?level=warning", self.handle_log_line),
+                         name="monitor-logs", daemon=True).start()
+        threading.Thread(target=consume, args=("/traffic", self.handle_traffic_line),
+                         name="monitor-traffic", daemon=True).start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def print_summary(self, n=5):
+        top = self.top_nodes(n)
+        if not top:
+            return
+        print(f"📶 被动统计（流量前 {len(top)} 的节点）:")
+        for name, s in top:
+            print(f"   {name}: ↓{s['download'] / 1024:.0f} KB ↑{s['upload'] / 1024:.0f} KB，"
+                  f"连接 {s['connections']}，错误 {s['errors']}")
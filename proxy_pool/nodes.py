@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+节点健康状态、一致性哈希环与节点集合快照
+"""
+import time
+import bisect
+import hashlib
+
+from .config import CONFIG
+
+# ========== 节点健康状态 ==========
+class NodeHealth:
+    """
+    单个节点的在线健康状态：衰减评分 + 熔断器
+    
+    熔断器三种状态：
+        - closed: 正常，可被选中
+        - open: 连续失败达到阈值，隔离中，冷却期内不会被选中
+        - half_open: 冷却期已过，放行一次探测；成功则恢复，失败则重新隔离
+    """
+    def __init__(self, latency_ms=None):
+        self.score = 1.0
+        self.latency_ms = latency_ms
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started_at = 0.0
+        self.last_error = None
+        self.updated_at = time.time()
+    
+    def current_score(self, half_life, now=None):
+        """随时间向初始分 1.0 回归后的评分（半衰期 half_life 秒）"""
+        if now is None:
+            now = time.time()
+        if half_life <= 0:
+            return self.score
+        elapsed = max(0.0, now - self.updated_at)
+        return 1.0 + (self.score - 1.0) * 0.5 ** (elapsed / half_life)
+    
+    def record(self, outcome, decay, half_life, now=None):
+        """记录一次结果（outcome: 1.0 成功 / 0.0 失败），按 EWMA 更新评分"""
+        if now is None:
+            now = time.time()
+        score = self.current_score(half_life, now)
+        self.score = decay * score + (1 - decay) * outcome
+        self.updated_at = now
+
+# ========== 一致性哈希环 ==========
+class HashRing:
+    """
+    一致性哈希环：把任意 key（账号、域名等）稳定映射到节点
+    
+    每个节点在环上放 replicas 个虚拟节点，查找时二分定位到 key 顺时针方向的
+    第一个虚拟节点，复杂度 O(log n)。增删一个节点时只有约 1/N 的 key 会改变归属。
+    """
+    def __init__(self, names=(), replicas=100):
+        self.replicas = replicas
+        self._hashes = []  # 有序的虚拟节点哈希
+        self._owners = []  # 与 _hashes 对应的节点名
+        self._names = set()
+        ring = []
+        for name in names:
+            if name in self._names:
+                continue
+            self._names.add(name)
+            for i in range(replicas):
+                ring.append((self._hash(f"{name}#{i}"), name))
+        ring.sort()
+        self._hashes = [h for h, _ in ring]
+        self._owners = [n for _, n in ring]
+    
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+    
+    def __len__(self):
+        return len(self._names)
+    
+    def __contains__(self, name):
+        return name in self._names
+    
+    def iter_nodes(self, key):
+        """从 key 的位置顺时针依次产出不重复的节点名（第一个即 key 的归属节点）"""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, self._hash(str(key)))
+        seen = set()
+        total = len(self._hashes)
+        for offset in range(total):
+            owner = self._owners[(start + offset) % total]
+            if owner not in seen:
+                seen.add(owner)
+                yield owner
+                if len(seen) == len(self._names):
+                    return
+    
+    def get(self, key):
+        """key 的归属节点名，环为空时返回 None"""
+        return next(self.iter_nodes(key), None)
+
+# ========== 节点集合快照 ==========
+def parse_test_results(results):
+    """解析测试结果 JSON，返回 (可用节点列表, 不可用节点列表)"""
+    # 兼容 check_proxies.py 多种格式
+    if "meta" in results:
+        # 新格式: {"meta": {...}, "ok": [...], "failed": [...]}
+        return results.get("ok", []), results.get("failed", [])
+    elif "ok" in results:
+        # 中间格式: {"ok": [...], "failed": [...]} (没有 meta)
+        return results.get("ok", []), results.get("failed", [])
+    else:
+        # 旧格式: {"available": [...], "failed": [...]}
+        return results.get("available", []), results.get("failed", [])
+
+def region_keys(node):
+    """节点的地区索引键：国家/地区代码（如 "JP"）和 ASN（如 "AS2914"），由 tag_regions.py 写入测试结果"""
+    keys = []
+    country = node.get("country")
+    if country:
+        keys.append(str(country).upper())
+    asn = node.get("asn")
+    if asn:
+        asn = str(asn).upper()
+        keys.append(asn if asn.startswith("AS") else f"AS{asn}")
+    return keys
+
+def normalize_region(region):
+    """把 "jp" / 2914 / "as2914" 统一成索引键的写法"""
+    region = str(region).strip().upper()
+    return f"AS{region}" if region.isdigit() else region
+
+class NodeSet:
+    """
+    一次加载得到的节点集合（创建后不再修改）
+    
+    节点列表、名称索引、地区索引和哈希环打包在一个对象里，热加载时整体替换 pool.node_set
+    这一个引用，读取方拿到的始终是同一版本的完整数据，无需加锁。
+    地区索引和哈希环在首次使用时才建立（大节点池时哈希环的构建开销不小）。
+    """
+    def __init__(self, available=(), failed=()):
+        self.available = list(available)
+        self.failed = list(failed)
+        self.by_name = {n.get("name"): n for n in self.available}
+        self._by_region = None
+        self._ring = None
+    
+    def _build_region_index(self):
+        by_region = {}
+        for node in self.available:
+            for key in region_keys(node):
+                by_region.setdefault(key, []).append(node)
+        return by_region
+    
+    @property
+    def by_region(self):
+        """国家代码 / ASN -> 该地区的节点列表"""
+        # 并发首次访问时可能重复构建，结果相同，直接覆盖即可
+        if self._by_region is None:
+            self._by_region = self._build_region_index()
+        return self._by_region
+    
+    @property
+    def ring(self):
+        if self._ring is None:
+            self._ring = HashRing(self.by_name, CONFIG["HASH_RING_REPLICAS"])
+        return self._ring
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""
+代理池公共逻辑（不含网络请求）
+"""
+import os
+import math
+import json
+import time
+import random
+import threading
+from collections import deque
+
+from . import metrics
+from .bandit import DomainBandit, target_key
+from .config import CONFIG
+from .nodes import NodeHealth, NodeSet, normalize_region, parse_test_results, region_keys
+
+SWITCH_SECONDS = metrics.histogram("proxy_switch_seconds", "节点切换耗时（PUT 到确认生效，秒）", ["result"])
+EXIT_IP_SECONDS = metrics.histogram("proxy_exit_ip_lookup_seconds", "经代理查询出口 IP 的耗时（秒，不含缓存命中）", ["result"])
+EXIT_IP_CACHE_HITS = metrics.counter("proxy_exit_ip_cache_hits_total", "出口 IP 缓存命中次数")
+
+# ========== 代理池公共逻辑 ==========
+class BaseProxyPool:
+    """
+    代理池公共逻辑（不含网络请求）：加载测试结果、健康评分与熔断、节点选择、
+    切换耗时统计和出口 IP 缓存。同步版 MihomoProxyPool 和异步版
+    AsyncMihomoProxyPool（async_proxy_pool.py）共用这部分实现。
+    """
+    def __init__(self, results_file=None, api_url=None, group_name=None, switch_group=None):
+        self.node_set = NodeSet()  # 当前节点集合，热加载时整体替换
+        self.health = {}  # 节点名 -> NodeHealth
+        self.current_node = None  # 最近一次确认切换成功的节点
+        self.switch_latencies = deque(maxlen=1000)  # 最近切换耗时（毫秒）
+        self.exit_ip_cache = {}  # 节点名 -> (出口 IP, 查询时间)
+        self.last_ip_from_cache = False  # 最近一次 get_current_ip 是否命中缓存
+        self.results_file = None
+        self._results_stamp = None  # 已加载文件的 (mtime_ns, size)
+        self._watch_stop = None
+        if results_file is None:
+            results_file = CONFIG["PROXY_RESULTS"]
+        if api_url is None:
+            api_url = CONFIG["MIHOMO_API"]
+        if group_name is None:
+            group_name = CONFIG["PROXY_GROUP"]
+        if switch_group is None:
+            switch_group = CONFIG["SWITCH_GROUP"]
+        
+        self.api_url = api_url
+        self.group_name = group_name
+        self.switch_group = switch_group
+        self.load_test_results(results_file)
+        
+        # 按目标域名学习节点表现，状态默认保存在测试结果文件旁
+        self.bandit = None
+        if CONFIG["BANDIT_ENABLED"]:
+            state_file = CONFIG["BANDIT_STATE_FILE"] or os.path.join(
+                os.path.dirname(os.path.abspath(results_file)), "bandit_state.json")
+            self.bandit = DomainBandit(state_file, CONFIG["BANDIT_HALF_LIFE"], explore_cap=CONFIG["BANDIT_EXPLORE_CAP"])
+    
+    @property
+    def available_nodes(self):
+        return self.node_set.available
+    
+    @property
+    def failed_nodes(self):
+        return self.node_set.failed
+    
+    @property
+    def nodes_by_name(self):
+        return self.node_set.by_name
+    
+    @property
+    def ring(self):
+        return self.node_set.ring
+    
+    def load_test_results(self, filepath):
+        """从测试结果文件加载可用节点，已有节点的健康评分会保留"""
+        # 如果是相对路径，转换为相对于项目根目录（脚本所在目录）的绝对路径
+        if not os.path.isabs(filepath):
+            script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            filepath = os.path.join(script_dir, filepath)
+        self.results_file = filepath
+        
+        if not os.path.exists(filepath):
+            print(f"⚠️  测试结果文件不存在: {filepath}")
+            return False
+        
+        stat = os.stat(filepath)
+        if filepath.endswith(".nodes") or CONFIG["RESULTS_SNAPSHOT"]:
+            # 列式节点表：mmap 映射快照文件，多个进程共享同一份只读数据
+            from .table import NodeTable, TableNodeSet, load_or_build
+            table = NodeTable.load(filepath) if filepath.endswith(".nodes") else load_or_build(filepath)
+            node_set = TableNodeSet(table)
+        else:
+            with open(filepath, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            node_set = NodeSet(*parse_test_results(results))
+        self.swap_node_set(node_set)
+        self._results_stamp = (stat.st_mtime_ns, stat.st_size)
+        
+        print(f"✅ 加载 {len(self.available_nodes)} 个可用节点")
+        if len(self.failed_nodes) > 0:
+            print(f"ℹ️  {len(self.failed_nodes)} 个节点不可用")
+        return True
+    
+    def swap_node_set(self, node_set):
+        """原子替换节点集合：两个版本都有的节点保留评分/熔断状态与出口 IP 缓存"""
+        self.node_set = node_set
+        names = node_set.by_name
+        self.health = {k: v for k, v in list(self.health.items()) if k in names}
+        self.exit_ip_cache = {k: v for k, v in list(self.exit_ip_cache.items()) if k in names}
+    
+    def reload_if_changed(self):
+        """测试结果文件有变化时重新加载，返回是否发生了替换"""
+        if not self.results_file:
+            return False
+        try:
+            stat = os.stat(self.results_file)
+        except OSError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._results_stamp:
+            return False
+        try:
+            return self.load_test_results(self.results_file)
+        except (ValueError, OSError) as e:
+            # 文件可能正在被写入：保留旧节点集合，等文件再次变化后重试
+            self._results_stamp = stamp
+            print(f"⚠️  热加载失败，继续使用旧节点列表: {e}")
+            return False
+    
+    def start_watching(self, interval=None):
+        """后台线程按 mtime 轮询测试结果文件，变化时自动热加载"""
+        if self._watch_stop is not None:
+            return
+        if interval is None:
+            interval = CONFIG["RESULTS_POLL_INTERVAL"]
+        self._watch_stop = threading.Event()
+        stop = self._watch_stop
+        
+        def watch():
+            while not stop.wait(interval):
+                if self.reload_if_changed():
+                    print(f"🔄 测试结果已更新，热加载 {len(self.available_nodes)} 个可用节点")
+        
+        threading.Thread(target=watch, name="results-watcher", daemon=True).start()
+    
+    def stop_watching(self):
+        if self._watch_stop is not None:
+            self._watch_stop.set()
+            self._watch_stop = None
+    
+    def _get_health(self, node_name):
+        """获取（必要时创建）节点健康状态，初始延迟取自测试结果"""
+        health = self.health.get(node_name)
+        if health is None:
+            node = self.nodes_by_name.get(node_name) or {}
+            latency = node.get("latency_ms", node.get("latency"))
+            health = NodeHealth(latency if isinstance(latency, (int, float)) else None)
+            if isinstance(node.get("score"), (int, float)):
+                health.score = node["score"]
+            self.health[node_name] = health
+        return health
+    
+    def is_node_available(self, node_name, now=None):
+        """熔断器检查：隔离中的节点冷却期满后转为 half_open，放行一次探测"""
+        health = self.health.get(node_name)
+        if health is None or health.state == "closed":
+            return True
+        if now is None:
+            now = time.time()
+        if health.state == "open":
+            if now - health.opened_at < CONFIG["BREAKER_COOLDOWN"]:
+                return False
+            health.state = "half_open"
+            health.probing = False
+        # half_open：同一时间只放行一个探测；选中后超过 PROBE_TIMEOUT 仍没有回报（调用方没用上这个节点）时收回
+        if health.probing and now - health.probe_started_at >= CONFIG["PROBE_TIMEOUT"]:
+            health.probing = False
+        return not health.probing
+    
+    def _claim_probe(self, node_name, now):
+        """选中 half_open 节点时占用探测名额并记录时间"""
+        health = self.health.get(node_name)
+        if health is not None and health.state == "half_open":
+            health.probing = True
+            health.probe_started_at = now
+    
+    def get_node_weight(self, node_name, now=None):
+        """选择权重：衰减评分 × 延迟因子（延迟越低权重越高）"""
+        health = self.health.get(node_name)
+        if health is None:
+            return 1.0
+        weight = health.current_score(CONFIG["SCORE_HALF_LIFE"], now)
+        if health.latency_ms:
+            weight *= 1000.0 / (1000.0 + health.latency_ms)
+        return max(weight, 0.01)
+    
+    def get_random_node(self, exclude=None, region=None):
+        """
+        按健康评分加权随机获取可用节点（跳过熔断隔离中的节点和 exclude 中的节点名）
+        
+        region 为国家/地区代码（"JP"）或 ASN（"AS2914"）时只在该地区的节点中选择（直接查地区索引）；
+        该地区没有可用节点时返回 None，由调用方决定是否放宽。
+        """
+        if region:
+            nodes = self.node_set.by_region.get(normalize_region(region), ())
+        else:
+            nodes = self.available_nodes
+        if not nodes:
+            return None
+        now = time.time()
+        if len(nodes) > 4 * (len(self.health) + len(exclude or ())):
+            return self._pick_sparse(nodes, exclude, region, now)
+        candidates = [
+            n for n in nodes
+            if (not exclude or n.get("name") not in exclude) and self.is_node_available(n.get("name"), now)
+        ]
+        if not candidates:
+            return None
+        weights = [self.get_node_weight(n.get("name"), now) for n in candidates]
+        node = random.choices(candidates, weights=weights, k=1)[0]
+        self._claim_probe(node.get("name"), now)
+        return node
+    
+    def _pick_sparse(self, nodes, exclude, region, now):
+        """
+        大节点池的加权随机：与逐个计算权重的结果分布相同，但只遍历有健康记录或被排除的少数节点
+        
+        没有健康记录的节点权重都是 1.0，先按总权重决定落在"特殊节点"还是"普通节点"，
+        落在普通节点时随机取下标，抽到特殊节点就重抽（特殊节点不超过 1/4，期望重抽不到 2 次）。
+        """
+        by_name = self.node_set.by_name
+        region = normalize_region(region) if region else None
+        special = {}  # 节点名 -> 权重（不可选的为 0）
+        for name in list(self.health) + list(exclude or ()):
+            if name in special or name not in by_name:
+                continue
+            if region and region not in region_keys(by_name[name]):
+                continue
+            if (exclude and name in exclude) or not self.is_node_available(name, now):
+                special[name] = 0.0
+            else:
+                special[name] = self.get_node_weight(name, now)
+        plain = len(nodes) - len(special)
+        special_total = sum(special.values())
+        if plain + special_total <= 0:
+            return None
+        r = random.random() * (plain + special_total)
+        if r < special_total:
+            chosen = None
+            for name, weight in special.items():
+                if weight > 0:
+                    chosen = name
+                    r -= weight
+                    if r < 0:
+                        break
+            node = by_name[chosen]
+            self._claim_probe(chosen, now)
+            return node
+        while True:
+            node = nodes[random.randrange(len(nodes))]
+            if node.get("name") not in special:
+                return node
+    
+    def get_node_for(self, key, exclude=None):
+        """
+        为 key（账号、域名等）返回固定的节点，同一个 key 始终使用同一出口
+        
+        归属节点被熔断隔离（或在 exclude 中）时顺时针取下一个健康节点，节点恢复后 key
+        自动回到原节点；只有受影响节点上的 key 会迁移。
+        """
+        node_set = self.node_set
+        now = time.time()
+        for name in node_set.ring.iter_nodes(key):
+            if exclude and name in exclude:
+                continue
+            if self.is_node_available(name, now):
+                self._claim_probe(name, now)
+                return node_set.by_name.get(name)
+        return None
+    
+    def get_node_for_target(self, target, exclude=None, region=None):
+        """
+        为目标（URL 或域名）选节点：开启 BANDIT_ENABLED 时按该域名上的历史访问结果做 Thompson 采样，
+        否则等同于 get_random_node
+        
+        只遍历在该域名上访问过的节点；从未访问过的节点按该域名的总体成功率整体抽样，胜出时按健康评分从中随机选一个。
+        熔断隔离中的节点和 exclude 中的节点不会被选中。
+        """
+        domain = target_key(target)
+        if self.bandit is None or not domain:
+            return self.get_random_node(exclude, region)
+        node_set = self.node_set
+        region_key = normalize_region(region) if region else None
+        base = node_set.by_region.get(region_key, ()) if region_key else node_set.available
+        now = time.time()
+        best_name, best_sample, seen = None, -1.0, set()
+        for name, arm in list(self.bandit.domain_arms(domain).items()):
+            node = node_set.by_name.get(name)
+            if node is None or (region_key and region_key not in region_keys(node)):
+                continue
+            seen.add(name)
+            if (exclude and name in exclude) or not self.is_node_available(name, now):
+                continue
+            sample = self.bandit.sample(arm, now)
+            if sample > best_sample:
+                best_name, best_sample = name, sample
+        if self.bandit.sample_unexplored(domain, len(base) - len(seen), now) > best_sample:
+            node = self.get_random_node(seen | set(exclude or ()), region)
+            if node is not None:
+                return node
+        if best_name is None:
+            return None
+        self._claim_probe(best_name, now)
+        return node_set.by_name.get(best_name)
+    
+    def report_success(self, node_name, latency_ms=None, target=None):
+        """调用方回报：节点访问成功（可附带本次测得的延迟；target 为访问的 URL / 域名时计入该域名的学习状态）"""
+        if not node_name:
+            return
+        if target and self.bandit is not None:
+            self.bandit.update(target_key(target), node_name, True)
+        health = self._get_health(node_name)
+        health.record(1.0, CONFIG["SCORE_DECAY"], CONFIG["SCORE_HALF_LIFE"])
+        if latency_ms is not None:
+            if health.latency_ms is None:
+                health.latency_ms = latency_ms
+            else:
+                decay = CONFIG["SCORE_DECAY"]
+                health.latency_ms = decay * health.latency_ms + (1 - decay) * latency_ms
+        health.consecutive_failures = 0
+        health.state = "closed"
+        health.probing = False
+        health.last_error = None
+    
+    def release_probe(self, node_name):
+        """选中的节点最终没有用上（没有访问结果可回报）：交还 half_open 探测名额，节点可以立即再次被选中"""
+        health = self.health.get(node_name)
+        if health is not None and health.state == "half_open":
+            health.probing = False
+    
+    def report_passive_success(self, node_name):
+        """被动观测到节点正常传输数据：只提高评分，不清零连续失败、不改变熔断状态（这些只由主动访问的结果决定）"""
+        if not node_name:
+            return
+        self._get_health(node_name).record(1.0, CONFIG["SCORE_DECAY"], CONFIG["SCORE_HALF_LIFE"])
+    
+    def report_failure(self, node_name, error=None, target=None):
+        """调用方回报：节点访问失败，连续失败达到阈值或探测失败时熔断（target 同 report_success）"""
+        if not node_name:
+            return
+        if target and self.bandit is not None:
+            self.bandit.update(target_key(target), node_name, False)
+        health = self._get_health(node_name)
+        health.record(0.0, CONFIG["SCORE_DECAY"], CONFIG["SCORE_HALF_LIFE"])
+        health.consecutive_failures += 1
+        health.last_error = error
+        if health.state == "half_open" or health.consecutive_failures >= CONFIG["BREAKER_THRESHOLD"]:
+            if health.state != "open":
+                print(f"  🚫 节点已熔断隔离 {CONFIG['BREAKER_COOLDOWN']} 秒: {node_name}")
+            health.state = "open"
+            health.opened_at = time.time()
+        health.probing = False
+    
+    def get_regions(self):
+        """各地区（国家代码 / ASN）的节点数"""
+        return {key: len(nodes) for key, nodes in self.node_set.by_region.items()}
+    
+    def get_quarantined_nodes(self):
+        """返回当前处于熔断隔离中的节点名"""
+        return [name for name, h in list(self.health.items()) if h.state == "open"]
+    
+    def seconds_until_recovery(self, now=None):
+        """距最早一个节点重新可选还有多少秒（熔断冷却结束或探测名额收回）；没有这样的节点时为 None"""
+        if now is None:
+            now = time.time()
+        ready_at = []
+        for h in list(self.health.values()):
+            if h.state == "open":
+                ready_at.append(h.opened_at + CONFIG["BREAKER_COOLDOWN"])
+            elif h.state == "half_open" and h.probing:
+                ready_at.append(h.probe_started_at + CONFIG["PROBE_TIMEOUT"])
+        if not ready_at:
+            return None
+        return max(0.0, min(ready_at) - now)
+    
+    def _headers(self):
+        """Mihomo REST API 鉴权头"""
+        secret = CONFIG["MIHOMO_SECRET"]
+        return {"Authorization": f"Bearer {secret}"} if secret else {}
+    
+    def get_switch_stats(self):
+        """切换耗时统计（毫秒）：count / mean / p50 / p90 / p99 / max"""
+        samples = sorted(self.switch_latencies)
+        if not samples:
+            return {"count": 0}
+        
+        def percentile(p):
+            # nearest-rank 百分位
+            idx = max(0, math.ceil(p / 100.0 * len(samples)) - 1)
+            return round(samples[idx], 1)
+        
+        return {
+            "count": len(samples),
+            "mean": round(sum(samples) / len(samples), 1),
+            "p50": percentile(50),
+            "p90": percentile(90),
+            "p99": percentile(99),
+            "max": round(samples[-1], 1),
+        }
+    
+    def record_switch(self, start, ok):
+        """记录一次切换（start 为 time.perf_counter() 起点）：成功的计入切换耗时统计，并写入指标"""
+        elapsed = time.perf_counter() - start
+        if ok:
+            self.switch_latencies.append(elapsed * 1000)
+        SWITCH_SECONDS.observe(elapsed, result="ok" if ok else "failed")
+    
+    def record_ip_lookup(self, start, ip):
+        """记录一次（未命中缓存的）出口 IP 查询耗时"""
+        EXIT_IP_SECONDS.observe(time.perf_counter() - start, result="ok" if ip else "failed")
+    
+    def get_cached_ip(self, node_name, use_cache=True):
+        """返回节点在缓存有效期内的出口 IP，未命中返回 None（half_open 探测中的节点总是未命中）"""
+        self.last_ip_from_cache = False
+        ttl = CONFIG["EXIT_IP_TTL"]
+        if not use_cache or not node_name or ttl <= 0:
+            return None
+        health = self.health.get(node_name)
+        if health is not None and health.state == "half_open":
+            # 探测必须真的经过该节点，不能用熔断前缓存的 IP 冒充
+            return None
+        cached = self.exit_ip_cache.get(node_name)
+        if cached and time.time() - cached[1] < ttl:
+            self.last_ip_from_cache = True
+            EXIT_IP_CACHE_HITS.inc()
+            return cached[0]
+        return None
+    
+    def store_exit_ip(self, node_name, ip):
+        """记录节点出口 IP"""
+        if ip and node_name:
+            self.exit_ip_cache[node_name] = (ip, time.time())
+    
+    def __len__(self):
+        return len(self.available_nodes)
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+列式节点表与 mmap 二进制快照
+
+测试结果 JSON 解析出来是一个个 dict：十万级节点时加载要几秒，每个 worker 进程还各持一份。
+NodeTable 按列存放节点：
+    名称       所有名称的 UTF-8 拼成一个字符串表，另存偏移数组（每个名称只存一份）
+    latency   float32 延迟（毫秒）
+    score     float32 初始评分（结果中没有 score 字段时为 1.0）
+    flags     uint8：FLAG_OK 可用 / FLAG_LATENCY 有延迟
+    country   2 字节国家代码；asn uint32（0 表示未知）
+另有一个按名称字节序排好的行号数组，按名查找为二分 O(log n)，不必在每个进程里建 dict。
+只保留选节点用到的字段，其余字段（exit_ip、as_name、失败原因等）仍以 JSON 为准。
+
+快照文件就是上述数组依次排列（8 字节对齐、小端序）。加载时 mmap 只读映射，用 memoryview.cast
+直接当数组读，不解析、不复制：多个 worker 进程映射同一个文件，共享页缓存中的同一份数据，启动只需几毫秒。
+
+开启 CONFIG["RESULTS_SNAPSHOT"] 后，代理池加载测试结果时自动使用 <结果文件名>.nodes 快照：
+快照头部记录了源 JSON 的修改时间和大小，对不上时重新生成（类似 .pyc）。
+也可以直接把 .nodes 文件作为 results_file 传给代理池。
+
+用法：
+    python -m proxy_pool.table build [proxy_test_results.json] [-o 快照路径]
+    python -m proxy_pool.table info 快照路径
+"""
+import os
+import sys
+import json
+import mmap
+import math
+import array
+import struct
+import argparse
+from collections.abc import Mapping, Sequence
+
+from .nodes import NodeSet, parse_test_results
+
+MAGIC = b"PPNT"
+VERSION = 1
+# magic, 版本, 保留, 行数, 可用行数, 名称表字节数, 源文件 mtime_ns, 源文件大小
+_HEADER = struct.Struct("<4sHHIIIqq")
+
+FLAG_OK = 1
+FLAG_LATENCY = 2
+
+_LITTLE = sys.byteorder == "little"
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(rows, names_len):
+    """各列在文件中的 (偏移, 字节数)，只由行数和名称表长度决定"""
+    sections = [
+        ("offsets", 4 * (rows + 1)),
+        ("order", 4 * rows),
+        ("latency", 4 * rows),
+        ("score", 4 * rows),
+        ("asn", 4 * rows),
+        ("flags", rows),
+        ("country", 2 * rows),
+        ("names", names_len),
+    ]
+    layout = {}
+    offset = _align(_HEADER.size)
+    for name, size in sections:
+        layout[name] = (offset, size)
+        offset = _align(offset + size)
+    return layout, offset
+
+
+def _column(view, typecode):
+    """把一段字节当作数组读：小端机器上零拷贝，大端机器上复制一份并转换字节序"""
+    if _LITTLE:
+        return view.cast(typecode)
+    column = array.array(typecode, bytes(view))
+    column.byteswap()
+    return column
+
+
+def _parse_asn(value):
+    if not value:
+        return 0
+    value = str(value).strip().upper()
+    if value.startswith("AS"):
+        value = value[2:]
+    return int(value) if value.isdigit() and int(value) < 2 ** 32 else 0
+
+
+class NodeTable:
+    """只读的列式节点表，数据在一个缓冲区（bytes 或 mmap）中"""
+    def __init__(self, buffer, path=None):
+        self.path = path
+        self._buffer = buffer  # 保持 mmap 存活
+        view = memoryview(buffer)
+        if len(view) < _HEADER.size:
+            raise ValueError("节点快照文件不完整")
+        magic, version, _, rows, n_ok, names_len, mtime_ns, size = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是节点快照文件（或版本不兼容）: {path}")
+        layout, total = _layout(rows, names_len)
+        if len(view) < total:
+            raise ValueError("节点快照文件不完整")
+        self.rows = rows
+        self.n_ok = n_ok
+        self.source_stamp = (mtime_ns, size)
+
+        def section(name):
+            offset, length = layout[name]
+            return view[offset:offset + length]
+
+        self._offsets = _column(section("offsets"), "I")
+        self._order = _column(section("order"), "I")
+        self._latency = _column(section("latency"), "f")
+        self._score = _column(section("score"), "f")
+        self._asn = _column(section("asn"), "I")
+        self._flags = section("flags")
+        self._country = section("country")
+        self._names = section("names")
+
+    # ---------- 构建与保存 ----------
+
+    @classmethod
+    def from_nodes(cls, available, failed=(), source_stamp=(0, 0)):
+        """由节点 dict 列表构建（同名节点只保留第一个）"""
+        rows = []
+        seen = set()
+        for ok, nodes in ((True, available), (False, failed)):
+            for node in nodes:
+                name = node.get("name")
+                if not name or name in seen:
+                    continue
+                seen.add(name)
+                rows.append((ok, node))
+        n_ok = sum(1 for ok, _ in rows if ok)
+
+        names = bytearray()
+        offsets = array.array("I", [0])
+        latency = array.array("f")
+        score = array.array("f")
+        asn = array.array("I")
+        flags = bytearray()
+        country = bytearray()
+        encoded = []
+        for ok, node in rows:
+            name = node["name"].encode("utf-8")
+            encoded.append(name)
+            names += name
+            offsets.append(len(names))
+            value = node.get("latency_ms", node.get("latency"))
+            has_latency = isinstance(value, (int, float)) and not isinstance(value, bool)
+            latency.append(float(value) if has_latency else math.nan)
+            score.append(float(node.get("score", 1.0)))
+            asn.append(_parse_asn(node.get("asn")))
+            flags.append((FLAG_OK if ok else 0) | (FLAG_LATENCY if has_latency else 0))
+            code = str(node.get("country") or "").upper().encode("ascii", "ignore")
+            # 只收两位国家代码，其他写法按未知处理
+            country += code if len(code) == 2 else b"\0\0"
+        order = array.array("I", sorted(range(len(rows)), key=encoded.__getitem__))
+
+        layout, total = _layout(len(rows), len(names))
+        buffer = bytearray(total)
+        _HEADER.pack_into(buffer, 0, MAGIC, VERSION, 0, len(rows), n_ok, len(names), *source_stamp)
+        for key, column in (("offsets", offsets), ("order", order), ("latency", latency),
+                            ("score", score), ("asn", asn)):
+            if not _LITTLE:
+                column.byteswap()
+            data = column.tobytes()
+            offset = layout[key][0]
+            buffer[offset:offset + len(data)] = data
+        for key, data in (("flags", flags), ("country", country), ("names", names)):
+            offset = layout[key][0]
+            buffer[offset:offset + len(data)] = data
+        return cls(bytes(buffer))
+
+    def save(self, path):
+        """原子写入快照文件（先写临时文件再替换，正在映射旧文件的进程不受影响）"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(memoryview(self._buffer))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """mmap 只读映射快照文件"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, path)
+
+    # ---------- 读取 ----------
+
+    def __len__(self):
+        return self.rows
+
+    def name(self, i):
+        return bytes(self._names[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def latency(self, i):
+        return float(self._latency[i]) if self._flags[i] & FLAG_LATENCY else None
+
+    def country(self, i):
+        code = bytes(self._country[2 * i:2 * i + 2])
+        return code.decode("ascii") if code != b"\0\0" else None
+
+    def asn(self, i):
+        value = self._asn[i]
+        return f"AS{value}" if value else None
+
+    def node(self, i):
+        """第 i 行的节点 dict（每次新建，字段与测试结果 JSON 一致）"""
+        node = {"name": self.name(i)}
+        latency = self.latency(i)
+        if latency is not None:
+            node["latency_ms"] = round(latency, 2)
+        score = self._score[i]
+        if score != 1.0:
+            node["score"] = float(score)
+        country = self.country(i)
+        if country:
+            node["country"] = country
+        asn = self.asn(i)
+        if asn:
+            node["asn"] = asn
+        return node
+
+    def index_of(self, name):
+        """按名称二分查找行号，找不到返回 -1"""
+        key = name.encode("utf-8")
+        lo, hi = 0, self.rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = self._order[mid]
+            current = bytes(self._names[self._offsets[row]:self._offsets[row + 1]])
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return row
+        return -1
+
+
+class TableNodes(Sequence):
+    """节点表中一组行的只读序列视图，取元素时才生成 dict"""
+    def __init__(self, table, rows):
+        self.table = table
+        self.rows = rows  # range 或 array('I') 行号
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table.node(i) for i in self.rows[index]]
+        return self.table.node(self.rows[index])
+
+    def __iter__(self):
+        node = self.table.node
+        for i in self.rows:
+            yield node(i)
+
+
+class TableIndex(Mapping):
+    """可用节点的名称索引（二分查找，不在进程内建 dict）"""
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, name):
+        i = self.table.index_of(name) if isinstance(name, str) else -1
+        if i < 0 or i >= self.table.n_ok:
+            raise KeyError(name)
+        return self.table.node(i)
+
+    def __contains__(self, name):
+        if not isinstance(name, str):
+            return False
+        i = self.table.index_of(name)
+        return 0 <= i < self.table.n_ok
+
+    def __iter__(self):
+        name = self.table.name
+        for i in range(self.table.n_ok):
+            yield name(i)
+
+    def __len__(self):
+        return self.table.n_ok
+
+
+class TableNodeSet(NodeSet):
+    """基于 NodeTable 的节点集合，接口与 NodeSet 相同"""
+    def __init__(self, table):
+        self.table = table
+        self.available = TableNodes(table, range(table.n_ok))
+        self.failed = TableNodes(table, range(table.n_ok, table.rows))
+        self.by_name = TableIndex(table)
+        self._by_region = None
+        self._ring = None
+
+    def _build_region_index(self):
+        table = self.table
+        rows_by_key = {}
+        for i in range(table.n_ok):
+            for key in (table.country(i), table.asn(i)):
+                if key:
+                    rows = rows_by_key.get(key)
+                    if rows is None:
+                        rows = rows_by_key[key] = array.array("I")
+                    rows.append(i)
+        return {key: TableNodes(table, rows) for key, rows in rows_by_key.items()}
+
+
+def snapshot_path_for(results_file):
+    """测试结果 JSON 对应的快照路径：proxy_test_results.json -> proxy_test_results.nodes"""
+    return os.path.splitext(results_file)[0] + ".nodes"
+
+
+def build_snapshot(results_file, snapshot_file=None):
+    """读取测试结果 JSON 生成快照，返回内存中的 NodeTable"""
+    stat = os.stat(results_file)
+    with open(results_file, "r", encoding="utf-8") as f:
+        available, failed = parse_test_results(json.load(f))
+    table = NodeTable.from_nodes(available, failed, (stat.st_mtime_ns, stat.st_size))
+    table.save(snapshot_file or snapshot_path_for(results_file))
+    return table
+
+
+def load_or_build(results_file, snapshot_file=None):
+    """
+    返回 results_file 对应的 mmap 节点表：快照与 JSON 一致时直接映射，否则重新生成
+
+    快照写入失败（只读目录、Windows 上文件正被其他进程映射等）时退回内存中的表。
+    """
+    snapshot_file = snapshot_file or snapshot_path_for(results_file)
+    stat = os.stat(results_file)
+    try:
+        table = NodeTable.load(snapshot_file)
+        if table.source_stamp == (stat.st_mtime_ns, stat.st_size):
+            return table
+    except (OSError, ValueError):
+        pass
+    try:
+        build_snapshot(results_file, snapshot_file)
+        return NodeTable.load(snapshot_file)
+    except OSError as e:
+        print(f"⚠️  无法写入节点快照 {snapshot_file}: {e}，本进程使用内存中的节点表")
+        with open(results_file, "r", encoding="utf-8") as f:
+            available, failed = parse_test_results(json.load(f))
+        return NodeTable.from_nodes(available, failed, (stat.st_mtime_ns, stat.st_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="节点表二进制快照")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="由测试结果 JSON 生成快照")
+    build.add_argument("results", nargs="?", help="测试结果 JSON（默认 CONFIG['PROXY_RESULTS']）")
+    build.add_argument("-o", "--output", help="快照路径（默认与 JSON 同名，扩展名 .nodes）")
+    info = sub.add_parser("info", help="查看快照内容")
+    info.add_argument("snapshot")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        results = args.results
+        if results is None:
+            from .config import CONFIG
+            results = CONFIG["PROXY_RESULTS"]
+        output = args.output or snapshot_path_for(results)
+        table = build_snapshot(results, output)
+        print(f"💾 节点快照已写入: {output}")
+        print(f"   -> {table.n_ok} 个可用节点，{table.rows - table.n_ok} 个不可用，{os.path.getsize(output) / 1024:.1f} KB")
+    else:
+        table = NodeTable.load(args.snapshot)
+        node_set = TableNodeSet(table)
+        print(f"📦 {args.snapshot}")
+        print(f"   可用 {table.n_ok} ，不可用 {table.rows - table.n_ok} ，{os.path.getsize(args.snapshot) / 1024:.1f} KB")
+        regions = sorted(node_set.by_region.items(), key=lambda kv: -len(kv[1]))[:10]
+        if regions:
+            print("   地区: " + "，".join(f"{key} {len(rows)}" for key, rows in regions))
+        for node in node_set.available[:5]:
+            print(f"   {node}")
+
+
+if __name__ == "__main__":
+    main()
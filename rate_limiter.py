@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""按出口节点 / 目标域名的令牌桶限速与调度。
+
+全局 get_interval 等待会让整个进程空转，即使还有几十个节点可以安全访问目标。
+这里改为给每个节点、每个目标域名各配一个令牌桶：
+
+- 节点桶：限制单个出口 IP 的访问频率，保证每个 IP 都低于封禁阈值；
+- 域名桶：限制对单个目标站点的总访问频率（所有节点合计）。
+
+VisitScheduler 每次挑选一个节点桶和域名桶都有令牌的 (节点, 域名) 组合，
+都没有令牌时返回需要等待的秒数。节点越多，总吞吐越高。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多存 capacity 个。"""
+
+    def __init__(self, rate: float, capacity: float = 1.0, now: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+    def try_acquire(self, now: float, n: float = 1.0) -> bool:
+        self._refill(now)
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def time_until(self, now: float, n: float = 1.0) -> float:
+        """距离攒够 n 个令牌还需多少秒（rate 为 0 时返回 inf）。"""
+        self._refill(now)
+        if self.tokens >= n:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (n - self.tokens) / self.rate
+
+
+def get_domain(url: str) -> str:
+    """URL 的域名（不含端口），无法解析时原样返回。"""
+    return urlparse(url).hostname or url
+
+
+class RateLimiter:
+    """节点桶 + 域名桶，线程安全；两个桶都有令牌时才一次性同时扣除。"""
+
+    def __init__(
+        self,
+        node_rate: float,
+        node_burst: float = 1.0,
+        domain_rate: float = 1.0,
+        domain_burst: float = 1.0,
+        domain_rates: Optional[Dict[str, float]] = None,
+    ):
+        self.node_rate = node_rate
+        self.node_burst = node_burst
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.domain_rates = dict(domain_rates or {})
+        self._nodes: Dict[str, TokenBucket] = {}
+        self._domains: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(
+        cls,
+        node_per_min: float,
+        node_burst: float,
+        domain_per_min: float,
+        domain_burst: float,
+        domain_rates_per_min: Optional[Dict[str, float]] = None,
+    ) -> "RateLimiter":
+        """以“每分钟次数”配置（CONFIG 中的写法）。"""
+        return cls(
+            node_per_min / 60.0,
+            node_burst,
+            domain_per_min / 60.0,
+            domain_burst,
+            {d: r / 60.0 for d, r in (domain_rates_per_min or {}).items()},
+        )
+
+    def _node_bucket(self, node: str, now: float) -> TokenBucket:
+        bucket = self._nodes.get(node)
+        if bucket is None:
+            bucket = self._nodes[node] = TokenBucket(self.node_rate, self.node_burst, now)
+        return bucket
+
+    def _domain_bucket(self, domain: str, now: float) -> TokenBucket:
+        bucket = self._domains.get(domain)
+        if bucket is None:
+            rate = self.domain_rates.get(domain, self.domain_rate)
+            bucket = self._domains[domain] = TokenBucket(rate, self.domain_burst, now)
+        return bucket
+
+    def try_acquire(self, node: str, domain: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            node_bucket = self._node_bucket(node, now)
+            domain_bucket = self._domain_bucket(domain, now)
+            if node_bucket.available(now) < 1 or domain_bucket.available(now) < 1:
+                return False
+            node_bucket.try_acquire(now)
+            domain_bucket.try_acquire(now)
+            return True
+
+    def exhausted_nodes(self, now: Optional[float] = None) -> set:
+        """当前没有令牌的节点名集合。"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {name for name, b in self._nodes.items() if b.available(now) < 1}
+
+    def node_wait(self, nodes: Iterable[str], now: Optional[float] = None) -> float:
+        """给定节点中最早拿到令牌还需等待的秒数。"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            waits = [self._node_bucket(n, now).time_until(now) for n in nodes]
+        return min(waits) if waits else float("inf")
+
+    def domain_wait(self, domain: str, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self._domain_bucket(domain, now).time_until(now)
+
+
+class VisitScheduler:
+    """从代理池和限速器中挑出下一个可以立即访问的 (节点, 域名) 组合。"""
+
+    def __init__(self, pool, limiter: RateLimiter):
+        self.pool = pool
+        self.limiter = limiter
+
+    def next_dispatch(
+        self, domains: Iterable[str], region: Optional[str] = None, exclude: Optional[Iterable[str]] = None
+    ) -> Tuple[Optional[dict], Optional[str], float]:
+        """
+        region 为优先的出口地区（TARGET_REGIONS），该地区没有可用节点时放宽到全部节点；
+        exclude 中的节点不参与（例如没有独立端口的节点）。
+
+        返回 (node, domain, 0.0)：令牌已扣除，可以立即访问；
+        或 (None, None, wait)：暂时没有可用组合，wait 秒后再试；
+        wait 为 inf 表示没有任何候选节点（节点池为空或全部熔断隔离中），继续等待也不会有结果。
+        """
+        now = time.monotonic()
+        best_wait = float("inf")
+        skip = set(exclude or ())
+        # 域名按就绪时间排序，先服务已经有令牌的目标
+        ordered = sorted(domains, key=lambda d: self.limiter.domain_wait(d, now))
+        for domain in ordered:
+            domain_wait = self.limiter.domain_wait(domain, now)
+            if domain_wait > 0:
+                best_wait = min(best_wait, domain_wait)
+                continue
+            exclude = self.limiter.exhausted_nodes(now) | skip
+            # 按该域名上的历史结果（未开启学习时按健康评分加权）选节点，已用完令牌的节点不参与
+            for _ in range(3):
+                node = self.pool.get_node_for_target(domain, exclude, region) if region else None
+                if node is None:
+                    node = self.pool.get_node_for_target(domain, exclude)
+                if node is None:
+                    break
+                if self.limiter.try_acquire(node.get("name"), domain, now):
+                    return node, domain, 0.0
+                # 没拿到令牌，这次不会访问该节点：交还选中时占用的探测名额
+                self.pool.release_probe(node.get("name"))
+                exclude.add(node.get("name"))
+            names = [
+                n.get("name") for n in self.pool.available_nodes
+                if n.get("name") not in skip and self.pool.is_node_available(n.get("name"))
+            ]
+            best_wait = min(best_wait, self.limiter.node_wait(names, now))
+        return None, None, max(best_wait, 0.01)
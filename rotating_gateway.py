@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""本地轮换代理网关：一个代理地址，每个连接自动换出口。
+
+换出口目前需要调用 switch_node（全局生效），浏览器往往还要重启。本网关在本地监听一个端口，
+同时支持 HTTP 代理（CONNECT 隧道 / 普通 HTTP 转发）和 SOCKS5：
+
+- 每个进入的连接从代理池的健康节点中选一个上游，经该节点的独立监听端口（listeners）转发，
+  不切换任何代理组，多个连接可以同时走不同出口；
+- 轮换策略（GatewayConfig.policy）：
+    per_connection  每个连接换一个节点（按健康评分加权随机）
+    per_n           每 rotate_every 个连接换一个节点
+    sticky          同一会话 key 始终走同一节点（一致性哈希，见 get_node_for）；
+                    key 取自请求头 X-Proxy-Session 或 SOCKS5 用户名，没有 key 的连接按 per_connection 处理
+- 上游 CONNECT 失败时换下一个节点重试，成功时回报成功，健康评分与熔断照常生效。
+  同一目标在换过的节点上都连不上时多半是目标本身的问题（域名无法解析、端口未开放），
+  只有随后换到的节点连通了，才把之前失败的节点记为失败；
+- 普通 HTTP 请求改写后强制 Connection: close，每个请求单独建连接、单独选出口。
+
+Chrome 或任何客户端只需把代理设为 http://127.0.0.1:7900（或 socks5://127.0.0.1:7900）。
+
+用法：
+    python rotating_gateway.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import struct
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from proxy_pool import CONFIG, MihomoProxyPool, TrafficMonitor
+
+POLICIES = ("per_connection", "per_n", "sticky")
+
+
+@dataclass
+class GatewayConfig:
+    host: str = "127.0.0.1"
+    port: int = 7900
+    policy: str = "per_connection"           # per_connection / per_n / sticky
+    rotate_every: int = 10                    # per_n：每多少个连接换一个节点
+    sticky_header: str = "X-Proxy-Session"    # sticky：会话 key 所在的请求头（转发前会被移除）
+    upstream_host: str = "127.0.0.1"          # 每节点监听端口所在主机
+    connect_timeout: float = 10.0
+    max_retries: int = CONFIG["NODE_RETRY"]   # 上游失败时最多换几个节点
+
+
+class Rotator:
+    """按策略为每个连接挑选上游节点。"""
+
+    def __init__(self, pool: MihomoProxyPool, node_ports: Dict[str, int], policy: str, rotate_every: int = 10):
+        if policy not in POLICIES:
+            raise ValueError(f"未知轮换策略: {policy}（可选 {', '.join(POLICIES)}）")
+        self.pool = pool
+        self.node_ports = node_ports
+        self.policy = policy
+        self.rotate_every = max(1, rotate_every)
+        self._current: Optional[str] = None
+        self._count = 0
+        self._no_port_for = None
+        self._no_port: Set[str] = set()
+
+    def _unroutable(self) -> Set[str]:
+        # 没有独立端口的节点无法单独走，按节点集合缓存（热加载换集合后重新计算）
+        node_set = self.pool.node_set
+        if node_set is not self._no_port_for:
+            self._no_port = {n.get("name") for n in node_set.available if n.get("name") not in self.node_ports}
+            self._no_port_for = node_set
+        return self._no_port
+
+    def pick(self, key: Optional[str] = None, exclude: Optional[Set[str]] = None) -> Optional[str]:
+        skip = self._unroutable() | (exclude or set())
+        if self.policy == "sticky" and key:
+            node = self.pool.get_node_for(key, exclude=skip)
+            return node.get("name") if node else None
+
+        if self.policy == "per_n":
+            current = self._current
+            if (
+                current is None
+                or current in skip
+                or self._count >= self.rotate_every
+                or not self.pool.is_node_available(current)
+            ):
+                node = self.pool.get_random_node(exclude=skip)
+                self._current = node.get("name") if node else None
+                self._count = 0
+            if self._current is not None:
+                self._count += 1
+            return self._current
+
+        node = self.pool.get_random_node(exclude=skip)
+        return node.get("name") if node else None
+
+
+async def relay(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """单向转发直到 EOF。"""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def close_writer(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+def parse_header_block(block: bytes) -> Tuple[str, Dict[str, str], list]:
+    """拆出请求行、{小写头名: 值} 和原始头行列表。"""
+    lines = block.decode("latin-1").split("\r\n")
+    request_line = lines[0]
+    raw_headers = [line for line in lines[1:] if line]
+    headers = {}
+    for line in raw_headers:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return request_line, headers, raw_headers
+
+
+class Gateway:
+    """asyncio 代理网关：自动识别 HTTP / SOCKS5 客户端。"""
+
+    def __init__(self, cfg: GatewayConfig, pool: MihomoProxyPool, node_ports: Dict[str, int]):
+        self.cfg = cfg
+        self.pool = pool
+        self.node_ports = node_ports
+        self.rotator = Rotator(pool, node_ports, cfg.policy, cfg.rotate_every)
+        self.stats = {"connections": 0, "failed": 0}
+        self.node_counts: Dict[str, int] = {}
+
+    async def _connect_upstream(
+        self, target: str, key: Optional[str]
+    ) -> Tuple[Optional[str], Optional[asyncio.StreamReader], Optional[asyncio.StreamWriter]]:
+        """经某个节点的监听端口建立到 target(host:port) 的 CONNECT 隧道，失败时换节点重试。"""
+        tried: Set[str] = set()
+        failures = []  # (节点, 错误)：有节点连通后才能确定是这些节点的问题
+        for _ in range(max(1, self.cfg.max_retries)):
+            name = self.rotator.pick(key, exclude=tried)
+            if name is None:
+                break
+            tried.add(name)
+            port = self.node_ports[name]
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.cfg.upstream_host, port), self.cfg.connect_timeout
+                )
+                writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode("latin-1"))
+                await writer.drain()
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.cfg.connect_timeout)
+                status = head.split(b" ", 2)[1] if head.count(b" ") >= 1 else b""
+                if status == b"200":
+                    for failed, error in failures:
+                        self.pool.report_failure(failed, error)
+                    self.pool.report_success(name)
+                    self.node_counts[name] = self.node_counts.get(name, 0) + 1
+                    return name, reader, writer
+                if status.startswith(b"4"):
+                    # 4xx 是请求本身的问题（目标格式错误、被规则拒绝），换节点也一样
+                    await close_writer(writer)
+                    self.pool.release_probe(name)
+                    break
+                error = f"upstream CONNECT {status.decode('latin-1') or '?'}"
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                error = repr(e)
+            if writer is not None:
+                await close_writer(writer)
+            failures.append((name, error))
+        # 所有节点都连不上：更可能是目标不可达，不计入节点失败，只交还选中时占用的探测名额
+        for failed, _ in failures:
+            self.pool.release_probe(failed)
+        return None, None, None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats["connections"] += 1
+        try:
+            first = await reader.readexactly(1)
+            if first == b"\x05":
+                await self._handle_socks5(reader, writer)
+            else:
+                await self._handle_http(first, reader, writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            await close_writer(writer)
+
+    async def _tunnel(self, client_r, client_w, up_r, up_w) -> None:
+        try:
+            await asyncio.gather(relay(client_r, up_w), relay(up_r, client_w))
+        finally:
+            await close_writer(up_w)
+
+    async def _handle_http(self, first: bytes, reader, writer) -> None:
+        block = first + await reader.readuntil(b"\r\n\r\n")
+        request_line, headers, raw_headers = parse_header_block(block[:-4])
+        method, _, rest = request_line.partition(" ")
+        target_uri = rest.rsplit(" ", 1)[0]
+        key = headers.get(self.cfg.sticky_header.lower())
+
+        if method.upper() == "CONNECT":
+            target = target_uri
+        else:
+            # 普通 HTTP 代理请求（绝对 URI）：同样经上游隧道发往目标主机
+            host = headers.get("host") or target_uri.split("/")[2]
+            target = host if ":" in host.rsplit("]", 1)[-1] else f"{host}:80"
+
+        name, up_r, up_w = await self._connect_upstream(target, key)
+        if name is None:
+            self.stats["failed"] += 1
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return
+
+        if method.upper() == "CONNECT":
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await writer.drain()
+        else:
+            # 去掉会话头和逐跳头，把绝对 URI 改写为路径后发出。之后连接按原始字节转发，
+            # 不再解析后续请求，所以强制 Connection: close：keep-alive 的下一个请求会重新建连接、重新选出口
+            drop = {self.cfg.sticky_header.lower(), "proxy-connection", "proxy-authorization", "connection", "keep-alive"}
+            kept = [h for h in raw_headers if h.partition(":")[0].strip().lower() not in drop]
+            kept.append("Connection: close")
+            path = target_uri
+            if "://" in path:
+                path = "/" + path.split("://", 1)[1].partition("/")[2]
+            version = rest.rsplit(" ", 1)[-1]
+            head = "\r\n".join([f"{method} {path} {version}"] + kept) + "\r\n\r\n"
+            up_w.write(head.encode("latin-1"))
+            await up_w.drain()
+        await self._tunnel(reader, writer, up_r, up_w)
+
+    async def _handle_socks5(self, reader, writer) -> None:
+        n_methods = (await reader.readexactly(1))[0]
+        methods = await reader.readexactly(n_methods)
+        key = None
+        if self.cfg.policy == "sticky" and 0x02 in methods:
+            # 用户名/密码认证（RFC 1929）：用户名作为会话 key，密码忽略
+            writer.write(b"\x05\x02")
+            await writer.drain()
+            await reader.readexactly(1)
+            username = await reader.readexactly((await reader.readexactly(1))[0])
+            await reader.readexactly((await reader.readexactly(1))[0])
+            key = username.decode("utf-8", "replace") or None
+            writer.write(b"\x01\x00")
+        elif 0x00 in methods:
+            writer.write(b"\x05\x00")
+        else:
+            writer.write(b"\x05\xff")
+            await writer.drain()
+            return
+        await writer.drain()
+
+        _, cmd, _, atyp = await reader.readexactly(4)
+        if atyp == 0x01:
+            host = str(ipaddress.IPv4Address(await reader.readexactly(4)))
+        elif atyp == 0x03:
+            host = (await reader.readexactly((await reader.readexactly(1))[0])).decode("idna")
+        elif atyp == 0x04:
+            host = f"[{ipaddress.IPv6Address(await reader.readexactly(16))}]"
+        else:
+            writer.write(b"\x05\x08\x00\x01" + b"\x00" * 6)
+            await writer.drain()
+            return
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+        if cmd != 0x01:
+            # 只支持 CONNECT
+            writer.write(b"\x05\x07\x00\x01" + b"\x00" * 6)
+            await writer.drain()
+            return
+
+        name, up_r, up_w = await self._connect_upstream(f"{host}:{port}", key)
+        if name is None:
+            self.stats["failed"] += 1
+            writer.write(b"\x05\x01\x00\x01" + b"\x00" * 6)
+            await writer.drain()
+            return
+        writer.write(b"\x05\x00\x00\x01" + b"\x00" * 6)
+        await writer.drain()
+        await self._tunnel(reader, writer, up_r, up_w)
+
+    async def start(self) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, self.cfg.host, self.cfg.port)
+
+
+async def serve(cfg: Optional[GatewayConfig] = None) -> None:
+    cfg = cfg or GatewayConfig()
+    node_ports = load_node_ports(get_workspace_paths()["output"])
+    if not node_ports:
+        print("❌ clash_profile.yaml 中没有 listeners，请用 generate_clash_profile.py 重新生成并导入 Mihomo。")
+        return
+
+    pool = MihomoProxyPool()
+    if CONFIG["WATCH_RESULTS"]:
+        pool.start_watching()
+    monitor = None
+    if CONFIG["PASSIVE_MONITOR"]:
+        # 网关上的真实流量同时回报节点评分（隧道建立之后的错误 CONNECT 阶段看不到）
+        monitor = TrafficMonitor(pool)
+        monitor.start()
+    gateway = Gateway(cfg, pool, node_ports)
+    server = await gateway.start()
+    routable = sum(1 for n in pool.available_nodes if n.get("name") in node_ports)
+    print(f"🔄 轮换网关已启动: http://{cfg.host}:{cfg.port} （同端口支持 socks5）")
+    print(f"   策略: {cfg.policy}，可用出口: {routable} 个")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if monitor is not None:
+            monitor.stop()
+            monitor.print_summary()
+        pool.stop_watching()
+        pool.close()
+        print(f"\n📊 连接 {gateway.stats['connections']} 个，无可用上游 {gateway.stats['failed']} 个")
+        for name, count in sorted(gateway.node_counts.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"   {count:5d}  {name}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断")
@@ -5,133 +5,34 @@
 import os
 import time
 import random
-import csv
+import atexit
 import json
+import threading
 from datetime import datetime, timezone
+from urllib.parse import urlparse
 
 import numpy as np
-import requests
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
-# ========== 配置区 ==========
-CONFIG = {
-    # 基础配置
-    "URL": "https://google.com",
-    "MAX_VISITS": 5,  # 最大访问次数，0表示无限
-    "WAIT_AFTER_LOAD": 2,  # 页面加载后等待秒数
-    
-    # 访问间隔模式（两种模式）
-    "INTERVAL_MODE": "poisson",  # 间隔模式：'fixed'（固定间隔）或 'poisson'（泊松分布，推荐）
-    "INTERVAL_MEAN": 10,  # 间隔均值（秒）
-    #   - fixed 模式：每次等待固定的 INTERVAL_MEAN 秒
-    #   - poisson 模式：平均等待 INTERVAL_MEAN 秒，但每次随机（更自然，模拟真实用户）
-    
-    # 代理配置
-    "USE_PROXY": True,  # 是否使用代理
-    "HEADLESS": True,  # 是否使用无头模式（不打开浏览器窗口）
-    "MIHOMO_API": "http://127.0.0.1:9090",  # Mihomo REST API 地址
-    "MIHOMO_PROXY": "http://127.0.0.1:7892",  # Mihomo HTTP 代理地址（修正端口）
-    "PROXY_GROUP": "NODE_TEST",  # Mihomo 代理组名称（用于读取节点列表）
-    "SWITCH_GROUP": "GLOBAL",  # Mihomo 切换组名称（实际切换的组，流量走这个组）
-    "PROXY_RESULTS": "/Users/ronchy2000/Documents/Developer/Workshop/Python_Study/爬虫学习/动态ip池/proxies/proxy_test_results.json",  # 测试结果文件
-    "CSV_FILE": "visit_log.csv",  # 日志文件名
-}
+from rate_limiter import RateLimiter, VisitScheduler, get_domain
+from visit_log import VisitLogWriter
+from visit_trace import NULL_TRACE, TraceWriter, VisitProfiler, VisitTrace, print_summary, summarize, trace_path_for
 
-# ========== Mihomo 代理池类 ==========
-class MihomoProxyPool:
-    """Mihomo 代理池管理"""
-    def __init__(self, results_file=None, api_url=None, group_name=None, switch_group=None):
-        self.available_nodes = []
-        self.failed_nodes = []
-        if results_file is None:
-            results_file = CONFIG["PROXY_RESULTS"]
-        if api_url is None:
-            api_url = CONFIG["MIHOMO_API"]
-        if group_name is None:
-            group_name = CONFIG["PROXY_GROUP"]
-        if switch_group is None:
-            switch_group = CONFIG["SWITCH_GROUP"]
-        
-        self.api_url = api_url
-        self.group_name = group_name
-        self.switch_group = switch_group
-        self.load_test_results(results_file)
-    
-    def load_test_results(self, filepath):
-        """从测试结果文件加载可用节点"""
-        # 如果是相对路径，转换为相对于脚本目录的绝对路径
-        if not os.path.isabs(filepath):
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            filepath = os.path.join(script_dir, filepath)
-        
-        if not os.path.exists(filepath):
-            print(f"⚠️  测试结果文件不存在: {filepath}")
-            return
-        
-        with open(filepath, "r", encoding="utf-8") as f:
-            results = json.load(f)
-        
-        # 兼容 check_proxies.py 多种格式
-        if "meta" in results:
-            # 新格式: {"meta": {...}, "ok": [...], "failed": [...]}
-            self.available_nodes = results.get("ok", [])
-            self.failed_nodes = results.get("failed", [])
-        elif "ok" in results:
-            # 中间格式: {"ok": [...], "failed": [...]} (没有 meta)
-            self.available_nodes = results.get("ok", [])
-            self.failed_nodes = results.get("failed", [])
-        else:
-            # 旧格式: {"available": [...], "failed": [...]}
-            self.available_nodes = results.get("available", [])
-            self.failed_nodes = results.get("failed", [])
-        
-        print(f"✅ 加载 {len(self.available_nodes)} 个可用节点")
-        if len(self.failed_nodes) > 0:
-            print(f"ℹ️  {len(self.failed_nodes)} 个节点不可用")
-    
-    def get_random_node(self):
-        """随机获取可用节点"""
-        if not self.available_nodes:
-            return None
-        return random.choice(self.available_nodes)
-    
-    def switch_node(self, node_name):
-        """切换 Mihomo 代理节点"""
-        url = f"{self.api_url}/proxies/{self.switch_group}"
-        payload = {"name": node_name}
-        
-        try:
-            response = requests.put(url, json=payload, timeout=5)
-            if response.status_code == 204:
-                # 添加短暂延迟，等待节点切换生效
-                time.sleep(0.3)
-                return True, "切换成功"
-            else:
-                return False, f"HTTP {response.status_code}"
-        except Exception as e:
-            return False, str(e)
-    
-    def get_current_ip(self):
-        """获取当前出口 IP"""
-        try:
-            response = requests.get(
-                "https://api.ipify.org?format=json",
-                proxies={
-                    "http": CONFIG["MIHOMO_PROXY"],
-                    "https": CONFIG["MIHOMO_PROXY"]
-                },
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json().get("ip")
-        except:
-            pass
-        return None
-    
-    def __len__(self):
-        return len(self.available_nodes)
+# 代理池、配置与控制器客户端在 proxy_pool 包中（轻量，小工具应直接从 proxy_pool 导入）
+from proxy_pool.config import CONFIG
+from proxy_pool.nodes import normalize_region
+from proxy_pool.mihomo import MihomoProxyPool
+from proxy_pool.monitor import TrafficMonitor
+from proxy_pool.bandit import target_key
+from proxy_pool import metrics
+
+DRIVER_STARTUP_SECONDS = metrics.histogram("driver_startup_seconds", "启动 Chrome 驱动的耗时（含 ChromeDriver 查找与 CDP 设置，秒）")
+VISITS = metrics.counter("visits_total", "访问次数（按节点和结果）", ["node", "status"])
+VISIT_SECONDS = metrics.histogram("visit_duration_seconds", "单次访问耗时（秒）", ["status"])
 
 # User-Agent 列表
 USER_AGENTS = [
@@ -155,7 +56,10 @@ def get_log_file_path():
     logs_dir = os.path.join(script_dir, "logs")
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
-    return os.path.join(logs_dir, CONFIG["CSV_FILE"])
+    filename = CONFIG["CSV_FILE"]
+    if CONFIG["LOG_FORMAT"] == "jsonl":
+        filename = os.path.splitext(filename)[0] + ".jsonl"
+    return os.path.join(logs_dir, filename)
 
 def now_iso():
     """返回当前时间（UTC）"""
@@ -206,8 +110,27 @@ def get_random_device():
     screen = random.choice(SCREEN_SIZES)
     return ua, screen
 
-def create_driver(user_agent, screen_size, use_proxy=False, headless=False):
-    """创建Chrome驱动"""
+def get_engine_for(url):
+    """按 CONFIG["URL_ENGINES"]（完整 URL 优先，其次域名）选择访问引擎"""
+    engines = CONFIG["URL_ENGINES"]
+    return engines.get(url) or engines.get(get_domain(url)) or CONFIG["DEFAULT_ENGINE"]
+
+def get_region_for(url):
+    """按 CONFIG["TARGET_REGIONS"]（完整 URL 优先，其次域名）返回优先的出口地区，未配置时为 None"""
+    regions = CONFIG["TARGET_REGIONS"]
+    return regions.get(url) or regions.get(get_domain(url))
+
+_chromedriver_path = None
+
+def get_chromedriver_path():
+    """解析 chromedriver 路径（ChromeDriverManager 可能联网检查版本，只在首次调用时执行）"""
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        _chromedriver_path = ChromeDriverManager().install()
+    return _chromedriver_path
+
+def create_driver(user_agent, screen_size, use_proxy=False, headless=False, proxy_address=None):
+    """创建Chrome驱动（proxy_address 为空时使用 CONFIG["MIHOMO_PROXY"]）"""
     options = webdriver.ChromeOptions()
     
     # 无头模式设置
@@ -228,19 +151,30 @@ def create_driver(user_agent, screen_size, use_proxy=False, headless=False):
     
     # Mihomo 代理设置
     if use_proxy:
-        proxy_address = CONFIG["MIHOMO_PROXY"]
+        proxy_address = proxy_address or CONFIG["MIHOMO_PROXY"]
         print(f"  🌐 代理: {proxy_address}")
         options.add_argument(f'--proxy-server={proxy_address}')
     else:
         print(f"  🌐 代理: 无")
     
+    # 省流量：DOMContentLoaded 后即返回，不等图片等子资源；图片直接由内容设置禁止
+    if CONFIG["LEAN_MODE"]:
+        options.page_load_strategy = "eager"
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    
+    # 流量统计：只开启 Network 域的性能日志
+    if CONFIG["MEASURE_BYTES"]:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    
     # 反检测设置
     options.add_argument('--disable-blink-features=AutomationControlled')
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
     
     # 创建driver
-    service = Service(ChromeDriverManager().install())
+    startup = time.perf_counter()
+    service = Service(get_chromedriver_path())
     driver = webdriver.Chrome(service=service, options=options)
     
     driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
@@ -251,49 +185,247 @@ def create_driver(user_agent, screen_size, use_proxy=False, headless=False):
         '''
     })
     
+    if CONFIG["LEAN_MODE"] and CONFIG["BLOCKED_URL_PATTERNS"]:
+        # 屏蔽规则对整个会话生效，复用实例时无需重新设置
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": CONFIG["BLOCKED_URL_PATTERNS"]})
+    
+    DRIVER_STARTUP_SECONDS.observe(time.perf_counter() - startup)
     return driver
 
+def get_transferred_bytes(driver):
+    """
+    读取并清空性能日志，返回其中已完成请求的传输字节数（含头部，按压缩后大小）
+    
+    visit_page 在访问前会先清空一次，因此访问结束后调用即得到本次访问的流量；未开启 MEASURE_BYTES 时返回 None。
+    """
+    if not CONFIG["MEASURE_BYTES"]:
+        return None
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return None
+    total = 0
+    for entry in entries:
+        message = entry.get("message", "")
+        # 绝大部分事件不是 loadingFinished，先做字符串判断，省去 json 解析
+        if '"Network.loadingFinished"' not in message:
+            continue
+        try:
+            params = json.loads(message)["message"]["params"]
+        except (ValueError, KeyError):
+            continue
+        total += int(params.get("encodedDataLength") or 0)
+    return total
+
+def wait_for(driver, condition_js, timeout, poll=0.1):
+    """轮询执行 JS 条件直到为真或超时，返回是否满足（代替固定 sleep）"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(lambda d: d.execute_script(condition_js))
+        return True
+    except TimeoutException:
+        return False
+
+# 滚动停止：两次轮询之间 scrollY 不再变化（兼容平滑滚动）
+_SCROLL_SETTLED_JS = """
+const y = window.scrollY;
+const settled = window.__lastScrollY === y;
+window.__lastScrollY = y;
+return settled;
+"""
+
+# 上一次访问的页面及其加载过的全部资源（含第三方 iframe、统计脚本）的 URL
+_VISITED_URLS_JS = """
+return [location.href].concat(performance.getEntriesByType('resource').map(e => e.name));
+"""
+
+def visited_origins(driver):
+    """上一次访问涉及的所有 http(s) 源（页面本身和第三方资源）"""
+    origins = set()
+    for url in driver.execute_script(_VISITED_URLS_JS) or []:
+        parsed = urlparse(url)
+        if parsed.scheme in ("http", "https") and parsed.netloc:
+            origins.add(f"{parsed.scheme}://{parsed.netloc}")
+    return origins
+
+def reset_driver(driver, user_agent, screen_size):
+    """
+    复用前清理浏览器状态：全部 Cookie、缓存、上一次访问涉及的每个源的存储，并通过 CDP 更换 UA 和窗口大小
+    
+    localStorage / IndexedDB / Service Worker 等按源存储，只清当前页面的源会留下第三方 iframe 写入的数据；
+    Cookie 与缓存则是全局清空。反检测脚本通过 Page.addScriptToEvaluateOnNewDocument 注入，对整个会话持续生效，无需重新注入。
+    """
+    for origin in visited_origins(driver):
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    driver.execute_cdp_cmd("Emulation.setUserAgentOverride", {"userAgent": user_agent})
+    driver.set_window_size(screen_size["width"], screen_size["height"])
+    driver.get("about:blank")
+
+class DriverPool:
+    """
+    Chrome 实例池：chromedriver 路径只解析一次，实例预热后反复使用
+    
+    acquire() 取出一个空闲实例并重置状态（Cookie/存储/UA/窗口），release() 归还；
+    实例使用满 max_uses 次或访问中崩溃时回收，下次按需重建。
+    """
+    def __init__(self, size=None, max_uses=None, use_proxy=False, headless=True, proxy_address=None):
+        self.size = size if size is not None else CONFIG["DRIVER_POOL_SIZE"]
+        self.max_uses = max_uses if max_uses is not None else CONFIG["DRIVER_MAX_USES"]
+        self.use_proxy = use_proxy
+        self.headless = headless
+        self.proxy_address = proxy_address
+        self._idle = []  # [(driver, 已使用次数)]
+        self._uses = {}  # id(driver) -> 已使用次数
+        self._lock = threading.Lock()
+    
+    def _create(self, user_agent, screen_size):
+        return create_driver(user_agent, screen_size, self.use_proxy, self.headless, self.proxy_address)
+    
+    def warm_up(self):
+        """预先启动 size 个实例"""
+        while len(self._idle) < self.size:
+            ua, screen = get_random_device()
+            driver = self._create(ua, screen)
+            with self._lock:
+                self._idle.append((driver, 0))
+    
+    def acquire(self, user_agent, screen_size):
+        """取出一个已重置为指定 UA/窗口大小的实例，没有空闲实例时新建"""
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                driver = self._create(user_agent, screen_size)
+                self._uses[id(driver)] = 0
+                return driver
+            driver, uses = item
+            try:
+                reset_driver(driver, user_agent, screen_size)
+            except Exception:
+                # 实例已崩溃或失去响应，丢弃后继续取下一个
+                self._quit(driver)
+                continue
+            self._uses[id(driver)] = uses
+            return driver
+    
+    def release(self, driver, broken=False):
+        """归还实例；broken=True 或使用次数达到上限时直接回收"""
+        if driver is None:
+            return
+        uses = self._uses.pop(id(driver), 0) + 1
+        if broken or uses >= self.max_uses:
+            self._quit(driver)
+            return
+        with self._lock:
+            self._idle.append((driver, uses))
+    
+    @property
+    def idle_count(self):
+        return len(self._idle)
+    
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    
+    def close(self):
+        """关闭所有空闲实例"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            self._quit(driver)
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def get_log_writer():
+    """进程内唯一的访问日志写入器（首次调用时创建，退出时自动写完并关闭）"""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = VisitLogWriter(
+                get_log_file_path(),
+                fmt=CONFIG["LOG_FORMAT"],
+                flush_every=CONFIG["LOG_FLUSH_EVERY"],
+                flush_interval=CONFIG["LOG_FLUSH_INTERVAL"],
+                rotate_mb=CONFIG["LOG_ROTATE_MB"],
+                rotate_daily=CONFIG["LOG_ROTATE_DAILY"],
+            )
+            atexit.register(close_log_writer)
+        return _log_writer
+
+def close_log_writer():
+    """写完队列中的日志并关闭文件"""
+    global _log_writer
+    with _log_writer_lock:
+        writer, _log_writer = _log_writer, None
+    if writer is not None:
+        writer.close()
+
 def write_csv_header(csvfile):
-    """写入CSV头"""
-    with open(csvfile, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if f.tell() == 0:
-            writer.writerow([
-                "timestamp_utc", "visit_number", "url", "proxy_node",
-                "exit_ip", "user_agent", "screen_width", "screen_height",
-                "status", "note"
-            ])
+    """准备日志写入器（表头由写入器在新文件中自动写入）"""
+    get_log_writer()
 
-def log_visit(visit_num, url, proxy_node, exit_ip, user_agent, screen_size, status, note=""):
-    """记录访问日志"""
-    log_file = get_log_file_path()
-    with open(log_file, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            now_iso(), visit_num, url, proxy_node or "DIRECT",
-            exit_ip or "N/A", user_agent, screen_size["width"], screen_size["height"],
-            status, note
-        ])
+def log_visit(visit_num, url, proxy_node, exit_ip, user_agent, screen_size, status, note="", duration_ms=None,
+              bytes_transferred=None):
+    """记录访问日志（放入写入队列，由后台线程批量写盘），同时计入访问指标"""
+    VISITS.inc(node=proxy_node or "DIRECT", status=status)
+    if duration_ms is not None:
+        VISIT_SECONDS.observe(duration_ms / 1000.0, status=status)
+    get_log_writer().write({
+        "timestamp_utc": now_iso(),
+        "visit_number": visit_num,
+        "url": url,
+        "proxy_node": proxy_node or "DIRECT",
+        "exit_ip": exit_ip or "N/A",
+        "user_agent": user_agent,
+        "screen_width": screen_size["width"],
+        "screen_height": screen_size["height"],
+        "status": status,
+        "note": note,
+        "duration_ms": None if duration_ms is None else round(duration_ms, 1),
+        "bytes": bytes_transferred,
+    })
 
-def visit_page(driver, url):
-    """访问页面"""
+def visit_page(driver, url, trace=NULL_TRACE):
+    """访问页面（访问后可调用 get_transferred_bytes(driver) 获取本次流量；传入 VisitTrace 时记录各阶段耗时）"""
+    lean = CONFIG["LEAN_MODE"]
     try:
-        driver.get(url)
-        time.sleep(CONFIG["WAIT_AFTER_LOAD"])
+        with trace.span("page_reset"):
+            get_transferred_bytes(driver)  # 清空之前积累的性能日志
+        with trace.span("page_load"):
+            driver.get(url)
+        with trace.span("page_wait"):
+            if lean:
+                # eager 加载在 DOMContentLoaded 时返回，最多再等 WAIT_AFTER_LOAD 秒让页面完成
+                wait_for(driver, "return document.readyState === 'complete'", CONFIG["WAIT_AFTER_LOAD"])
+            else:
+                time.sleep(CONFIG["WAIT_AFTER_LOAD"])
         
         # 获取页面标题
         page_title = driver.title[:50] if driver.title else "无标题"
         
         # 随机滚动
-        scroll_times = random.randint(1, 3)
-        for _ in range(scroll_times):
-            scroll_amount = random.randint(300, 800)
-            driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
-            time.sleep(random.uniform(0.5, 1.5))
+        with trace.span("scroll"):
+            scroll_times = random.randint(1, 3)
+            for _ in range(scroll_times):
+                scroll_amount = random.randint(300, 800)
+                driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
+                if lean:
+                    wait_for(driver, _SCROLL_SETTLED_JS, 1.5)
+                else:
+                    time.sleep(random.uniform(0.5, 1.5))
         
-        if random.random() < 0.3:
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(random.uniform(0.5, 1.0))
+            if random.random() < 0.3:
+                driver.execute_script("window.scrollTo(0, 0);")
+                if lean:
+                    wait_for(driver, _SCROLL_SETTLED_JS, 1.0)
+                else:
+                    time.sleep(random.uniform(0.5, 1.0))
         
         return "SUCCESS", page_title
     except Exception as e:
@@ -305,37 +437,94 @@ def main():
     max_visits = CONFIG["MAX_VISITS"]
     use_proxy = CONFIG["USE_PROXY"]
     log_file = get_log_file_path()
+    metrics.start_exporter()
+    
+    if CONFIG["TARGETS"]:
+        # 多个目标各自按泊松到达，由事件调度器分派给 worker（每个目标按自己的引擎和出口地区访问）
+        from target_scheduler import main as run_targets
+        run_targets()
+        return
+    
+    if get_engine_for(url) == "http":
+        # 纯 HTML 目标走轻量 http 引擎，不启动浏览器
+        import asyncio
+        from http_visit_engine import run_http_visits
+        asyncio.run(run_http_visits(url, max_visits))
+        return
+    
+    if CONFIG["PIPELINED_VISITS"]:
+        # 有每节点独立端口时，下一次访问的准备与当前访问重叠进行；没有时继续串行访问
+        from visit_prefetch import main as run_pipelined
+        if run_pipelined():
+            return
     
     # 初始化 Mihomo 代理池
     proxy_pool = None
+    monitor = None
     if use_proxy:
         proxy_pool = MihomoProxyPool()
         if len(proxy_pool) == 0:
             print("⚠️  代理池为空，将不使用代理")
             use_proxy = False
+        else:
+            if CONFIG["WATCH_RESULTS"]:
+                proxy_pool.start_watching()
+            if CONFIG["PASSIVE_MONITOR"]:
+                monitor = TrafficMonitor(proxy_pool)
+                monitor.start()
+    
+    # 令牌桶调度：每次选一个节点桶和域名桶都有令牌的节点，不再全局 sleep
+    scheduler = None
+    domain = get_domain(url)
+    region = get_region_for(url)
+    if use_proxy and CONFIG["RATE_LIMIT_ENABLED"]:
+        limiter = RateLimiter.per_minute(
+            CONFIG["NODE_RATE_PER_MIN"], CONFIG["NODE_BURST"],
+            CONFIG["DOMAIN_RATE_PER_MIN"], CONFIG["DOMAIN_BURST"],
+            CONFIG["DOMAIN_RATES_PER_MIN"],
+        )
+        scheduler = VisitScheduler(proxy_pool, limiter)
     
     print(f"🚀 开始访问任务")
     print(f"📍 目标 URL: {url}")
     print(f"🔢 最大访问次数: {max_visits if max_visits > 0 else '无限'}")
-    print(f"⏱️  间隔模式: {CONFIG['INTERVAL_MODE']} (均值: {CONFIG['INTERVAL_MEAN']}秒)")
-    if CONFIG['INTERVAL_MODE'] == 'fixed':
-        print(f"   → 固定间隔，每次等待 {CONFIG['INTERVAL_MEAN']} 秒")
+    if scheduler:
+        print(f"⏱️  令牌桶限速: 每节点 {CONFIG['NODE_RATE_PER_MIN']} 次/分钟，每域名 {limiter.domain_rates.get(domain, limiter.domain_rate) * 60:g} 次/分钟")
     else:
-        print(f"   → 泊松分布（指数间隔），平均 {CONFIG['INTERVAL_MEAN']} 秒，更自然")
+        print(f"⏱️  间隔模式: {CONFIG['INTERVAL_MODE']} (均值: {CONFIG['INTERVAL_MEAN']}秒)")
+        if CONFIG['INTERVAL_MODE'] == 'fixed':
+            print(f"   → 固定间隔，每次等待 {CONFIG['INTERVAL_MEAN']} 秒")
+        else:
+            print(f"   → 泊松分布（指数间隔），平均 {CONFIG['INTERVAL_MEAN']} 秒，更自然")
     print(f"👻 无头模式: {'开启（后台运行）' if CONFIG['HEADLESS'] else '关闭（显示窗口）'}")
     print(f"🌐 使用代理: {'是' if use_proxy else '否'}")
     if use_proxy:
         print(f"📊 代理池大小: {len(proxy_pool)}")
+        if region:
+            print(f"🗺️  优先出口地区: {region}（{proxy_pool.get_regions().get(normalize_region(region), 0)} 个节点）")
         print(f"🔗 Mihomo API: {CONFIG['MIHOMO_API']}")
         print(f"🔌 Mihomo 代理: {CONFIG['MIHOMO_PROXY']}")
         print(f"🔄 切换代理组: {CONFIG['SWITCH_GROUP']}")
     print(f"💾 日志文件: {log_file}")
+    trace_writer = TraceWriter(trace_path_for(log_file)) if CONFIG["TRACE_VISITS"] else None
+    if trace_writer:
+        print(f"⏱️  分段计时: {trace_writer.path}")
+    profiler = None
+    if CONFIG["PROFILE_MODE"]:
+        profiler = VisitProfiler(CONFIG["PROFILE_MODE"], CONFIG["PROFILE_VISITS"], os.path.dirname(log_file),
+                                 CONFIG["PROFILE_SAMPLE_INTERVAL"])
+        print(f"🔬 剖析: {CONFIG['PROFILE_MODE']}（前 {CONFIG['PROFILE_VISITS']} 次访问）")
     print("-" * 60)
     
     write_csv_header(log_file)
     
     visit_count = 0
     driver = None
+    driver_pool = None
+    if CONFIG["REUSE_DRIVER"]:
+        driver_pool = DriverPool(use_proxy=use_proxy, headless=CONFIG["HEADLESS"])
+        print(f"🧊 预热 {driver_pool.size} 个浏览器实例...")
+        driver_pool.warm_up()
     
     try:
         while True:
@@ -344,80 +533,182 @@ def main():
                 break
             
             visit_count += 1
+            trace = VisitTrace(visit_count) if trace_writer else NULL_TRACE
+            if profiler:
+                profiler.begin()
             user_agent, screen_size = get_random_device()
             
             # 切换代理节点
             proxy_node = None
             exit_ip = None
+            skip_visit = False
+            no_node = False
+            print(f"\n[访问 #{visit_count}]")
             if use_proxy and proxy_pool:
-                node = proxy_pool.get_random_node()
-                if node:
+                # 切换或验证失败立即回报并换下一个节点，不在坏节点上启动浏览器
+                for _ in range(max(1, CONFIG["NODE_RETRY"])):
+                    with trace.span("select"):
+                        if scheduler:
+                            # 等到有节点和目标域名同时拿到令牌；没有任何候选节点时不再等待
+                            node, _, wait = scheduler.next_dispatch([domain], region)
+                            while node is None and wait != float("inf"):
+                                time.sleep(wait)
+                                node, _, wait = scheduler.next_dispatch([domain], region)
+                        else:
+                            # 优先选靠近目标的出口，该地区没有可用节点时放宽到全部节点
+                            node = proxy_pool.get_node_for_target(url, region=region) if region else None
+                            if node is None:
+                                node = proxy_pool.get_node_for_target(url)
+                    if not node:
+                        print(f"  ⚠️  没有可用节点（{len(proxy_pool.get_quarantined_nodes())} 个熔断隔离中）")
+                        no_node = True
+                        break
                     node_name = node.get("name")
                     latency = node.get("latency_ms", node.get("latency", "N/A"))
-                    
-                    print(f"\n[访问 #{visit_count}]")
                     print(f"  🔄 切换节点: {node_name} (延迟: {latency}ms)")
                     
-                    success, msg = proxy_pool.switch_node(node_name)
-                    if success:
-                        print(f"  ✅ 节点切换成功")
-                        proxy_node = node_name
-                        
-                        # 验证 IP 地址
-                        print(f"  🔍 查询出口 IP...")
-                        exit_ip = proxy_pool.get_current_ip()
-                        if exit_ip:
-                            print(f"  🌍 当前 IP: {exit_ip}")
-                        else:
-                            print(f"  ⚠️  无法获取 IP")
-                    else:
+                    with trace.span("switch"):
+                        success, msg = proxy_pool.switch_node(node_name)
+                    if not success:
                         print(f"  ❌ 节点切换失败: {msg}")
-            else:
-                print(f"\n[访问 #{visit_count}]")
+                        proxy_pool.report_failure(node_name, msg)
+                        continue
+                    print(f"  ✅ 节点切换成功")
+                    
+                    # 验证 IP 地址
+                    print(f"  🔍 查询出口 IP...")
+                    with trace.span("exit_ip"):
+                        exit_ip = proxy_pool.get_current_ip()
+                    if not exit_ip:
+                        print(f"  ⚠️  无法获取 IP，换下一个节点")
+                        proxy_pool.report_failure(node_name, "exit ip lookup failed")
+                        continue
+                    # 成功只在页面访问后回报一次；IP 查询耗时不计入节点延迟（延迟沿用测速结果）
+                    print(f"  🌍 当前 IP: {exit_ip}" + ("（缓存）" if proxy_pool.last_ip_from_cache else ""))
+                    proxy_node = node_name
+                    break
+                
+                if not proxy_node:
+                    print(f"  ⏭️  本轮未找到可用节点，跳过访问")
+                    skip_visit = True
+                    if not no_node:
+                        log_visit(visit_count, url, None, None, user_agent, screen_size, "SKIPPED", "no healthy node")
             
-            # 关闭旧driver
+            # 关闭旧driver（复用模式下由 driver_pool 管理）
             if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+                with trace.span("driver_quit"):
+                    try:
+                        driver.quit()
+                    except:
+                        pass
+                driver = None
             
-            print(f"  🖥️  设备: {screen_size['width']}x{screen_size['height']}")
+            if no_node:
+                # 所有节点都不可选：等到最早的熔断冷却结束（至少 INTERVAL_MEAN）再试，这一轮不计入访问次数。
+                # 限速模式下没有间隔等待，不退避会空转或瞬间耗尽 MAX_VISITS
+                recovery = proxy_pool.seconds_until_recovery()
+                backoff = max(recovery or 0.0, CONFIG["INTERVAL_MEAN"])
+                print(f"  ⏳ {backoff:.0f} 秒后重试（不计入访问次数）")
+                if profiler:
+                    profiler.cancel()
+                visit_count -= 1
+                time.sleep(backoff)
+                continue
             
-            try:
-                driver = create_driver(user_agent, screen_size, use_proxy, CONFIG["HEADLESS"])
-                status, note = visit_page(driver, url)
-                
-                if status == "SUCCESS":
-                    print(f"  ✅ 访问成功 - 页面: {note}")
-                else:
-                    print(f"  ❌ 访问失败: {note}")
-                
-                log_visit(visit_count, url, proxy_node, exit_ip, user_agent, screen_size, status, note)
+            if not skip_visit:
+                print(f"  🖥️  设备: {screen_size['width']}x{screen_size['height']}")
                 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"  ❌ 发生异常: {error_msg}")
-                log_visit(visit_count, url, proxy_node, exit_ip, user_agent, screen_size, "EXCEPTION", error_msg)
+                broken = False
+                visit_start = time.perf_counter()
+                status = "EXCEPTION"
+                try:
+                    with trace.span("driver_start"):
+                        if driver_pool:
+                            driver = driver_pool.acquire(user_agent, screen_size)
+                        else:
+                            driver = create_driver(user_agent, screen_size, use_proxy, CONFIG["HEADLESS"])
+                    status, note = visit_page(driver, url, trace)
+                    with trace.span("bytes"):
+                        nbytes = get_transferred_bytes(driver)
+                    
+                    if status == "SUCCESS":
+                        print(f"  ✅ 访问成功 - 页面: {note}" + (f"（{nbytes / 1024:.0f} KB）" if nbytes else ""))
+                        if proxy_pool:
+                            proxy_pool.report_success(proxy_node, target=url)
+                    else:
+                        print(f"  ❌ 访问失败: {note}")
+                        if proxy_pool:
+                            proxy_pool.report_failure(proxy_node, note, target=url)
+                    
+                    log_visit(visit_count, url, proxy_node, exit_ip, user_agent, screen_size, status, note,
+                              (time.perf_counter() - visit_start) * 1000, nbytes)
+                    
+                except Exception as e:
+                    broken = True
+                    error_msg = str(e)
+                    print(f"  ❌ 发生异常: {error_msg}")
+                    if proxy_pool:
+                        proxy_pool.report_failure(proxy_node, error_msg, target=url)
+                    log_visit(visit_count, url, proxy_node, exit_ip, user_agent, screen_size, "EXCEPTION", error_msg,
+                              (time.perf_counter() - visit_start) * 1000)
+                finally:
+                    if driver_pool:
+                        with trace.span("driver_release"):
+                            driver_pool.release(driver, broken)
+                        driver = None
             
-            if max_visits == 0 or visit_count < max_visits:
+            if profiler:
+                profiler.end()
+            if not scheduler and (max_visits == 0 or visit_count < max_visits):
                 interval = get_interval(CONFIG["INTERVAL_MODE"], CONFIG["INTERVAL_MEAN"])
                 mode_desc = "固定" if CONFIG["INTERVAL_MODE"] == "fixed" else "泊松分布"
                 print(f"  ⏳ 等待 {interval:.1f} 秒（{mode_desc}）...")
-                time.sleep(interval)
+                with trace.span("interval"):
+                    time.sleep(interval)
+            if trace_writer:
+                trace.node = proxy_node
+                trace.status = "SKIPPED" if skip_visit else status
+                trace_writer.write(trace)
     
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断")
     
     finally:
+        if profiler:
+            profiler.finish()
+        if trace_writer:
+            trace_writer.close()
+            print_summary(summarize(trace_writer.records))
         if driver:
             try:
                 driver.quit()
                 print("🔒 已关闭浏览器")
             except:
                 pass
+        if driver_pool:
+            driver_pool.close()
+            print("🔒 已关闭浏览器")
         
         print(f"\n📊 总访问次数: {visit_count}")
+        if proxy_pool:
+            quarantined = proxy_pool.get_quarantined_nodes()
+            if quarantined:
+                print(f"🚫 熔断隔离中的节点: {len(quarantined)} 个")
+            stats = proxy_pool.get_switch_stats()
+            if stats["count"]:
+                print(f"⚡ 切换耗时(ms): p50={stats['p50']} p90={stats['p90']} p99={stats['p99']} max={stats['max']}")
+            if proxy_pool.bandit is not None:
+                ranking = proxy_pool.bandit.ranking(target_key(url))
+                if ranking:
+                    print(f"🎯 {target_key(url)} 上成功率最高的出口:")
+                    for name, mean, count in ranking:
+                        print(f"   {mean * 100:5.1f}%  {name}（{count:.0f} 次）")
+            if monitor:
+                monitor.stop()
+                monitor.print_summary()
+            proxy_pool.stop_watching()
+            proxy_pool.close()
+        close_log_writer()
         print(f"💾 日志: {log_file}")
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""离线给可用节点打上出口地区 / ASN 标签，写回 proxy_test_results.json。
+
+流程：
+1. 取每个可用节点的出口 IP：有每节点独立端口（listeners）时经该端口访问 IP_ECHO_URL，
+   得到真实出口；否则（或查询失败时）解析 clash_profile.yaml 中节点的 server 地址作为近似；
+2. 用本地数据库查询 IP 的国家/地区代码和 ASN，不调用任何在线接口：
+   - MMDB：MaxMind GeoLite2-Country / GeoLite2-City 和 GeoLite2-ASN（需 pip install maxminddb）；
+   - CSV：IP 段表，表头需含 start_ip,end_ip（或 network）以及 country / country_code，
+     可选 asn、as_name（如 ipinfo 的 country_asn.csv）；
+3. 数据库查不到时，按节点名中的地区关键字（香港/HK/🇭🇰 …）推断国家；
+4. 每个节点写入 exit_ip / country / asn / as_name / ip_source / region_source，
+   代理池加载后按国家和 ASN 建立索引，get_random_node(region="JP") 直接查索引。
+
+数据库默认放在 proxies/geo/ 下（GeoLite2-Country.mmdb、GeoLite2-ASN.mmdb、ip_ranges.csv），存在即使用。
+
+用法：
+    python tag_regions.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import csv
+import ipaddress
+import json
+import os
+import re
+import socket
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import yaml
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from proxy_pool import CONFIG, parse_ip_echo
+
+
+def _geo_path(name: str) -> str:
+    return os.path.join(get_workspace_paths()["proxies"], "geo", name)
+
+
+@dataclass
+class TagConfig:
+    results_file: str = field(default_factory=lambda: os.path.join(get_workspace_paths()["proxies"], "proxy_test_results.json"))
+    mmdb_country: str = field(default_factory=lambda: _geo_path("GeoLite2-Country.mmdb"))
+    mmdb_asn: str = field(default_factory=lambda: _geo_path("GeoLite2-ASN.mmdb"))
+    csv_path: str = field(default_factory=lambda: _geo_path("ip_ranges.csv"))
+    lookup_exit_ip: bool = True            # 经每节点独立端口查询真实出口 IP
+    concurrency: int = 20
+    timeout: float = 10.0
+
+
+# 节点名中的地区提示（按顺序匹配，先匹配到的生效）
+NAME_HINTS: List[Tuple[str, str]] = [
+    ("HK", r"香港|港|🇭🇰|\bHK\b|Hong ?Kong"),
+    ("TW", r"台湾|台灣|🇹🇼|\bTW\b|Taiwan"),
+    ("JP", r"日本|东京|大阪|🇯🇵|\bJP\b|Japan|Tokyo|Osaka"),
+    ("SG", r"新加坡|狮城|🇸🇬|\bSG\b|Singapore"),
+    ("KR", r"韩国|首尔|🇰🇷|\bKR\b|Korea|Seoul"),
+    ("US", r"美国|洛杉矶|圣何塞|🇺🇸|\bUS\b|\bUSA\b|United States|Los Angeles"),
+    ("GB", r"英国|伦敦|🇬🇧|\bUK\b|\bGB\b|London"),
+    ("DE", r"德国|法兰克福|🇩🇪|\bDE\b|Germany|Frankfurt"),
+    ("CN", r"中国|回国|🇨🇳|\bCN\b|China"),
+]
+_NAME_HINTS = [(code, re.compile(pattern, re.IGNORECASE)) for code, pattern in NAME_HINTS]
+
+
+def guess_country_from_name(name: str) -> Optional[str]:
+    for code, pattern in _NAME_HINTS:
+        if pattern.search(name):
+            return code
+    return None
+
+
+class CsvIpDatabase:
+    """IP 段 CSV：按起始地址排序后二分查找（IPv4 与 IPv6 分开存放）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # version -> (starts, ends, records)
+        self._tables: Dict[int, Tuple[List[int], List[int], List[dict]]] = {4: ([], [], []), 6: ([], [], [])}
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                span = self._parse_span(row)
+                if span is None:
+                    continue
+                version, start, end = span
+                asn = (row.get("asn") or "").strip().upper()
+                record = {
+                    "country": (row.get("country") or row.get("country_code") or "").strip().upper() or None,
+                    "asn": (asn if asn.startswith("AS") else f"AS{asn}") if asn else None,
+                    "as_name": (row.get("as_name") or row.get("as_org") or "").strip() or None,
+                }
+                rows.append((version, start, end, record))
+        rows.sort(key=lambda r: (r[0], r[1]))
+        for version, start, end, record in rows:
+            starts, ends, records = self._tables[version]
+            starts.append(start)
+            ends.append(end)
+            records.append(record)
+
+    @staticmethod
+    def _parse_span(row: dict) -> Optional[Tuple[int, int, int]]:
+        try:
+            if row.get("network"):
+                net = ipaddress.ip_network(row["network"].strip(), strict=False)
+                return net.version, int(net.network_address), int(net.broadcast_address)
+            start = ipaddress.ip_address(row["start_ip"].strip())
+            end = ipaddress.ip_address(row["end_ip"].strip())
+            return start.version, int(start), int(end)
+        except (KeyError, ValueError, AttributeError):
+            return None
+
+    def __len__(self) -> int:
+        return sum(len(t[0]) for t in self._tables.values())
+
+    def lookup(self, ip: str) -> Optional[dict]:
+        addr = ipaddress.ip_address(ip)
+        starts, ends, records = self._tables[addr.version]
+        value = int(addr)
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return records[i]
+        return None
+
+
+class MmdbIpDatabase:
+    """MaxMind MMDB（国家/城市库 + ASN 库，任一可缺省）。"""
+
+    def __init__(self, country_path: Optional[str], asn_path: Optional[str]):
+        import maxminddb  # 可选依赖：pip install maxminddb
+
+        self.country = maxminddb.open_database(country_path) if country_path else None
+        self.asn = maxminddb.open_database(asn_path) if asn_path else None
+
+    def lookup(self, ip: str) -> Optional[dict]:
+        record = {"country": None, "asn": None, "as_name": None}
+        if self.country is not None:
+            data = self.country.get(ip) or {}
+            country = data.get("country") or data.get("registered_country") or {}
+            record["country"] = country.get("iso_code")
+        if self.asn is not None:
+            data = self.asn.get(ip) or {}
+            if data.get("autonomous_system_number"):
+                record["asn"] = f"AS{data['autonomous_system_number']}"
+                record["as_name"] = data.get("autonomous_system_organization")
+        return record if record["country"] or record["asn"] else None
+
+    def close(self) -> None:
+        for db in (self.country, self.asn):
+            if db is not None:
+                db.close()
+
+
+def open_databases(cfg: TagConfig) -> List[Tuple[str, object]]:
+    """按 MMDB → CSV 的顺序返回可用的 (来源名, 数据库)。"""
+    databases: List[Tuple[str, object]] = []
+    country = cfg.mmdb_country if cfg.mmdb_country and os.path.exists(cfg.mmdb_country) else None
+    asn = cfg.mmdb_asn if cfg.mmdb_asn and os.path.exists(cfg.mmdb_asn) else None
+    if country or asn:
+        try:
+            databases.append(("mmdb", MmdbIpDatabase(country, asn)))
+        except ImportError:
+            print("⚠️  找到 MMDB 文件但未安装 maxminddb，跳过（pip install maxminddb）")
+    if cfg.csv_path and os.path.exists(cfg.csv_path):
+        db = CsvIpDatabase(cfg.csv_path)
+        print(f"📚 CSV IP 库: {cfg.csv_path}（{len(db)} 个 IP 段）")
+        databases.append(("csv", db))
+    return databases
+
+
+async def fetch_exit_ips(node_ports: Dict[str, int], names: List[str], cfg: TagConfig) -> Dict[str, str]:
+    """经每节点独立端口并发查询出口 IP。"""
+    result: Dict[str, str] = {}
+    sem = asyncio.Semaphore(cfg.concurrency)
+    timeout = aiohttp.ClientTimeout(total=cfg.timeout)
+
+    async with aiohttp.ClientSession(timeout=timeout, trust_env=False) as session:
+
+        async def one(name: str) -> None:
+            async with sem:
+                try:
+                    async with session.get(CONFIG["IP_ECHO_URL"], proxy=f"http://127.0.0.1:{node_ports[name]}") as resp:
+                        if resp.status == 200:
+                            ip = parse_ip_echo(await resp.text())
+                            if ip:
+                                result[name] = ip
+                except Exception:
+                    pass
+
+        await asyncio.gather(*(one(n) for n in names if n in node_ports))
+    return result
+
+
+def load_server_addresses(profile_path: str) -> Dict[str, str]:
+    """clash_profile.yaml 中 节点名 -> server（域名或 IP）。"""
+    if not os.path.exists(profile_path):
+        return {}
+    with open(profile_path, "r", encoding="utf-8") as f:
+        profile = yaml.safe_load(f) or {}
+    return {p["name"]: str(p["server"]) for p in profile.get("proxies") or [] if p.get("name") and p.get("server")}
+
+
+def resolve_host(host: str) -> Optional[str]:
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        pass
+    try:
+        return socket.getaddrinfo(host, None)[0][4][0]
+    except (socket.gaierror, IndexError, UnicodeError):
+        return None
+
+
+def tag_nodes(nodes: List[dict], exit_ips: Dict[str, str], servers: Dict[str, str], databases) -> Dict[str, int]:
+    """原地给节点写入地区字段，返回各来源的计数。"""
+    counts = {"exit": 0, "server": 0, "mmdb": 0, "csv": 0, "name": 0, "unknown": 0}
+    for node in nodes:
+        name = node.get("name") or ""
+        ip, ip_source = exit_ips.get(name), "exit"
+        if not ip and name in servers:
+            ip, ip_source = resolve_host(servers[name]), "server"
+        if not ip and node.get("exit_ip"):
+            # 本次查不到时沿用上次写入的 IP（重复运行不丢失已有标签）
+            ip, ip_source = node["exit_ip"], node.get("ip_source") or "exit"
+        record, region_source = None, None
+        if ip:
+            node["exit_ip"] = ip
+            node["ip_source"] = ip_source
+            counts[ip_source] += 1
+            for source, db in databases:
+                try:
+                    record = db.lookup(ip)
+                except ValueError:
+                    record = None
+                if record:
+                    region_source = source
+                    break
+        if record is None:
+            country = guess_country_from_name(name)
+            if country:
+                record, region_source = {"country": country, "asn": None, "as_name": None}, "name"
+        if record is None:
+            counts["unknown"] += 1
+            continue
+        for key in ("country", "asn", "as_name"):
+            if record.get(key):
+                node[key] = record[key]
+            else:
+                node.pop(key, None)
+        node["region_source"] = region_source
+        counts[region_source] += 1
+    return counts
+
+
+def save_results(path: str, results: dict) -> None:
+    # 与 check_proxies.py 相同：先写临时文件再原子替换，运行中的代理池热加载不会读到半个文件
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(cfg: Optional[TagConfig] = None) -> None:
+    cfg = cfg or TagConfig()
+    if not os.path.exists(cfg.results_file):
+        print(f"❌ 未找到 {cfg.results_file}，请先运行 check_proxies.py。")
+        return
+    with open(cfg.results_file, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if "ok" not in results:
+        # 旧格式 {"available": [...]} 改写为 ok 键：下面会加上 meta，parse_test_results 见到 meta 只读 ok
+        results["ok"] = results.pop("available", None) or []
+        results.setdefault("failed", [])
+    nodes = results["ok"] = results.get("ok") or []
+    names = [n.get("name") for n in nodes]
+
+    profile_path = get_workspace_paths()["output"]
+    exit_ips: Dict[str, str] = {}
+    if cfg.lookup_exit_ip:
+        node_ports = load_node_ports(profile_path)
+        if node_ports:
+            print(f"🔍 经独立端口查询 {len(names)} 个节点的出口 IP...")
+            exit_ips = asyncio.run(fetch_exit_ips(node_ports, names, cfg))
+        else:
+            print("ℹ️  没有每节点独立端口（listeners），使用节点 server 地址近似")
+    servers = load_server_addresses(profile_path)
+
+    databases = open_databases(cfg)
+    if not databases:
+        print(f"⚠️  未找到本地 IP 库（{os.path.dirname(cfg.csv_path)}），只能按节点名推断地区")
+    try:
+        counts = tag_nodes(nodes, exit_ips, servers, databases)
+    finally:
+        for _, db in databases:
+            if hasattr(db, "close"):
+                db.close()
+
+    results.setdefault("meta", {})["regions_tagged_by"] = "tag_regions.py"
+    save_results(cfg.results_file, results)
+
+    regions: Dict[str, int] = {}
+    for node in nodes:
+        if node.get("country"):
+            regions[node["country"]] = regions.get(node["country"], 0) + 1
+    print(f"💾 已写入: {cfg.results_file}")
+    print(f"   IP 来源: 出口 {counts['exit']} ，server {counts['server']}")
+    print(f"   地区来源: MMDB {counts['mmdb']} ，CSV {counts['csv']} ，节点名 {counts['name']} ，未知 {counts['unknown']}")
+    print("   " + "，".join(f"{k} {v}" for k, v in sorted(regions.items(), key=lambda kv: -kv[1])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""多目标事件驱动调度：每个目标独立的泊松到达，worker 池并发执行访问。
+
+selenium_with_proxy.main() 只服务一个 CONFIG["URL"]，两次访问之间 time.sleep(interval)
+整个进程空等。这里改为离散事件调度：
+
+- 每个目标（Target）有自己的间隔模式/均值（与 get_interval 语义一致：fixed 固定，
+  poisson 为指数间隔且最小 2 秒）和自己的访问上限；
+- 到达间隔按目标用 NumPy 一次批量预生成（ArrivalStream），不再每次单独抽样；
+- 所有目标的下一次到达时间放在一个最小堆里，调度线程只在最早的到达时刻醒来，
+  把到期的访问交给 worker 线程池；一个目标的等待时间用来服务其他目标；
+- worker 全忙时到期访问排队等待空闲 worker，下一次到达从实际分派时刻起算，避免积压后突发；
+- 每个目标和单目标主循环一样按 URL_ENGINES 选择引擎（browser / http）、按 TARGET_REGIONS 优先出口地区，
+  开启 RATE_LIMIT_ENABLED 时经令牌桶限速。
+
+用法：
+    在 CONFIG["TARGETS"] 中列出目标后运行 selenium_with_proxy.py，或直接 python target_scheduler.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from rate_limiter import RateLimiter, VisitScheduler, get_domain
+from selenium_with_proxy import (
+    CONFIG,
+    DriverPool,
+    MihomoProxyPool,
+    close_log_writer,
+    get_engine_for,
+    get_log_file_path,
+    get_random_device,
+    get_region_for,
+    get_transferred_bytes,
+    log_visit,
+    visit_page,
+    write_csv_header,
+)
+
+MIN_POISSON_INTERVAL = 2.0  # 与 get_interval 的泊松模式一致
+
+
+@dataclass
+class Target:
+    url: str
+    interval_mode: str = "poisson"    # fixed / poisson
+    interval_mean: float = 10.0       # 间隔均值（秒）
+    max_visits: int = 0               # 访问上限，0 表示无限
+
+
+class ArrivalStream:
+    """按目标批量预生成到达间隔，next() 逐个取出。"""
+
+    def __init__(self, mode: str, mean: float, batch: int = 256, rng: Optional[np.random.Generator] = None):
+        if mode not in ("fixed", "poisson"):
+            print(f"⚠️  未知间隔模式 '{mode}'，使用默认泊松分布")
+            mode = "poisson"
+        self.mode = mode
+        self.mean = float(mean)
+        self.batch = max(1, batch)
+        self.rng = rng or np.random.default_rng()
+        self._buf = np.empty(0)
+        self._pos = 0
+
+    def _refill(self) -> None:
+        if self.mode == "fixed":
+            self._buf = np.full(self.batch, self.mean)
+        else:
+            self._buf = np.maximum(self.rng.exponential(self.mean, self.batch), MIN_POISSON_INTERVAL)
+        self._pos = 0
+
+    def next(self) -> float:
+        if self._pos >= len(self._buf):
+            self._refill()
+        value = float(self._buf[self._pos])
+        self._pos += 1
+        return value
+
+
+class TargetScheduler:
+    """最小堆离散事件调度器：到期的 (目标) 访问分派给 workers 个并发 worker。"""
+
+    def __init__(self, targets: List[Target], workers: int = 4, batch: int = 256):
+        self.targets = list(targets)
+        self.workers = max(1, workers)
+        self.streams = [ArrivalStream(t.interval_mode, t.interval_mean, batch) for t in self.targets]
+        self.dispatched = [0] * len(self.targets)
+        self.lag_total = 0.0                  # 到期到实际分派的累计延迟（秒），反映 worker 是否够用
+        self._seq = 0
+
+    def _push(self, heap: list, due: float, index: int) -> None:
+        # seq 保证同一时刻的事件按入堆顺序出堆，且不会去比较后面的元素
+        self._seq += 1
+        heapq.heappush(heap, (due, self._seq, index))
+
+    def run(self, visit: Callable[[Target], None], stop: Optional[threading.Event] = None) -> Dict[str, int]:
+        """执行到所有目标达到上限（或 stop 被设置），返回 {url: 分派次数}。"""
+        stop = stop or threading.Event()
+        slots = threading.BoundedSemaphore(self.workers)
+        heap: list = []
+        start = time.monotonic()
+        for i, target in enumerate(self.targets):
+            # 与单目标主循环一致：启动后立即进行第一次访问
+            self._push(heap, start, i)
+
+        def run_one(target: Target) -> None:
+            try:
+                visit(target)
+            except Exception as e:
+                print(f"❌ 访问 {target.url} 时发生异常: {e}")
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="visit") as executor:
+            while heap and not stop.is_set():
+                due, _, index = heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                    continue
+                # 等待空闲 worker（期间仍响应 stop）
+                if not slots.acquire(timeout=0.5):
+                    continue
+                heapq.heappop(heap)
+                now = time.monotonic()
+                self.lag_total += now - due
+                target = self.targets[index]
+                self.dispatched[index] += 1
+                executor.submit(run_one, target)
+                if not target.max_visits or self.dispatched[index] < target.max_visits:
+                    self._push(heap, max(due, now) + self.streams[index].next(), index)
+        return {t.url: n for t, n in zip(self.targets, self.dispatched)}
+
+
+class TargetVisitor:
+    """worker 执行的单次访问：按目标挑节点 → 按目标的引擎访问 → 回报并记日志。
+
+    选节点与单目标主循环一致：优先 TARGET_REGIONS 中该目标的出口地区（没有可用节点时放宽到全部节点），
+    开启 RATE_LIMIT_ENABLED 时经令牌桶调度（dispatcher）取得节点和域名令牌后才访问。
+    有每节点独立端口（listeners）时各 worker 同时走不同出口；没有时退回全局切换，
+    切换与访问必须串行（调用方应只用 1 个 worker）。
+
+    引擎按 URL_ENGINES / DEFAULT_ENGINE 逐个目标选择：
+    - browser：Chrome 实例来自 DriverPool，代理地址在启动时固定，因此每个出口端口一个实例池。
+      REUSE_DRIVER 关闭时实例用一次即回收；开启时空闲实例总数不超过 max_idle，
+      超出时先关闭最久没用过的端口上的实例；
+    - http：所有 worker 共用一个 aiohttp 会话，运行在单独的事件循环线程中（首次用到时创建）。
+    """
+
+    def __init__(
+        self,
+        pool: Optional[MihomoProxyPool],
+        node_ports: Dict[str, int],
+        headless: bool = True,
+        reuse: Optional[bool] = None,
+        max_idle: int = 1,
+        dispatcher: Optional[VisitScheduler] = None,
+    ):
+        self.pool = pool
+        self.node_ports = node_ports
+        self.headless = headless
+        self.reuse = CONFIG["REUSE_DRIVER"] if reuse is None else reuse
+        self.max_idle = max(1, max_idle)
+        self.dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self._visit_num = 0
+        self._no_port_for = None
+        self._no_port = set()
+        self._driver_pools: "OrderedDict[Optional[str], DriverPool]" = OrderedDict()  # 代理地址 -> 实例池，最近用过的在末尾
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http_session = None
+
+    def _unroutable(self) -> set:
+        # 没有独立端口的节点无法单独走，按节点集合缓存（热加载换集合后重新计算）
+        node_set = self.pool.node_set
+        if node_set is not self._no_port_for:
+            self._no_port = {n.get("name") for n in node_set.available if n.get("name") not in self.node_ports}
+            self._no_port_for = node_set
+        return self._no_port
+
+    def _driver_pool(self, proxy: Optional[str]) -> DriverPool:
+        with self._lock:
+            driver_pool = self._driver_pools.get(proxy)
+            if driver_pool is None:
+                driver_pool = DriverPool(
+                    max_uses=None if self.reuse else 1,
+                    use_proxy=self.pool is not None,
+                    headless=self.headless,
+                    proxy_address=proxy,
+                )
+                self._driver_pools[proxy] = driver_pool
+            self._driver_pools.move_to_end(proxy)
+            return driver_pool
+
+    def _trim(self) -> None:
+        """空闲实例超过 max_idle 时关闭最久没用过的端口上的空闲实例"""
+        with self._lock:
+            idle = sum(p.idle_count for p in self._driver_pools.values())
+            stale = []
+            for driver_pool in self._driver_pools.values():
+                if idle <= self.max_idle:
+                    break
+                if driver_pool.idle_count:
+                    idle -= driver_pool.idle_count
+                    stale.append(driver_pool)
+        # 实例池本身保留：其他 worker 手上的实例用完后仍归还到这里，最后由 close() 统一关闭
+        for driver_pool in stale:
+            driver_pool.close()
+
+    def warm_up(self, targets: List[Target]) -> None:
+        """没有独立端口时所有浏览器访问共用同一个代理地址，可以预热实例池"""
+        if self.reuse and not self.node_ports and any(get_engine_for(t.url) != "http" for t in targets):
+            self._driver_pool(None).warm_up()
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._driver_pools = list(self._driver_pools.values()), OrderedDict()
+            loop, session = self._http_loop, self._http_session
+            self._http_loop = self._http_session = None
+        for driver_pool in pools:
+            driver_pool.close()
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _next_number(self) -> int:
+        with self._lock:
+            self._visit_num += 1
+            return self._visit_num
+
+    def _select(self, url: str, exclude: Optional[set] = None) -> Optional[dict]:
+        """按目标的出口地区与限速器选节点；没有任何候选节点时为 None"""
+        region = get_region_for(url)
+        if self.dispatcher is not None:
+            domain = get_domain(url)
+            node, _, wait = self.dispatcher.next_dispatch([domain], region, exclude)
+            while node is None and wait != float("inf"):
+                time.sleep(wait)
+                node, _, wait = self.dispatcher.next_dispatch([domain], region, exclude)
+            return node
+        node = self.pool.get_node_for_target(url, exclude, region) if region else None
+        if node is None:
+            node = self.pool.get_node_for_target(url, exclude)
+        return node
+
+    def _pick(self, url: str):
+        """为 url 选节点，返回 (节点名, 代理地址, 出口 IP)；没有可用节点时节点名为 None。
+        全局切换模式下代理地址为 None（浏览器默认走 MIHOMO_PROXY）。"""
+        if self.pool is None:
+            return None, None, None
+        if self.node_ports:
+            node = self._select(url, self._unroutable())
+            port = self.node_ports.get(node.get("name")) if node else None
+            if port is None:
+                return None, None, None
+            name = node.get("name")
+            return name, f"http://127.0.0.1:{port}", self.pool.get_cached_ip(name)
+        for _ in range(max(1, CONFIG["NODE_RETRY"])):
+            node = self._select(url)
+            if node is None:
+                break
+            name = node.get("name")
+            ok, msg = self.pool.switch_node(name)
+            if not ok:
+                self.pool.report_failure(name, msg)
+                continue
+            ip = self.pool.get_current_ip()
+            if not ip:
+                self.pool.report_failure(name, "exit ip lookup failed")
+                continue
+            return name, None, ip
+        return None, None, None
+
+    def _visit_browser(self, url: str, user_agent: str, screen_size: dict, proxy: Optional[str]):
+        driver_pool = self._driver_pool(proxy)
+        driver, broken, nbytes = None, False, None
+        try:
+            driver = driver_pool.acquire(user_agent, screen_size)
+            status, note = visit_page(driver, url)
+            nbytes = get_transferred_bytes(driver)
+        except Exception as e:
+            broken = True
+            status, note = "EXCEPTION", str(e)
+        finally:
+            driver_pool.release(driver, broken)
+            self._trim()
+        return status, note, nbytes
+
+    def _visit_http(self, url: str, user_agent: str, proxy: Optional[str]):
+        import aiohttp
+        from http_visit_engine import http_visit
+
+        with self._lock:
+            if self._http_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="http-visits", daemon=True).start()
+
+                async def open_session():
+                    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=CONFIG["HTTP_TIMEOUT"]), trust_env=False)
+
+                self._http_session = asyncio.run_coroutine_threadsafe(open_session(), loop).result()
+                self._http_loop = loop
+            loop, session = self._http_loop, self._http_session
+        if proxy is None and self.pool is not None:
+            # 全局切换模式：经 MIHOMO_PROXY 走刚切换的节点（浏览器默认也是它），不能直连
+            proxy = CONFIG["MIHOMO_PROXY"]
+        return asyncio.run_coroutine_threadsafe(http_visit(session, url, user_agent, proxy), loop).result()
+
+    def __call__(self, target: Target) -> None:
+        num = self._next_number()
+        user_agent, screen_size = get_random_device()
+        node, proxy, exit_ip = self._pick(target.url)
+        if self.pool is not None and node is None:
+            print(f"[#{num}] ⏭️  {target.url}: 没有可用节点，跳过")
+            log_visit(num, target.url, None, None, user_agent, screen_size, "SKIPPED", "no healthy node")
+            return
+
+        start = time.perf_counter()
+        if get_engine_for(target.url) == "http":
+            status, note, nbytes = self._visit_http(target.url, user_agent, proxy)
+        else:
+            status, note, nbytes = self._visit_browser(target.url, user_agent, screen_size, proxy)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        if self.pool is not None:
+            if status == "SUCCESS":
+                self.pool.report_success(node, target=target.url)
+            else:
+                self.pool.report_failure(node, note, target=target.url)
+        print(f"[#{num}] {'✅' if status == 'SUCCESS' else '❌'} {target.url} via {node or 'DIRECT'}: {note}")
+        log_visit(num, target.url, node, exit_ip, user_agent, screen_size, status, note, duration_ms, nbytes)
+
+
+def load_targets() -> List[Target]:
+    """CONFIG["TARGETS"] 中的目标；为空时用单目标配置（URL / INTERVAL_* / MAX_VISITS）。"""
+    if not CONFIG["TARGETS"]:
+        return [Target(CONFIG["URL"], CONFIG["INTERVAL_MODE"], CONFIG["INTERVAL_MEAN"], CONFIG["MAX_VISITS"])]
+    return [
+        Target(
+            url=t["url"],
+            interval_mode=t.get("interval_mode", CONFIG["INTERVAL_MODE"]),
+            interval_mean=t.get("interval_mean", CONFIG["INTERVAL_MEAN"]),
+            max_visits=t.get("max_visits", CONFIG["MAX_VISITS"]),
+        )
+        for t in CONFIG["TARGETS"]
+    ]
+
+
+def main() -> None:
+    targets = load_targets()
+    workers = CONFIG["VISIT_WORKERS"]
+    log_file = get_log_file_path()
+    write_csv_header(log_file)
+
+    pool = None
+    node_ports: Dict[str, int] = {}
+    if CONFIG["USE_PROXY"]:
+        pool = MihomoProxyPool()
+        if len(pool) == 0:
+            print("⚠️  代理池为空，将不使用代理")
+            pool = None
+        else:
+            node_ports = load_node_ports(get_workspace_paths()["output"])
+            if CONFIG["WATCH_RESULTS"]:
+                pool.start_watching()
+    if pool is not None and not node_ports and workers > 1:
+        print("⚠️  没有每节点独立端口（listeners），全局切换只能串行访问，worker 数改为 1")
+        workers = 1
+
+    # 与单目标主循环一致：每个目标按自己的引擎、出口地区访问，开启限速时经令牌桶调度
+    dispatcher = None
+    if pool is not None and CONFIG["RATE_LIMIT_ENABLED"]:
+        limiter = RateLimiter.per_minute(
+            CONFIG["NODE_RATE_PER_MIN"], CONFIG["NODE_BURST"],
+            CONFIG["DOMAIN_RATE_PER_MIN"], CONFIG["DOMAIN_BURST"],
+            CONFIG["DOMAIN_RATES_PER_MIN"],
+        )
+        dispatcher = VisitScheduler(pool, limiter)
+
+    print(f"🚀 多目标调度: {len(targets)} 个目标，{workers} 个 worker")
+    for t in targets:
+        region = get_region_for(t.url)
+        print(f"   📍 {t.url}  {t.interval_mode} 均值 {t.interval_mean}s，上限 {t.max_visits or '无限'}，"
+              f"引擎 {get_engine_for(t.url)}" + (f"，出口地区 {region}" if region else ""))
+    if dispatcher:
+        print(f"⏱️  令牌桶限速: 每节点 {CONFIG['NODE_RATE_PER_MIN']} 次/分钟")
+    print(f"💾 日志文件: {log_file}")
+    print("-" * 60)
+
+    scheduler = TargetScheduler(targets, workers)
+    visitor = TargetVisitor(pool, node_ports, CONFIG["HEADLESS"], max_idle=workers, dispatcher=dispatcher)
+    visitor.warm_up(targets)
+    stop = threading.Event()
+    started = time.monotonic()
+    try:
+        counts = scheduler.run(visitor, stop)
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断，等待进行中的访问完成...")
+        stop.set()
+        counts = {t.url: n for t, n in zip(targets, scheduler.dispatched)}
+    finally:
+        visitor.close()
+        if pool is not None:
+            pool.stop_watching()
+            pool.close()
+        close_log_writer()
+
+    total = sum(counts.values())
+    elapsed = time.monotonic() - started
+    print(f"\n📊 共分派 {total} 次访问，用时 {elapsed:.1f} 秒")
+    for url, n in counts.items():
+        print(f"   {n:5d}  {url}")
+    if total:
+        print(f"⏱️  平均分派延迟: {scheduler.lag_total / total * 1000:.0f} ms")
+    print(f"💾 日志: {log_file}")
+
+
+if __name__ == "__main__":
+    main()
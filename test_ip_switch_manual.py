@@ -4,7 +4,7 @@
 """
 import requests
 import time
-from selenium_with_proxy import MihomoProxyPool, CONFIG
+from proxy_pool import MihomoProxyPool, CONFIG
 
 def test_ip_switch():
     """测试IP切换"""
@@ -52,6 +52,9 @@ def test_ip_switch():
     
     print("\n" + "-" * 60)
     print("✅ 测试完成！")
+    stats = pool.get_switch_stats()
+    if stats["count"]:
+        print(f"⚡ 切换耗时(ms): p50={stats['p50']} p90={stats['p90']} p99={stats['p99']} max={stats['max']}")
     print("\n💡 提示:")
     print("  - 如果每次IP都不同，说明切换成功")
     print("  - 如果IP相同，可能是节点共享同一个出口IP")
@@ -4,7 +4,7 @@
 """
 import requests
 import time
-from selenium_with_proxy import MihomoProxyPool, CONFIG
+from proxy_pool import MihomoProxyPool, CONFIG
 
 def check_and_fix_mihomo():
     """检查并修复 Mihomo 配置"""
@@ -61,7 +61,7 @@ def check_and_fix_mihomo():
             print(f"\n💡 建议使用的代理地址: http://127.0.0.1:{http_port}")
             if CONFIG["MIHOMO_PROXY"] != f"http://127.0.0.1:{http_port}":
                 print(f"⚠️  当前配置: {CONFIG['MIHOMO_PROXY']}")
-                print(f"   建议修改 selenium_with_proxy.py 中的 MIHOMO_PROXY")
+                print(f"   建议修改 proxy_pool/config.py 中的 MIHOMO_PROXY")
         
         # 4. 检查代理组配置
         print(f"\n🔄 代理组配置:")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+带宽测试用的本地替身：测速文件服务器 + 节点独立端口（HTTP 代理）
+
+PayloadServer 在 /payload 返回 size 字节；stall_after 不为 None 时发完这么多字节后停住不再发送，
+用来触发超时、走"按部分数据计算"的路径。ProxyStandIn 是只转发明文 HTTP 的最小代理，
+相当于 Mihomo 的一个 listeners 端口，记录经它转发的请求。两者都监听 127.0.0.1 随机端口。
+"""
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from urllib.parse import urlsplit
+
+
+class _StandIn:
+    def __init__(self, server):
+        self._closing = threading.Event()
+        self._server = server
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def close(self):
+        self._closing.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PayloadServer(_StandIn):
+    """替身测速服务器，用法：with PayloadServer(size) as srv: cfg.bandwidth_url = srv.url"""
+
+    def __init__(self, size, stall_after=None):
+        self.size = size
+        self.stall_after = stall_after
+        super().__init__(ThreadingHTTPServer(("127.0.0.1", 0), self._handler()))
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/payload"
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(standin.size))
+                self.end_headers()
+                limit = standin.size if standin.stall_after is None else standin.stall_after
+                try:
+                    sent = 0
+                    while sent < limit:
+                        n = min(64 * 1024, limit - sent)
+                        self.wfile.write(b"\0" * n)
+                        sent += n
+                    self.wfile.flush()
+                    if standin.stall_after is not None:
+                        standin._closing.wait()
+                except (ConnectionError, OSError):
+                    pass
+
+        return Handler
+
+
+class ProxyStandIn(_StandIn):
+    """替身节点端口：把绝对地址形式的 GET 转发到目标服务器，用法：proxy=f"http://127.0.0.1:{p.port}\""""
+
+    def __init__(self):
+        self.requests = []  # 经代理转发的目标 URL
+        super().__init__(ThreadingTCPServer(("127.0.0.1", 0), self._handler()))
+
+    def _handler(self):
+        standin = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                request_line = self.rfile.readline().decode("latin-1")
+                method, url, version = request_line.split()
+                headers = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    if not line.lower().startswith((b"proxy-", b"connection:")):
+                        headers.append(line)
+                standin.requests.append(url)
+                target = urlsplit(url)
+                path = target.path + (f"?{target.query}" if target.query else "")
+                with socket.create_connection((target.hostname, target.port or 80)) as upstream:
+                    upstream.sendall(f"{method} {path} {version}\r\n".encode("latin-1")
+                                     + b"".join(headers) + b"Connection: close\r\n\r\n")
+                    try:
+                        while not standin._closing.is_set():
+                            data = upstream.recv(64 * 1024)
+                            if not data:
+                                break
+                            self.wfile.write(data)
+                    except (ConnectionError, OSError):
+                        pass
+
+        return Handler
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+# 仓库根目录下的脚本不是包，测试直接按顶层模块导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy_pool.pool import BaseProxyPool  # noqa: E402
+
+
+@pytest.fixture
+def results_file(tmp_path):
+    path = tmp_path / "proxy_test_results.json"
+    path.write_text(json.dumps({
+        "meta": {},
+        "ok": [{"name": "node-a", "latency_ms": 100}, {"name": "node-b", "latency_ms": 200}],
+        "failed": [],
+    }), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def pool(results_file):
+    """不连接控制器的代理池（只有节点列表、健康评分与熔断）"""
+    return BaseProxyPool(results_file=results_file)
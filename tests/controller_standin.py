@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+本地替身 Mihomo 控制器：在 127.0.0.1 随机端口上提供 /connections、/logs、/traffic
+
+/connections 返回 set_connections() 设置的快照；/logs 与 /traffic 和真实控制器一样按行流式返回
+（chunked 编码，一行一个 JSON），内容由 push_log() / push_traffic() 推入。用于在没有 Mihomo 的
+环境里测试 TrafficMonitor 的完整数据通路（HTTP 会话、流式读取、重连）。
+"""
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ControllerStandIn:
+    """替身控制器，用法：with ControllerStandIn() as ctl: TrafficMonitor(pool, api_url=ctl.url)"""
+
+    def __init__(self):
+        self.connections = []
+        self.requests = []  # 收到的请求路径
+        self._streams = {"/logs": queue.Queue(), "/traffic": queue.Queue()}
+        self._closing = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_connections(self, connections):
+        self.connections = list(connections)
+
+    def push_log(self, level, payload):
+        self._streams["/logs"].put({"type": level, "payload": payload})
+
+    def push_traffic(self, up, down):
+        self._streams["/traffic"].put({"up": up, "down": down})
+
+    def close(self):
+        self._closing.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                standin.requests.append(self.path)
+                if path == "/connections":
+                    body = json.dumps({"connections": standin.connections}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path in standin._streams:
+                    self._stream(standin._streams[path])
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+            def _stream(self, lines):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    while not standin._closing.is_set():
+                        try:
+                            entry = lines.get(timeout=0.05)
+                        except queue.Empty:
+                            continue
+                        data = (json.dumps(entry) + "\n").encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (ConnectionError, OSError):
+                    pass
+
+        return Handler
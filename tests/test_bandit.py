@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+
+from proxy_pool import CONFIG
+from proxy_pool.bandit import DomainBandit
+from proxy_pool.pool import BaseProxyPool
+from rate_limiter import RateLimiter, VisitScheduler
+
+
+def test_prior_follows_domain_success_rate():
+    bandit = DomainBandit(half_life=0)
+    assert bandit.prior("example.com", now=0.0) == (1.0, 1.0)
+    for _ in range(8):
+        bandit.update("example.com", "a", False, now=0.0)
+    bandit.update("example.com", "b", True, now=0.0)
+    alpha, beta = bandit.prior("example.com", now=0.0)
+    assert alpha + beta == 2.0
+    assert alpha / (alpha + beta) == 2.0 / 11.0
+
+
+def test_known_good_exit_wins_over_large_unexplored_pool(tmp_path, monkeypatch):
+    path = tmp_path / "proxy_test_results.json"
+    path.write_text(json.dumps({
+        "meta": {},
+        "ok": [{"name": f"node-{i}", "latency_ms": 100} for i in range(1000)],
+        "failed": [],
+    }), encoding="utf-8")
+    monkeypatch.setitem(CONFIG, "BANDIT_ENABLED", True)
+    monkeypatch.setitem(CONFIG, "BANDIT_STATE_FILE", str(tmp_path / "bandit_state.json"))
+    pool = BaseProxyPool(results_file=str(path))
+    for _ in range(20):
+        pool.report_success("node-0", target="https://example.com/a")
+    # 目标拦截了大多数出口：总体成功率低，未访问节点的先验也低
+    for i in range(1, 21):
+        pool.report_failure(f"node-{i}", "blocked", target="https://example.com/b")
+        pool.report_failure(f"node-{i}", "blocked", target="https://example.com/b")
+
+    random.seed(1)
+    picks = [pool.get_node_for_target("https://example.com/")["name"] for _ in range(200)]
+    # Beta(1, 1) 先验下 995 个未访问节点的样本最大值几乎总是胜出，node-0 很少被选中
+    assert picks.count("node-0") > 150
+
+    # 限速调度同样按域名的学习结果选节点
+    scheduler = VisitScheduler(pool, RateLimiter(100.0, 100.0, 100.0, 100.0))
+    picks = [scheduler.next_dispatch(["example.com"])[0]["name"] for _ in range(50)]
+    assert picks.count("node-0") > 35
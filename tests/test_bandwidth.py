@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from check_proxies import MihomoConfig, bandwidth_kbps, results_payload, run_bandwidth_async
+
+from bandwidth_standin import PayloadServer, ProxyStandIn
+
+
+def test_kbps_counts_from_first_chunk():
+    # 1 MB，首字节 0.5 秒后到达，之后 2 秒收完：按 2 秒计算
+    assert bandwidth_kbps(1024 * 1024, start=10.0, first=10.5, end=12.5) == pytest.approx(512.0)
+    # 第一块就收完（首块后耗时不足 50ms）时按总耗时计算
+    assert bandwidth_kbps(64 * 1024, start=10.0, first=10.49, end=10.5) == pytest.approx(128.0)
+    assert bandwidth_kbps(64 * 1024, start=10.0, first=None, end=10.5) == pytest.approx(128.0)
+
+
+def run_bandwidth(size, stall_after=None, **overrides):
+    with PayloadServer(size, stall_after) as srv, ProxyStandIn() as proxy:
+        cfg = MihomoConfig(bandwidth_url=srv.url, bandwidth_bytes=size, **overrides)
+        results = asyncio.run(run_bandwidth_async(cfg, ["node-a"], {"node-a": proxy.port}))
+    return results, proxy.requests
+
+
+def test_full_download_through_node_port():
+    results, requests = run_bandwidth(512 * 1024)
+    kbps, err, partial = results["node-a"]
+    assert requests and requests[0].endswith("/payload")
+    assert err is None and kbps > 0 and partial is False
+    entry = results_payload([("node-a", 80.0)], [], bandwidth=results)["ok"][0]
+    assert entry["bandwidth_kbps"] == round(kbps, 1)
+    assert "bandwidth_partial" not in entry
+
+
+def test_timeout_after_partial_data_is_marked_partial():
+    results, _ = run_bandwidth(1024 * 1024, stall_after=128 * 1024, bandwidth_timeout=0.5)
+    kbps, err, partial = results["node-a"]
+    assert err is None and kbps > 0 and partial is True
+    entry = results_payload([("node-a", 80.0)], [], bandwidth=results)["ok"][0]
+    assert entry["bandwidth_partial"] is True
+    assert "bandwidth_error" not in entry
+
+
+def test_timeout_without_data_is_an_error():
+    results, _ = run_bandwidth(1024 * 1024, stall_after=0, bandwidth_timeout=0.5)
+    assert results["node-a"] == (None, "timeout", False)
+    entry = results_payload([("node-a", 80.0)], [], bandwidth=results)["ok"][0]
+    assert entry["bandwidth_error"] == "timeout"
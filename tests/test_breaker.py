@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import time
+
+from proxy_pool import CONFIG
+
+
+def half_open(pool, name, now):
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        pool.report_failure(name, "test")
+    pool.health[name].opened_at = now - CONFIG["BREAKER_COOLDOWN"] - 1
+    assert pool.is_node_available(name, now)
+    assert pool.health[name].state == "half_open"
+
+
+def test_unreported_probe_is_reclaimed_after_timeout(pool):
+    now = time.time()
+    half_open(pool, "node-a", now)
+
+    # 选中后调用方既没有回报成功也没有回报失败（租约按 success=None 释放、放弃预取等）
+    assert pool.get_node_for_target("x.com", exclude={"node-b"})["name"] == "node-a"
+    assert not pool.is_node_available("node-a")
+    assert pool.get_random_node(exclude={"node-b"}) is None
+
+    later = pool.health["node-a"].probe_started_at + CONFIG["PROBE_TIMEOUT"]
+    assert pool.is_node_available("node-a", later)
+    assert pool.health["node-a"].state == "half_open"
+
+
+def test_reported_probe_closes_breaker(pool):
+    now = time.time()
+    half_open(pool, "node-a", now)
+    assert pool.get_random_node(exclude={"node-b"})["name"] == "node-a"
+    pool.report_success("node-a")
+    assert pool.health["node-a"].state == "closed"
+    assert not pool.health["node-a"].probing
+
+
+def test_seconds_until_recovery(pool):
+    now = time.time()
+    assert pool.seconds_until_recovery(now) is None
+    for name in ("node-a", "node-b"):
+        for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+            pool.report_failure(name, "test")
+    pool.health["node-a"].opened_at = now - 100
+    pool.health["node-b"].opened_at = now - 10
+    assert pool.get_random_node() is None
+    assert pool.seconds_until_recovery(now) == CONFIG["BREAKER_COOLDOWN"] - 100
+
+
+def test_release_probe_returns_the_slot(pool):
+    half_open(pool, "node-a", time.time())
+    assert pool.get_random_node(exclude={"node-b"})["name"] == "node-a"
+    assert not pool.is_node_available("node-a")
+    pool.release_probe("node-a")
+    assert pool.is_node_available("node-a")
+    assert pool.health["node-a"].state == "half_open"
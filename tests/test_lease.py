@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from proxy_pool import CONFIG
+from proxy_lease_server import LeaseClient, LeaseConfig, LeaseManager, make_handler
+
+
+@pytest.fixture
+def lease_server(pool):
+    manager = LeaseManager(pool, {"node-a": 7891, "node-b": 7892}, LeaseConfig())
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(manager))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", manager
+    server.shutdown()
+    server.server_close()
+
+
+def test_reacquire_keeps_a_single_heartbeat(lease_server):
+    url, manager = lease_server
+    client = LeaseClient("worker-1", url, ttl=0.3)
+    client.acquire()
+    first = client._heartbeat
+    client.release(success=True)
+    assert not first.is_alive() and client.lease is None
+
+    client.acquire()
+    second = client._heartbeat
+    client.acquire()  # 没有先释放就重新租用：旧的心跳线程必须先退出
+    assert not second.is_alive() and client._heartbeat.is_alive()
+    client.release(success=True)
+    assert client._heartbeat is None
+
+
+def test_context_exit_reports_success(lease_server, pool):
+    url, manager = lease_server
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        pool.report_failure("node-a", "test")
+    pool.health["node-a"].opened_at -= CONFIG["BREAKER_COOLDOWN"] + 1
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        pool.report_failure("node-b", "test")
+
+    with LeaseClient("worker-1", url, ttl=5) as lease:
+        assert lease["node"] == "node-a"
+        assert pool.health["node-a"].probing
+    # 正常退出回报成功，探测结束、熔断器关闭
+    assert pool.health["node-a"].state == "closed"
+    assert not pool.health["node-a"].probing
+    assert manager.snapshot() == []
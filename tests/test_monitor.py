@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import time
+
+from proxy_pool import CONFIG
+from proxy_pool.monitor import TrafficMonitor
+
+from controller_standin import ControllerStandIn
+
+
+def conn(conn_id, node, upload=0, download=0):
+    return {"id": conn_id, "chains": [node, "GLOBAL"], "upload": upload, "download": download}
+
+
+def open_breaker(pool, name):
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        pool.report_failure(name, "test")
+    assert pool.health[name].state == "open"
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_connection_deltas_are_attributed_to_exit_node(pool):
+    monitor = TrafficMonitor(pool, fetch_json=lambda path: {}, report=False)
+    monitor.handle_connections({"connections": [conn("1", "node-a", 100, 1000)]}, now=0.0)
+    monitor.handle_connections({"connections": [conn("1", "node-a", 150, 3000), conn("2", "node-b", 0, 500)]}, now=1.0)
+
+    a, b = monitor.nodes["node-a"], monitor.nodes["node-b"]
+    assert (a.upload, a.download, a.connections, a.active) == (150, 3000, 1, 1)
+    assert (b.download, b.connections) == (500, 1)
+
+    # 连接关闭后活动数归零，累计量不变
+    monitor.handle_connections({"connections": []}, now=2.0)
+    assert (a.active, a.download) == (0, 3000)
+
+
+def test_passive_success_only_for_closed_nodes(pool):
+    open_breaker(pool, "node-a")
+    failures = pool.health["node-a"].consecutive_failures
+    monitor = TrafficMonitor(pool, fetch_json=lambda path: {})
+
+    # 隔离中的 node-a 仍有存量连接在下载，不能因此恢复
+    monitor.handle_connections({"connections": [conn("1", "node-a", 0, 100), conn("2", "node-b", 0, 100)]}, now=0.0)
+    monitor.handle_connections({"connections": [conn("1", "node-a", 0, 9000), conn("2", "node-b", 0, 9000)]}, now=1.0)
+    assert pool.health["node-a"].state == "open"
+    assert pool.health["node-a"].consecutive_failures == failures
+    assert pool.health["node-b"].state == "closed"
+
+    # half_open 探测中的节点同样只能由真正的探测结果决定
+    pool.health["node-a"].opened_at -= CONFIG["BREAKER_COOLDOWN"] + 1
+    assert pool.is_node_available("node-a")
+    assert pool.health["node-a"].state == "half_open"
+    monitor.handle_connections({"connections": [conn("1", "node-a", 0, 20000)]}, now=2.0)
+    assert pool.health["node-a"].state == "half_open"
+
+
+def test_passive_traffic_keeps_failure_streak(pool):
+    monitor = TrafficMonitor(pool, fetch_json=lambda path: {})
+    for _ in range(CONFIG["BREAKER_THRESHOLD"] - 1):
+        pool.report_failure("node-a", "visit failed")
+    score = pool.health["node-a"].score
+    monitor.handle_connections({"connections": [conn("1", "node-a", 0, 100)]}, now=0.0)
+    monitor.handle_connections({"connections": [conn("1", "node-a", 0, 9000)]}, now=1.0)
+    assert pool.health["node-a"].score > score
+    assert pool.health["node-a"].consecutive_failures == CONFIG["BREAKER_THRESHOLD"] - 1
+
+    # 长连接一直有流量，主动访问再失败一次仍然熔断
+    pool.report_failure("node-a", "visit failed")
+    assert pool.health["node-a"].state == "open"
+
+
+def test_log_error_reports_failure_instead_of_success(pool):
+    monitor = TrafficMonitor(pool, fetch_json=lambda path: {})
+    assert monitor.handle_log_line('{"type": "warning", "payload": "[TCP] dial node-b error: i/o timeout"}') == "node-b"
+    assert monitor.handle_log_line('{"type": "info", "payload": "node-b error"}') is None
+    monitor.handle_connections({"connections": [conn("1", "node-b", 0, 5000)]}, now=0.0)
+    assert pool.health["node-b"].consecutive_failures == 1
+    assert monitor.nodes["node-b"].errors == 1
+
+
+def test_monitor_against_controller_standin(pool):
+    with ControllerStandIn() as ctl:
+        monitor = TrafficMonitor(pool, api_url=ctl.url, interval=0.05)
+        ctl.set_connections([conn("1", "node-a", 10, 100)])
+        monitor.start()
+        try:
+            ctl.push_traffic(123, 4567)
+            ctl.push_log("warning", "[TCP] dial node-b (match Match/) error: connect refused")
+            ctl.set_connections([conn("1", "node-a", 10, 100), conn("2", "node-b", 0, 0)])
+            assert wait_until(lambda: monitor.traffic == (123, 4567))
+            assert wait_until(lambda: "node-b" in monitor.nodes and monitor.nodes["node-b"].errors == 1)
+            ctl.set_connections([conn("1", "node-a", 10, 8100)])
+            assert wait_until(lambda: monitor.nodes["node-a"].download == 8100)
+            assert wait_until(lambda: pool.health.get("node-b") is not None and pool.health["node-b"].consecutive_failures == 1)
+        finally:
+            monitor.stop()
+    assert any(path.startswith("/logs") for path in ctl.requests)
+    assert "/traffic" in ctl.requests
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from proxy_pool import CONFIG
+from proxy_pool.pool import BaseProxyPool
+from rate_limiter import RateLimiter, VisitScheduler
+
+
+@pytest.fixture
+def region_pool(tmp_path):
+    path = tmp_path / "proxy_test_results.json"
+    path.write_text(json.dumps({
+        "meta": {},
+        "ok": [
+            {"name": "node-jp", "latency_ms": 100, "country": "JP"},
+            {"name": "node-us-1", "latency_ms": 100, "country": "US"},
+            {"name": "node-us-2", "latency_ms": 100, "country": "US"},
+        ],
+        "failed": [],
+    }), encoding="utf-8")
+    return BaseProxyPool(results_file=str(path))
+
+
+def test_dispatch_prefers_target_region(region_pool):
+    scheduler = VisitScheduler(region_pool, RateLimiter(100.0, 100.0, 100.0, 100.0))
+    for _ in range(20):
+        node, domain, wait = scheduler.next_dispatch(["example.jp"], "JP")
+        assert node["name"] == "node-jp" and domain == "example.jp" and wait == 0.0
+
+
+def test_dispatch_falls_back_when_region_unavailable(region_pool):
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        region_pool.report_failure("node-jp", "test")
+    scheduler = VisitScheduler(region_pool, RateLimiter(100.0, 100.0, 100.0, 100.0))
+    node, _, wait = scheduler.next_dispatch(["example.jp"], "JP")
+    assert node["name"].startswith("node-us") and wait == 0.0
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import json
+
+from check_proxies import results_payload, write_results_file
+from proxy_pool.nodes import parse_test_results
+from tag_regions import TagConfig, main as tag_main
+
+
+def tag_config(path, tmp_path):
+    missing = str(tmp_path / "missing")
+    return TagConfig(results_file=path, mmdb_country=missing, mmdb_asn=missing, csv_path=missing, lookup_exit_ip=False)
+
+
+def test_legacy_available_file_is_rewritten_to_ok(tmp_path):
+    path = str(tmp_path / "proxy_test_results.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"available": [{"name": "🇭🇰 香港 01", "latency_ms": 80}], "failed": []}, f)
+
+    tag_main(tag_config(path, tmp_path))
+
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)
+    assert "available" not in results
+    ok, failed = parse_test_results(results)
+    assert [n["name"] for n in ok] == ["🇭🇰 香港 01"]
+    assert ok[0]["country"] == "HK"
+    assert failed == []
+
+
+def test_recheck_keeps_region_tags(tmp_path):
+    path = str(tmp_path / "proxy_test_results.json")
+    write_results_file(path, results_payload([("🇯🇵 日本 01", 120.0), ("plain", 90.0)], []))
+    tag_main(tag_config(path, tmp_path))
+
+    carried = write_results_file(path, results_payload([("🇯🇵 日本 01", 95.0), ("new", 60.0)], [("plain", "timeout")]))
+
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)
+    nodes = {n["name"]: n for n in results["ok"]}
+    assert carried == 1
+    assert nodes["🇯🇵 日本 01"]["country"] == "JP"
+    assert nodes["🇯🇵 日本 01"]["latency_ms"] == 95.0
+    assert "country" not in nodes["new"]
+    assert results["meta"]["regions_tagged_by"] == "tag_regions.py"
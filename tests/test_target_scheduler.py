@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import target_scheduler
+from proxy_pool import CONFIG
+from proxy_pool.pool import BaseProxyPool
+from target_scheduler import Target, TargetVisitor
+
+from bandwidth_standin import PayloadServer, ProxyStandIn
+
+
+@pytest.fixture
+def region_pool(tmp_path):
+    path = tmp_path / "proxy_test_results.json"
+    path.write_text(json.dumps({
+        "meta": {},
+        "ok": [
+            {"name": "node-jp", "latency_ms": 100, "country": "JP"},
+            {"name": "node-us", "latency_ms": 100, "country": "US"},
+        ],
+        "failed": [],
+    }), encoding="utf-8")
+    return BaseProxyPool(results_file=str(path))
+
+
+def test_http_target_uses_its_engine_and_region(region_pool, monkeypatch):
+    rows = []
+    monkeypatch.setattr(target_scheduler, "log_visit", lambda *row: rows.append(row))
+    with PayloadServer(1024) as srv, ProxyStandIn() as jp, ProxyStandIn() as us:
+        monkeypatch.setitem(CONFIG, "URL_ENGINES", {srv.url: "http"})
+        monkeypatch.setitem(CONFIG, "TARGET_REGIONS", {srv.url: "JP"})
+        visitor = TargetVisitor(region_pool, {"node-jp": jp.port, "node-us": us.port})
+        try:
+            for _ in range(5):
+                visitor(Target(srv.url))
+        finally:
+            visitor.close()
+
+    # 只经 JP 节点的端口访问，不启动浏览器，也不直连
+    assert len(jp.requests) == 5 and us.requests == []
+    assert [row[2] for row in rows] == ["node-jp"] * 5
+    assert {row[6] for row in rows} == {"SUCCESS"}
+    assert region_pool.health["node-jp"].consecutive_failures == 0
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import Future
+
+import visit_prefetch
+from proxy_pool import CONFIG
+from visit_prefetch import PreparedVisit, VisitPreparer
+
+
+def test_discarded_half_open_node_is_released(pool):
+    for _ in range(CONFIG["BREAKER_THRESHOLD"]):
+        pool.report_failure("node-a", "test")
+    pool.health["node-a"].opened_at -= CONFIG["BREAKER_COOLDOWN"] + 1
+    assert pool.get_random_node(exclude={"node-b"})["name"] == "node-a"
+    assert not pool.is_node_available("node-a")
+
+    preparer = VisitPreparer(pool, {"node-a": 7891, "node-b": 7892})
+    pending = Future()
+    preparer.discard(pending)
+    pending.set_result(PreparedVisit("ua", {"width": 1, "height": 1}, node="node-a"))
+    preparer.close()
+
+    assert pool.is_node_available("node-a")
+    assert pool.health["node-a"].state == "half_open"
+
+
+def test_unsupported_settings_fall_back_to_serial(monkeypatch):
+    loaded = []
+    monkeypatch.setitem(CONFIG, "REUSE_DRIVER", True)
+    monkeypatch.setattr(visit_prefetch, "load_node_ports", loaded.append)
+    # 在连接 Mihomo、读取端口之前就退回串行访问
+    assert visit_prefetch.main() is False
+    assert loaded == []
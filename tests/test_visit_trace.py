@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from visit_trace import _percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 11))  # 1..10
+    # 秩为 ceil(0.9 * 10) = 9；round(9 + 0.5) 的写法会取到第 10 个
+    assert _percentile(values, 90) == 9
+    assert _percentile(values, 50) == 5
+    assert _percentile(values, 100) == 10
+    assert _percentile(values, 0) == 1
+    assert _percentile([5, 1, 4, 2, 3], 90) == 5
+    assert _percentile([7.0], 90) == 7.0
+
+
+def test_summarize_counts_uncovered_time_as_other():
+    records = [
+        {"total_ms": 100.0, "spans": [{"name": "switch", "ms": 30.0}, {"name": "page_load", "ms": 60.0}]},
+        {"total_ms": 200.0, "spans": [{"name": "switch", "ms": 50.0}, {"name": "page_load", "ms": 150.0}]},
+    ]
+    summary = summarize(records)
+    phases = {p["name"]: p for p in summary["phases"]}
+    assert summary["visits"] == 2
+    assert phases["page_load"]["total_ms"] == 210.0
+    assert phases["switch"]["p90_ms"] == 50.0
+    assert phases["(other)"]["count"] == 1
+    assert summary["phases"][0]["name"] == "page_load"
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""访问日志：单写入线程 + 批量刷盘 + 按大小/按天轮转，以及流式统计。
+
+原来的 log_visit 每次访问都打开文件、写一行、关闭；并行 worker 同时写还会交错。
+这里改为：
+
+- VisitLogWriter：调用方只把一行放进队列，后台唯一的写入线程攒够 flush_every 行
+  或每 flush_interval 秒批量写一次；文件超过 rotate_mb 或跨天（rotate_daily）时
+  把当前文件改名为 visit_log.YYYYMMDD-HHMMSS.csv 并新开一个；
+- 格式：csv（默认，与原来的列一致，末尾新增 duration_ms、bytes）或 jsonl；
+- aggregate_logs：逐行流式读取（含轮转出的历史文件），按节点统计成功率和耗时，
+  不需要把多 GB 日志整个读进内存；
+- export_columnar：导出为 NumPy .npz 列式文件（字符串列字典编码），体积小、读取快。
+
+用法：
+    python visit_log.py                     # 统计 logs/ 下全部访问日志
+    python visit_log.py --export out.npz    # 同时导出列式文件
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import queue
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+FIELDS = [
+    "timestamp_utc", "visit_number", "url", "proxy_node",
+    "exit_ip", "user_agent", "screen_width", "screen_height",
+    "status", "note", "duration_ms", "bytes",
+]
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class VisitLogWriter:
+    """线程安全的访问日志写入器（队列 + 后台单线程批量写）。"""
+
+    def __init__(
+        self,
+        path: str,
+        fmt: str = "csv",
+        flush_every: int = 50,
+        flush_interval: float = 1.0,
+        rotate_mb: float = 100.0,
+        rotate_daily: bool = False,
+    ):
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"未知日志格式: {fmt}（可选 csv / jsonl）")
+        self.path = path
+        self.fmt = fmt
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024) if rotate_mb else 0
+        self.rotate_daily = rotate_daily
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._file = None
+        self._day = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="visit-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row: dict) -> None:
+        """放入队列后立即返回（真正写盘在后台线程）。"""
+        if self._closed:
+            raise RuntimeError("VisitLogWriter 已关闭")
+        self._queue.put(row)
+
+    def close(self) -> None:
+        """写完队列中剩余的行后关闭文件。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    # ---- 以下只在写入线程中调用 ----
+
+    def _header_matches(self) -> bool:
+        if self.fmt != "csv":
+            return True
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None) == FIELDS
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0 and not self._header_matches():
+            # 旧版本日志（列不同）不在后面追加，先改名保留
+            self._rotate_existing()
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._day = _utc_day()
+        if self.fmt == "csv" and self._file.tell() == 0:
+            csv.writer(self._file).writerow(FIELDS)
+            self._file.flush()
+
+    def _rotate_existing(self) -> None:
+        base, ext = os.path.splitext(self.path)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        target = f"{base}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(target):
+            target = f"{base}.{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self.path, target)
+        print(f"🗂️  日志已轮转: {os.path.basename(target)}")
+
+    def _maybe_rotate(self) -> None:
+        size_hit = self.rotate_bytes and self._file.tell() >= self.rotate_bytes
+        day_hit = self.rotate_daily and _utc_day() != self._day
+        if size_hit or day_hit:
+            self._file.close()
+            self._rotate_existing()
+            self._open()
+
+    def _format(self, rows: List[dict]) -> str:
+        buf = io.StringIO()
+        if self.fmt == "csv":
+            writer = csv.writer(buf)
+            writer.writerows([["" if r.get(k) is None else r.get(k) for k in FIELDS] for r in rows])
+        else:
+            for r in rows:
+                buf.write(json.dumps({k: r.get(k) for k in FIELDS}, ensure_ascii=False))
+                buf.write("\n")
+        return buf.getvalue()
+
+    def _flush(self, rows: List[dict]) -> None:
+        if not rows:
+            return
+        if self._file is None:
+            self._open()
+        self._file.write(self._format(rows))
+        self._file.flush()
+        self._maybe_rotate()
+
+    def _run(self) -> None:
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = ...
+            if row is None:
+                break
+            if row is not ...:
+                batch.append(row)
+            if len(batch) >= self.flush_every or time.monotonic() >= deadline:
+                try:
+                    self._flush(batch)
+                except OSError as e:
+                    print(f"❌ 写入访问日志失败: {e}")
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        try:
+            self._flush(batch)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def find_log_files(path: str) -> List[str]:
+    """当前日志文件及其轮转出的历史文件（按修改时间从旧到新）。"""
+    base, ext = os.path.splitext(path)
+    files = [p for p in glob.glob(f"{glob.escape(base)}.*{ext}") if p != path]
+    if os.path.exists(path):
+        files.append(path)
+    return sorted(files, key=os.path.getmtime)
+
+
+def iter_log_rows(paths: Iterable[str]) -> Iterator[dict]:
+    """逐行读取 csv / jsonl 日志（兼容没有 duration_ms 列的旧日志）。"""
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            else:
+                yield from csv.DictReader(f)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def aggregate_logs(paths: Iterable[str]) -> Dict[str, dict]:
+    """按节点流式统计：visits / success / success_rate / avg_ms / max_ms / avg_kb / ips。"""
+    stats: Dict[str, dict] = {}
+    for row in iter_log_rows(paths):
+        node = row.get("proxy_node") or "DIRECT"
+        s = stats.get(node)
+        if s is None:
+            s = stats[node] = {
+                "visits": 0, "success": 0, "timed": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "sized": 0, "total_bytes": 0.0, "ips": set(),
+            }
+        s["visits"] += 1
+        if row.get("status") == "SUCCESS":
+            s["success"] += 1
+        duration = _to_float(row.get("duration_ms"))
+        if duration is not None:
+            s["timed"] += 1
+            s["total_ms"] += duration
+            s["max_ms"] = max(s["max_ms"], duration)
+        nbytes = _to_float(row.get("bytes"))
+        if nbytes is not None:
+            s["sized"] += 1
+            s["total_bytes"] += nbytes
+        ip = row.get("exit_ip")
+        if ip and ip != "N/A":
+            s["ips"].add(ip)
+
+    result = {}
+    for node, s in stats.items():
+        result[node] = {
+            "visits": s["visits"],
+            "success": s["success"],
+            "success_rate": s["success"] / s["visits"],
+            "avg_ms": round(s["total_ms"] / s["timed"], 1) if s["timed"] else None,
+            "max_ms": round(s["max_ms"], 1) if s["timed"] else None,
+            "avg_kb": round(s["total_bytes"] / s["sized"] / 1024, 1) if s["sized"] else None,
+            "ips": len(s["ips"]),
+        }
+    return result
+
+
+def export_columnar(paths: Iterable[str], dst: str) -> int:
+    """导出为 .npz 列式文件，返回行数。字符串列存为整数编码 + 词表（{列名}_values）。"""
+    import numpy as np
+
+    encoded = ("url", "proxy_node", "exit_ip", "status")
+    vocab: Dict[str, Dict[str, int]] = {k: {} for k in encoded}
+    codes = {k: array("i") for k in encoded}
+    timestamps = array("d")
+    durations = array("f")
+    sizes = array("d")
+    count = 0
+    for row in iter_log_rows(paths):
+        for k in encoded:
+            value = row.get(k) or ""
+            table = vocab[k]
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            codes[k].append(code)
+        ts = row.get("timestamp_utc") or ""
+        try:
+            timestamps.append(datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp())
+        except ValueError:
+            timestamps.append(float("nan"))
+        duration = _to_float(row.get("duration_ms"))
+        durations.append(float("nan") if duration is None else duration)
+        nbytes = _to_float(row.get("bytes"))
+        sizes.append(float("nan") if nbytes is None else nbytes)
+        count += 1
+
+    columns = {"timestamp": np.frombuffer(timestamps, dtype=np.float64),
+               "duration_ms": np.frombuffer(durations, dtype=np.float32),
+               "bytes": np.frombuffer(sizes, dtype=np.float64)}
+    for k in encoded:
+        columns[k] = np.frombuffer(codes[k], dtype=np.int32)
+        columns[f"{k}_values"] = np.array(list(vocab[k]), dtype=str)
+    np.savez_compressed(dst, **columns)
+    return count
+
+
+def main() -> None:
+    from selenium_with_proxy import get_log_file_path
+
+    parser = argparse.ArgumentParser(description="按节点统计访问日志")
+    parser.add_argument("files", nargs="*", help="日志文件（默认 logs/ 下当前日志及其轮转文件）")
+    parser.add_argument("--export", help="导出 .npz 列式文件")
+    args = parser.parse_args()
+
+    files = args.files or find_log_files(get_log_file_path())
+    if not files:
+        print("❌ 没有找到访问日志")
+        return
+    print(f"📂 读取 {len(files)} 个日志文件")
+    stats = aggregate_logs(files)
+    print(f"\n{'节点':<30} {'访问':>6} {'成功率':>7} {'平均ms':>8} {'最大ms':>8} {'平均KB':>8} {'IP数':>5}")
+    for node, s in sorted(stats.items(), key=lambda kv: -kv[1]["visits"]):
+        avg = "-" if s["avg_ms"] is None else f"{s['avg_ms']:.0f}"
+        mx = "-" if s["max_ms"] is None else f"{s['max_ms']:.0f}"
+        kb = "-" if s["avg_kb"] is None else f"{s['avg_kb']:.0f}"
+        print(f"{node[:30]:<30} {s['visits']:>6} {s['success_rate']:>7.1%} {avg:>8} {mx:>8} {kb:>8} {s['ips']:>5}")
+    if args.export:
+        n = export_columnar(files, args.export)
+        print(f"\n💾 已导出 {n} 行到 {args.export}")
+
+
+if __name__ == "__main__":
+    main()
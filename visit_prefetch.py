@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""流水线访问：在访问 N 的页面停留和间隔等待期间准备好访问 N+1。
+
+selenium_with_proxy.main() 每次访问严格串行：选节点 → 切换 → 查出口 IP → 启动浏览器 → 访问 → 等待，
+下一次访问的准备要等间隔结束后才开始。借助每节点独立端口（listeners），准备工作不需要切换全局节点，
+可以和当前访问同时进行：
+
+- 访问 N 一开始，后台线程就为访问 N+1 选节点，经该节点端口查询出口 IP（同时验证节点可用并写入 IP 缓存），
+  再启动绑定该端口的 Chrome；
+- 访问 N 的浏览器在后台关闭；间隔等待结束时，访问 N+1 的浏览器已经就绪，关键路径只剩页面加载；
+- 准备好的节点如果在等待期间被熔断，就丢弃并重新准备。
+
+没有 listeners 时，准备节点需要切换全局节点，会影响正在进行的访问，因此退回串行的 selenium_with_proxy.main()；
+开启 RATE_LIMIT_ENABLED、REUSE_DRIVER 或 PROFILE_MODE 时同样退回串行访问（见 UNSUPPORTED_SETTINGS）。
+准备好却没有用上的节点（程序结束时丢弃、浏览器启动失败）会交还 half_open 探测名额。
+
+用法：
+    CONFIG["PIPELINED_VISITS"] = True 后运行 selenium_with_proxy.py，或直接 python visit_prefetch.py
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from generate_clash_profile import get_workspace_paths, load_node_ports
+from parallel_visitor import lookup_exit_ip
+from proxy_pool import metrics
+from proxy_pool.monitor import TrafficMonitor
+from selenium_with_proxy import (
+    CONFIG,
+    MihomoProxyPool,
+    close_log_writer,
+    create_driver,
+    get_interval,
+    get_log_file_path,
+    get_random_device,
+    get_region_for,
+    get_transferred_bytes,
+    log_visit,
+    visit_page,
+    write_csv_header,
+)
+from visit_trace import NULL_TRACE, TraceWriter, VisitTrace, print_summary, summarize, trace_path_for
+
+
+@dataclass
+class PreparedVisit:
+    user_agent: str
+    screen_size: dict
+    node: Optional[str] = None
+    proxy: Optional[str] = None           # 绑定的节点端口，如 http://127.0.0.1:30003
+    exit_ip: Optional[str] = None
+    driver: object = None
+    prepare_ms: float = 0.0
+    note: str = ""                        # 准备失败的原因
+
+
+def _quit(driver) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class VisitPreparer:
+    """后台准备下一次访问：选节点并经其端口验证出口 IP，启动绑定该端口的浏览器。
+
+    pool 为 None 时不使用代理，只提前启动浏览器。
+    """
+
+    def __init__(self, pool: Optional[MihomoProxyPool], node_ports: Dict[str, int],
+                 region: Optional[str] = None, headless: bool = True, target: Optional[str] = None):
+        self.pool = pool
+        self.target = target  # 访问目标（开启 BANDIT_ENABLED 时按该域名的历史结果选节点）
+        self.node_ports = node_ports
+        self.region = region
+        self.headless = headless
+        # 一个线程做准备，另一个关闭用完的浏览器，互不阻塞
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="visit-prepare")
+        self._no_port_for = None
+        self._no_port = set()
+
+    def _unroutable(self) -> set:
+        # 没有独立端口的节点无法单独走，按节点集合缓存（热加载换集合后重新计算）
+        node_set = self.pool.node_set
+        if node_set is not self._no_port_for:
+            self._no_port = {n.get("name") for n in node_set.available if n.get("name") not in self.node_ports}
+            self._no_port_for = node_set
+        return self._no_port
+
+    def submit(self, exclude: Iterable[str] = ()) -> Future:
+        return self._executor.submit(self.prepare, set(exclude))
+
+    def release(self, driver) -> None:
+        """在后台关闭浏览器（不占用访问的关键路径）"""
+        if driver is not None:
+            self._executor.submit(_quit, driver)
+
+    def unused(self, prepared: PreparedVisit) -> None:
+        """准备好的节点没有用于访问：交还其探测名额（没有访问结果可回报）"""
+        if self.pool is not None and prepared.node is not None:
+            self.pool.release_probe(prepared.node)
+
+    def discard(self, pending: Optional[Future]) -> None:
+        """丢弃尚未使用的准备结果（等准备完成后交还节点、关闭其浏览器）"""
+        def quit_when_ready(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                prepared = future.result()
+                self.unused(prepared)
+                _quit(prepared.driver)
+
+        if pending is not None:
+            pending.add_done_callback(quit_when_ready)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def is_stale(self, prepared: PreparedVisit) -> bool:
+        """准备好的节点在等待期间被熔断（half_open 探测中的节点正是本次要用的，不算）"""
+        if self.pool is None or prepared.node is None:
+            return False
+        health = self.pool.health.get(prepared.node)
+        return health is not None and health.state == "open"
+
+    def _pick(self, exclude: set):
+        """选节点并经其端口验证出口 IP，返回 (节点名, 代理地址, 出口 IP)；没有可用节点时全为 None"""
+        exclude = exclude | self._unroutable()
+        for _ in range(max(1, CONFIG["NODE_RETRY"])):
+            node = self.pool.get_node_for_target(self.target, exclude, self.region) if self.region else None
+            if node is None:
+                node = self.pool.get_node_for_target(self.target, exclude)
+            if node is None:
+                break
+            name = node.get("name")
+            port = self.node_ports.get(name)
+            if port is None:
+                exclude = exclude | {name}
+                continue
+            proxy = f"http://127.0.0.1:{port}"
+            ip = self.pool.get_cached_ip(name)
+            if not ip:
+                start = time.perf_counter()
+                ip = lookup_exit_ip(proxy)
+                self.pool.record_ip_lookup(start, ip)
+                if not ip:
+                    self.pool.report_failure(name, "exit ip lookup failed")
+                    exclude = exclude | {name}
+                    continue
+                # 成功只在页面访问后回报一次
+                self.pool.store_exit_ip(name, ip)
+            return name, proxy, ip
+        return None, None, None
+
+    def prepare(self, exclude: set) -> PreparedVisit:
+        start = time.perf_counter()
+        user_agent, screen_size = get_random_device()
+        prepared = PreparedVisit(user_agent, screen_size)
+        if self.pool is not None:
+            prepared.node, prepared.proxy, prepared.exit_ip = self._pick(exclude)
+            if prepared.node is None:
+                prepared.note = "no healthy node"
+        if not prepared.note:
+            try:
+                prepared.driver = create_driver(user_agent, screen_size, self.pool is not None, self.headless,
+                                                proxy_address=prepared.proxy)
+            except Exception as e:
+                prepared.note = str(e)
+        prepared.prepare_ms = (time.perf_counter() - start) * 1000
+        return prepared
+
+
+def new_stats() -> Dict[str, List[float]]:
+    """各次访问的 准备耗时 / 关键路径上等待准备的时间 / 页面访问耗时（毫秒）"""
+    return {"prepare": [], "stall": [], "visit": []}
+
+
+def run_visits(url: str, max_visits: int, preparer: VisitPreparer, stats: Dict[str, List[float]],
+               trace_writer: Optional[TraceWriter] = None) -> int:
+    """按间隔连续访问 url，访问 N 开始时即提交访问 N+1 的准备；返回访问次数，耗时记入 stats"""
+    visit_count = 0
+    pending: Optional[Future] = preparer.submit()
+    try:
+        while pending is not None:
+            visit_count += 1
+            trace = VisitTrace(visit_count) if trace_writer else NULL_TRACE
+            wait_start = time.perf_counter()
+            with trace.span("prepare_wait"):
+                prepared = pending.result()
+                if preparer.is_stale(prepared):
+                    print(f"  ♻️  预备节点已熔断，重新准备: {prepared.node}")
+                    preparer.release(prepared.driver)
+                    prepared = preparer.submit({prepared.node}).result()
+            stall_ms = (time.perf_counter() - wait_start) * 1000
+            last = max_visits > 0 and visit_count >= max_visits
+            # 下一次访问换一个出口，与本次访问同时准备
+            pending = None if last else preparer.submit({prepared.node} if prepared.node else ())
+
+            print(f"\n[访问 #{visit_count}] 节点: {prepared.node or 'DIRECT'}  出口 IP: {prepared.exit_ip or '-'}"
+                  f"  （准备 {prepared.prepare_ms:.0f}ms，等待 {stall_ms:.0f}ms）")
+            stats["prepare"].append(prepared.prepare_ms)
+            stats["stall"].append(stall_ms)
+            if prepared.driver is None:
+                status = "SKIPPED" if prepared.note == "no healthy node" else "EXCEPTION"
+                print(f"  ⏭️  跳过: {prepared.note}")
+                # 浏览器没能启动不是节点的问题，节点交还即可
+                preparer.unused(prepared)
+                log_visit(visit_count, url, prepared.node, prepared.exit_ip, prepared.user_agent,
+                          prepared.screen_size, status, prepared.note)
+            else:
+                visit_start = time.perf_counter()
+                nbytes = None
+                try:
+                    status, note = visit_page(prepared.driver, url, trace)
+                    with trace.span("bytes"):
+                        nbytes = get_transferred_bytes(prepared.driver)
+                except Exception as e:
+                    status, note = "EXCEPTION", str(e)
+                duration_ms = (time.perf_counter() - visit_start) * 1000
+                stats["visit"].append(duration_ms)
+                preparer.release(prepared.driver)
+                if status == "SUCCESS":
+                    print(f"  ✅ 访问成功 - 页面: {note}" + (f"（{nbytes / 1024:.0f} KB）" if nbytes else ""))
+                    if preparer.pool is not None:
+                        preparer.pool.report_success(prepared.node, target=url)
+                else:
+                    print(f"  ❌ 访问失败: {note}")
+                    if preparer.pool is not None:
+                        preparer.pool.report_failure(prepared.node, note, target=url)
+                log_visit(visit_count, url, prepared.node, prepared.exit_ip, prepared.user_agent,
+                          prepared.screen_size, status, note, duration_ms, nbytes)
+
+            if not last:
+                interval = get_interval(CONFIG["INTERVAL_MODE"], CONFIG["INTERVAL_MEAN"])
+                print(f"  ⏳ 等待 {interval:.1f} 秒（下一次访问已在准备）...")
+                with trace.span("interval"):
+                    time.sleep(interval)
+            if trace_writer:
+                trace.node = prepared.node
+                trace.status = status
+                trace_writer.write(trace)
+    finally:
+        preparer.discard(pending)
+    return visit_count
+
+
+def print_stats(stats: Dict[str, List[float]]) -> None:
+    if not stats["prepare"]:
+        return
+    n = len(stats["prepare"])
+    prepare = sum(stats["prepare"]) / n
+    stall = sum(stats["stall"]) / n
+    hidden = 1 - stall / prepare if prepare else 0.0
+    print(f"⚡ 准备耗时均值 {prepare:.0f}ms，其中落在关键路径上的 {stall:.0f}ms（{hidden * 100:.0f}% 与上一次访问重叠）")
+    if stats["visit"]:
+        print(f"🌐 页面访问耗时均值 {sum(stats['visit']) / len(stats['visit']):.0f}ms")
+
+
+# 流水线模式不支持的设置：开启任意一项时退回串行访问（串行主循环支持它们）
+UNSUPPORTED_SETTINGS = {
+    "RATE_LIMIT_ENABLED": "令牌桶限速",
+    "REUSE_DRIVER": "复用浏览器（流水线为每个节点端口启动新浏览器）",
+    "PROFILE_MODE": "访问剖析",
+}
+
+
+def main() -> bool:
+    """流水线访问 CONFIG["URL"]；使用代理但没有每节点独立端口、或开启了不支持的设置时返回 False
+    （由调用方退回串行访问）"""
+    url = CONFIG["URL"]
+    unsupported = [f"{key}（{desc}）" for key, desc in UNSUPPORTED_SETTINGS.items() if CONFIG[key]]
+    if unsupported:
+        print(f"⚠️  流水线访问不支持 {', '.join(unsupported)}，改用串行访问")
+        return False
+
+    node_ports: Dict[str, int] = {}
+    if CONFIG["USE_PROXY"]:
+        node_ports = load_node_ports(get_workspace_paths()["output"])
+        if not node_ports:
+            print("⚠️  没有每节点独立端口（listeners），无法在访问期间准备下一个节点，改用串行访问")
+            return False
+
+    pool = None
+    monitor = None
+    if CONFIG["USE_PROXY"]:
+        pool = MihomoProxyPool()
+        if len(pool) == 0:
+            print("⚠️  代理池为空，将不使用代理")
+            pool.close()
+            pool = None
+        else:
+            if CONFIG["WATCH_RESULTS"]:
+                pool.start_watching()
+            if CONFIG["PASSIVE_MONITOR"]:
+                monitor = TrafficMonitor(pool)
+                monitor.start()
+
+    metrics.start_exporter()
+    log_file = get_log_file_path()
+    write_csv_header(log_file)
+    trace_writer = TraceWriter(trace_path_for(log_file)) if CONFIG["TRACE_VISITS"] else None
+    region = get_region_for(url)
+
+    print("🚀 开始访问任务（流水线：访问期间准备下一个节点和浏览器）")
+    print(f"📍 目标 URL: {url}")
+    print(f"🔢 最大访问次数: {CONFIG['MAX_VISITS'] if CONFIG['MAX_VISITS'] > 0 else '无限'}")
+    print(f"⏱️  间隔模式: {CONFIG['INTERVAL_MODE']} (均值: {CONFIG['INTERVAL_MEAN']}秒)")
+    if pool is not None:
+        print(f"📊 代理池大小: {len(pool)}，其中 {len(node_ports)} 个节点有独立端口")
+    print(f"💾 日志文件: {log_file}")
+    print("-" * 60)
+
+    preparer = VisitPreparer(pool, node_ports, region, CONFIG["HEADLESS"], url)
+    stats = new_stats()
+    try:
+        run_visits(url, CONFIG["MAX_VISITS"], preparer, stats, trace_writer)
+    except KeyboardInterrupt:
+        print("\n\n⚠️  用户中断")
+    finally:
+        preparer.close()
+        print("🔒 已关闭浏览器")
+        if monitor is not None:
+            monitor.stop()
+            monitor.print_summary()
+        if pool is not None:
+            pool.stop_watching()
+            pool.close()
+        close_log_writer()
+        if trace_writer:
+            trace_writer.close()
+            print_summary(summarize(trace_writer.records))
+
+    print_stats(stats)
+    print(f"💾 日志: {log_file}")
+    return True
+
+
+if __name__ == "__main__":
+    main()
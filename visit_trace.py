@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""单次访问的分段计时（span）与可选的性能剖析。
+
+selenium_with_proxy.main() 的一次访问由 选节点 → 切换 → 查询出口 IP → 关闭旧浏览器 →
+启动浏览器 → 加载页面 / 等待 / 滚动 → 统计流量 → 间隔等待 串起来，只看总耗时分不清谁占大头。
+
+- VisitTrace：每次访问一个，用 with trace.span("switch"): ... 记录各阶段耗时（阶段互不嵌套）；
+- TraceWriter：每次访问写一行 JSON 到访问日志旁边的 *_trace.jsonl；
+- summarize / print_summary：按阶段汇总，按占总耗时的比例排序（运行结束时自动打印）；
+- VisitProfiler：对前 N 次访问（不含间隔等待）做 cProfile 或采样剖析，结果写入 logs/。
+  采样模式由后台线程每隔几毫秒抓一次主线程调用栈，输出 folded 格式，可直接用 flamegraph.pl 画火焰图。
+
+用法：
+    python visit_trace.py                          # 汇总 logs/ 下默认的 trace 文件
+    python visit_trace.py logs/visit_log_trace.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class VisitTrace:
+    """一次访问的分段计时"""
+
+    def __init__(self, visit_number: int):
+        self.visit_number = visit_number
+        self.timestamp_utc = datetime.now(timezone.utc).isoformat()
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []  # (阶段, 相对开始的秒数, 耗时秒)
+        self.node: Optional[str] = None
+        self.status: Optional[str] = None
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start - self.started, time.perf_counter() - start))
+
+    def record(self) -> dict:
+        return {
+            "timestamp_utc": self.timestamp_utc,
+            "visit_number": self.visit_number,
+            "node": self.node,
+            "status": self.status,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "spans": [
+                {"name": name, "start_ms": round(offset * 1000, 1), "ms": round(duration * 1000, 1)}
+                for name, offset, duration in self.spans
+            ],
+        }
+
+
+class _NullTrace:
+    """不计时的替身，visit_page 等函数在没有传入 trace 时使用"""
+
+    def span(self, name: str) -> contextlib.nullcontext:
+        return contextlib.nullcontext()
+
+
+NULL_TRACE = _NullTrace()
+
+
+def trace_path_for(log_path: str) -> str:
+    """访问日志对应的 trace 文件：logs/visit_log.csv -> logs/visit_log_trace.jsonl"""
+    return os.path.splitext(log_path)[0] + "_trace.jsonl"
+
+
+class TraceWriter:
+    """每次访问追加一行 JSON（访问间隔以秒计，直接追加写即可）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[dict] = []  # 本次运行的记录，用于结束时的汇总
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, trace: VisitTrace) -> dict:
+        record = trace.record()
+        with self._lock:
+            self.records.append(record)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        return record
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def iter_trace_records(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # 进程被杀时可能留下半行
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """最近秩百分位数：第 ceil(p/100 * n) 小的值"""
+    values = sorted(values)
+    idx = max(0, min(len(values) - 1, math.ceil(p / 100.0 * len(values)) - 1))
+    return values[idx]
+
+
+def summarize(records: Iterable[dict]) -> dict:
+    """按阶段汇总：总耗时、占比、次数、均值、p90；未被任何阶段覆盖的时间记为 (other)"""
+    durations: Dict[str, List[float]] = collections.defaultdict(list)
+    total = 0.0
+    visits = 0
+    for record in records:
+        visits += 1
+        total += record.get("total_ms") or 0.0
+        covered = 0.0
+        for span in record.get("spans") or []:
+            durations[span["name"]].append(span["ms"])
+            covered += span["ms"]
+        other = (record.get("total_ms") or 0.0) - covered
+        if other > 0:
+            durations["(other)"].append(other)
+    phases = []
+    for name, values in durations.items():
+        phase_total = sum(values)
+        phases.append({
+            "name": name,
+            "total_ms": phase_total,
+            "share": phase_total / total if total else 0.0,
+            "count": len(values),
+            "mean_ms": phase_total / len(values),
+            "p90_ms": _percentile(values, 90),
+        })
+    phases.sort(key=lambda p: p["total_ms"], reverse=True)
+    return {"visits": visits, "total_ms": total, "phases": phases}
+
+
+def print_summary(summary: dict) -> None:
+    if not summary["visits"]:
+        return
+    print(f"⏱️  各阶段耗时（{summary['visits']} 次访问，共 {summary['total_ms'] / 1000:.1f}s，按占比排序）:")
+    print(f"   {'阶段':<16}{'占比':>7}{'均值(ms)':>11}{'p90(ms)':>10}{'次数':>6}")
+    for phase in summary["phases"]:
+        bar = "█" * int(round(phase["share"] * 20))
+        print(f"   {phase['name']:<16}{phase['share'] * 100:>6.1f}%{phase['mean_ms']:>11.0f}"
+              f"{phase['p90_ms']:>10.0f}{phase['count']:>6}  {bar}")
+
+
+class _StackSampler:
+    """后台线程定时抓取目标线程的调用栈，按 folded 格式计数"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="visit-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._active.wait(0.1) or self._stop.is_set():
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+
+    def resume(self) -> None:
+        self._active.set()
+
+    def pause(self) -> None:
+        self._active.clear()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._active.set()
+        self._thread.join(timeout=1)
+
+
+class VisitProfiler:
+    """
+    对前 visits 次访问做剖析（mode: "cprofile" 或 "sample"），结束后把结果写入 out_dir
+
+    每次访问前调用 begin()、访问结束（间隔等待之前）调用 end()；剖析够次数或程序结束时调用 finish()。
+    """
+
+    def __init__(self, mode: str, visits: int, out_dir: str, sample_interval: float = 0.005):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"未知剖析模式: {mode}（可选 cprofile / sample）")
+        self.mode = mode
+        self.visits = visits
+        self.out_dir = out_dir
+        self.done = 0
+        self.finished = False
+        if mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+        else:
+            self._sampler = _StackSampler(threading.get_ident(), sample_interval)
+
+    @property
+    def active(self) -> bool:
+        return not self.finished and self.done < self.visits
+
+    def begin(self) -> None:
+        if not self.active:
+            return
+        if self.mode == "cprofile":
+            self._profile.enable()
+        else:
+            self._sampler.resume()
+
+    def end(self) -> None:
+        if not self.active:
+            return
+        if self.mode == "cprofile":
+            self._profile.disable()
+        else:
+            self._sampler.pause()
+        self.done += 1
+        if self.done >= self.visits:
+            self.finish()
+
+    def cancel(self) -> None:
+        """本轮没有发生访问（例如没有可用节点）：暂停剖析，不计入次数"""
+        if not self.active:
+            return
+        if self.mode == "cprofile":
+            self._profile.disable()
+        else:
+            self._sampler.pause()
+
+    def finish(self) -> Optional[str]:
+        """写出剖析结果并打印最耗时的函数，返回结果文件路径"""
+        if self.finished:
+            return None
+        self.finished = True
+        if self.done == 0:
+            if self.mode == "sample":
+                self._sampler.stop()
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        if self.mode == "cprofile":
+            import pstats
+            path = os.path.join(self.out_dir, f"profile_{stamp}.prof")
+            self._profile.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(15)
+            print(f"\n🔬 cProfile（前 {self.done} 次访问，按累计耗时前 15）:")
+            print(out.getvalue().strip())
+            print(f"   完整结果: {path}（python -m pstats {path}）")
+            return path
+        self._sampler.stop()
+        path = os.path.join(self.out_dir, f"profile_{stamp}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        leaf = collections.Counter()
+        for stack, count in self._sampler.stacks.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = self._sampler.samples or 1
+        print(f"\n🔬 采样剖析（前 {self.done} 次访问，{self._sampler.samples} 个样本，按自身占比前 10）:")
+        for func, count in leaf.most_common(10):
+            print(f"   {count / total * 100:5.1f}%  {func}")
+        print(f"   调用栈: {path}（flamegraph.pl {path} > flame.svg）")
+        return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="汇总访问分段计时")
+    parser.add_argument("path", nargs="?", help="trace 文件（默认 logs/visit_log_trace.jsonl）")
+    args = parser.parse_args()
+    path = args.path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "visit_log_trace.jsonl")
+    if not os.path.exists(path):
+        print(f"❌ 未找到 {path}（开启 CONFIG['TRACE_VISITS'] 后运行 selenium_with_proxy.py 生成）")
+        return
+    print_summary(summarize(iter_trace_records(path)))
+
+
+if __name__ == "__main__":
+    main()